@@ -11,13 +11,38 @@ License: MIT
 """
 
 # === Standard Library Imports ===
+import atexit
 import os
-import calendar
+import pstats
+import csv
+import io
+import re
+import sqlite3
+import threading
+import time
+import cProfile
+import json
+import logging
+import hashlib
+import hmac
+import multiprocessing
+import random
+from bisect import bisect_left
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from contextlib import nullcontext
+from functools import wraps
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are kept, not folded
+    fcntl = None
 
 # === Third-Party Imports ===
 from flask import (
     Flask, 
+    g, 
+    has_request_context, 
     render_template, 
     request, 
     redirect, 
@@ -25,7 +50,10 @@ from flask import (
     flash, 
     jsonify, 
     session, 
-    make_response
+    Response,
+    make_response,
+    send_from_directory,
+    stream_with_context
 )
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import (
@@ -37,9 +65,19 @@ from flask_login import (
     current_user
 )
 from werkzeug.security import generate_password_hash, check_password_hash
+from markupsafe import escape
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 from dateutil.relativedelta import relativedelta
+import click
 import pytz
-from sqlalchemy import and_
+from sqlalchemy import and_, create_engine, event
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+try:
+    import numpy as np
+except ImportError:  # only needed for ANALYTICS_ENGINE=numpy
+    np = None
 
 # === Application Configuration ===
 app = Flask(__name__)
@@ -52,6 +90,80 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite storage profile (see SQLITE_STORAGE_PROFILES) and connection pool
+# size per worker process; ignored for in-memory databases
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'wal')
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI'] \
+        and app.config['SQLALCHEMY_DATABASE_URI'] != 'sqlite://':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+
+# Dashboard JSON response cache: entries kept per process, and an optional
+# SQLite file shared by all worker processes on the host
+app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+app.config['RESPONSE_CACHE_PATH'] = os.environ.get('RESPONSE_CACHE_PATH')
+
+# Per-process cache of user records and category lists. Writes invalidate it
+# in the writing process; other processes pick changes up within the TTL
+# (except the data version, which is read on every request).
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 30))
+
+# Seconds between runs of the recurring transaction materializer started by
+# `python app.py` (0 disables it; `flask recurring materialize` runs it once)
+app.config['RECURRING_INTERVAL'] = float(os.environ.get('RECURRING_INTERVAL', 0))
+
+# Per-request SQL instrumentation (see QUERY_BUDGETS): Server-Timing header
+# and log line, HTML debug panel (shows SQL; never enable it in production),
+# default query budget and whether exceeding a budget raises instead of
+# logging a warning (always raises under TESTING)
+app.config['QUERY_STATS'] = os.environ.get('QUERY_STATS', '1') != '0'
+app.config['QUERY_DEBUG_PANEL'] = os.environ.get('QUERY_DEBUG_PANEL') == '1'
+app.config['QUERY_BUDGET_DEFAULT'] = int(os.environ.get('QUERY_BUDGET_DEFAULT', 20))
+app.config['QUERY_BUDGET_STRICT'] = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+
+# Engine computing dashboard and report aggregates: 'sql' (grouped queries
+# on the rollups) or 'numpy' (per-user prefix-sum indexes, see "Columnar
+# Analytics"), with the number of users' indexes cached per process and
+# seconds they are kept
+app.config['ANALYTICS_ENGINE'] = os.environ.get('ANALYTICS_ENGINE', 'sql')
+app.config['ANALYTICS_CACHE_SIZE'] = int(os.environ.get('ANALYTICS_CACHE_SIZE', 256))
+app.config['ANALYTICS_CACHE_TTL'] = float(os.environ.get('ANALYTICS_CACHE_TTL', 300))
+
+# Users allowed to use the /admin pages, as a comma-separated list of emails
+app.config['ADMIN_EMAILS'] = {
+    email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()
+}
+
+# Request profiling (see "Request Profiling"): profile 1 in N requests
+# (0 disables sampling), lifetime of signed ?_profile= tokens in seconds,
+# and how many dumps to keep under instance/profiles
+app.config['PROFILE_SAMPLE_RATE'] = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_TOKEN_MAX_AGE'] = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+app.config['PROFILE_MAX_DUMPS'] = int(os.environ.get('PROFILE_MAX_DUMPS', 200))
+
+# Prometheus metrics (see "Metrics"): bearer token accepted by /metrics (admins
+# may also read it), directory of the per-process snapshots (default:
+# instance/metrics) and seconds between snapshot writes
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# Background jobs (see "Background Jobs"): worker threads started by
+# `python app.py` (0 disables them; `flask jobs worker` runs a worker process
+# instead), jobs running at once across all workers and per user, jobs a user
+# may have waiting or running, seconds between queue polls, and hours a
+# result stays available for download
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_MAX_RUNNING'] = int(os.environ.get('JOB_MAX_RUNNING', 2))
+app.config['JOB_MAX_RUNNING_PER_USER'] = int(os.environ.get('JOB_MAX_RUNNING_PER_USER', 1))
+app.config['JOB_MAX_PENDING_PER_USER'] = int(os.environ.get('JOB_MAX_PENDING_PER_USER', 5))
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+app.config['JOB_RESULT_TTL'] = float(os.environ.get('JOB_RESULT_TTL', 24))
+
 # Initialize Extensions
 db = SQLAlchemy(app)
 login_manager = LoginManager()
@@ -60,6 +172,129 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'error'
 
+# === SQLite Storage Profile ===
+# PRAGMAs applied to every new connection. 'wal' lets readers run while a
+# writer commits and makes writers wait for the lock instead of failing with
+# "database is locked"; 'legacy' is SQLite's default rollback journal.
+SQLITE_STORAGE_PROFILES = {
+    'legacy': {
+        'pragmas': {'journal_mode': 'DELETE'},
+        'immediate_writes': False,
+    },
+    'wal': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 5000,          # ms to wait for a lock
+            'synchronous': 'NORMAL',       # durable at checkpoints; safe with WAL
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,      # KiB of page cache per connection
+            'temp_store': 'MEMORY',
+        },
+        # Take the write lock when a write transaction starts: a deferred
+        # transaction that upgrades from reader to writer fails immediately
+        # if another writer committed meanwhile, regardless of busy_timeout
+        'immediate_writes': True,
+    },
+}
+
+def _is_write_transaction():
+    """Guess whether the transaction being started will write.
+    
+    Requests with unsafe methods write. CLI commands and background threads
+    keep SQLite's deferred transactions (and rely on busy_timeout), so that
+    read-only commands never hold the write lock.
+    
+    Returns:
+        bool: True if the transaction should take the write lock up front
+    """
+    return has_request_context() and request.method not in ('GET', 'HEAD', 'OPTIONS')
+
+def _configure_sqlite_engine(engine, profile):
+    """Apply a storage profile to every connection of a SQLite engine.
+    
+    Args:
+        engine (Engine): SQLAlchemy engine; non-SQLite engines are left alone
+        profile (str): Key of SQLITE_STORAGE_PROFILES
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    settings = SQLITE_STORAGE_PROFILES[profile]
+    
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in settings['pragmas'].items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+        if settings['immediate_writes']:
+            # Let SQLAlchemy emit BEGIN itself (see _begin below)
+            dbapi_connection.isolation_level = None
+    
+    if settings['immediate_writes']:
+        @event.listens_for(engine, 'begin')
+        def _begin(connection):
+            connection.exec_driver_sql(
+                'BEGIN IMMEDIATE' if _is_write_transaction() else 'BEGIN'
+            )
+
+with app.app_context():
+    _configure_sqlite_engine(db.engine, app.config['SQLITE_PROFILE'])
+
+# === Money ===
+# Amounts are stored and aggregated as integer minor units (cents), so sums
+# are exact; they are converted to decimal units only when rendered into a
+# template or a JSON response.
+MINOR_UNITS = 100
+
+# Comma thousands separators accepted in amounts, e.g. '1,234.50'
+THOUSANDS_PATTERN = re.compile(r'^[+-]?\d{1,3}(,\d{3})+(\.\d*)?$')
+
+def _to_cents(value):
+    """Parse a decimal amount into integer minor units.
+
+    Args:
+        value (str|int|float): Amount in major units, e.g. '12.34' or '1,234.50'
+
+    Returns:
+        int: Amount in minor units, rounded half away from zero
+
+    Raises:
+        ValueError: If the value is not a finite number
+    """
+    text = str(value).strip()
+    if THOUSANDS_PATTERN.match(text):
+        text = text.replace(',', '')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise ValueError(f'Invalid amount: {value!r}')
+    return int((amount * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+def _from_cents(cents):
+    """Convert integer minor units to major units for display.
+
+    Args:
+        cents (int): Amount in minor units; None is treated as zero
+
+    Returns:
+        float: Amount in major units
+    """
+    return (cents or 0) / MINOR_UNITS
+
+def _format_cents(cents):
+    """Format integer minor units as an exact decimal string, e.g. '-12.05'.
+
+    Args:
+        cents (int): Amount in minor units
+
+    Returns:
+        str: Amount in major units with two decimals
+    """
+    units, minor = divmod(abs(cents), MINOR_UNITS)
+    return f"{'-' if cents < 0 else ''}{units}.{minor:02d}"
+
 # === Database Models ===
 class User(UserMixin, db.Model):
     """User model for authentication and profile management.
@@ -72,6 +307,10 @@ class User(UserMixin, db.Model):
         currency (str): Preferred currency symbol
         date_format (str): Preferred date format
         timezone (str): User's timezone
+        data_version (int): Bumped by every write to the user's transactions,
+                            budgets or categories; keys cached responses
+        profile_requests (bool): Profile every request of this user (set by
+                                 an admin)
         created_at (datetime): Account creation timestamp
         updated_at (datetime): Last update timestamp
     """
@@ -82,6 +321,8 @@ class User(UserMixin, db.Model):
     currency = db.Column(db.String(10), default='$')
     date_format = db.Column(db.String(20), default='DD/MM/YYYY')
     timezone = db.Column(db.String(50), default='UTC')
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    profile_requests = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -101,6 +342,10 @@ class Category(db.Model):
         created_at (datetime): Creation timestamp
         updated_at (datetime): Last update timestamp
     """
+    __table_args__ = (
+        db.Index('ix_category_user_type', 'user_id', 'type'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(50), nullable=False)
@@ -119,26 +364,135 @@ class Transaction(db.Model):
         id (int): Primary key
         user_id (int): Foreign key to User
         category_id (int): Foreign key to Category
-        amount (float): Transaction amount
+        amount_cents (int): Transaction amount in minor units
         type (str): Either 'income' or 'expense'
         description (str): Transaction description
         date (datetime): Transaction date
         tags (str): Optional comma-separated tags
         recurring (bool): Whether transaction repeats
+        recurring_rule_id (int): RecurringRule that generated or repeats this
+                                 transaction
         created_at (datetime): Creation timestamp
         updated_at (datetime): Last update timestamp
     """
+    __table_args__ = (
+        # Listings, exports and range aggregates: user + date range / ordering
+        db.Index('ix_transaction_user_date', 'user_id', 'date'),
+        # Listings filtered by type, ordered by date
+        db.Index('ix_transaction_user_type_date', 'user_id', 'type', 'date'),
+        # Per-category lookups within a date range
+        db.Index('ix_transaction_user_category_date', 'user_id', 'category_id', 'date'),
+        # One occurrence per rule and date; makes materialization idempotent
+        db.Index('ix_transaction_recurring_rule_date', 'recurring_rule_id', 'date', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
     type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
     description = db.Column(db.String(200))
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     tags = db.Column(db.String(200))
     recurring = db.Column(db.Boolean, default=False)
+    recurring_rule_id = db.Column(db.Integer, db.ForeignKey('recurring_rule.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def amount(self):
+        """float: Transaction amount in major units, for display."""
+        return _from_cents(self.amount_cents)
+
+# Full-text index over transaction descriptions and tags. It reads its
+# content through a view that adds an 'owner' token (u<user_id>), so a
+# search only walks the postings of the searching user's rows. Triggers keep
+# it in sync with every insert, update and delete, including bulk imports.
+TRANSACTION_FTS_DDL = [
+    """CREATE VIEW IF NOT EXISTS transaction_fts_source AS
+        SELECT id, description, tags, 'u' || user_id AS owner FROM "transaction"
+    """,
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5(
+        description, tags, owner,
+        content='transaction_fts_source', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_insert AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO transaction_fts(rowid, description, tags, owner)
+        VALUES (new.id, new.description, new.tags, 'u' || new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_delete AFTER DELETE ON "transaction" BEGIN
+        INSERT INTO transaction_fts(transaction_fts, rowid, description, tags, owner)
+        VALUES ('delete', old.id, old.description, old.tags, 'u' || old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transaction_fts_update AFTER UPDATE OF description, tags ON "transaction" BEGIN
+        INSERT INTO transaction_fts(transaction_fts, rowid, description, tags, owner)
+        VALUES ('delete', old.id, old.description, old.tags, 'u' || old.user_id);
+        INSERT INTO transaction_fts(rowid, description, tags, owner)
+        VALUES (new.id, new.description, new.tags, 'u' || new.user_id);
+    END""",
+]
+
+TRANSACTION_FTS = db.table('transaction_fts', db.column('rowid'))
+
+@event.listens_for(Transaction.__table__, 'after_create')
+def _create_transaction_fts(target, connection, **kw):
+    """Create the full-text index together with the transaction table."""
+    for statement in TRANSACTION_FTS_DDL:
+        connection.exec_driver_sql(statement)
+
+class RecurringRule(db.Model):
+    """Schedule repeating a transaction at a fixed frequency.
+    
+    Occurrence n falls on start_date + n * interval frequency units (month
+    ends are clamped, so a rule starting on the 31st stays on month ends).
+    The materializer creates every due occurrence as a Transaction.
+    
+    Attributes:
+        id (int): Primary key
+        user_id (int): Foreign key to User
+        category_id (int): Foreign key to Category
+        amount_cents (int): Amount of each occurrence in minor units
+        type (str): Either 'income' or 'expense'
+        description (str): Description of each occurrence
+        tags (str): Normalized comma-separated tags of each occurrence
+        frequency (str): 'daily', 'weekly', 'monthly' or 'yearly'
+        interval (int): Number of frequency units between occurrences
+        start_date (datetime): Date of the first occurrence
+        end_date (datetime): Last date an occurrence may fall on, if any
+        occurrences (int): Number of occurrences created so far
+        next_date (datetime): Date of the next occurrence; None once ended
+        created_at (datetime): Creation timestamp
+        updated_at (datetime): Last update timestamp
+    """
+    __tablename__ = 'recurring_rule'
+    __table_args__ = (
+        # Due rules for the materializer
+        db.Index('ix_recurring_rule_next_date', 'next_date'),
+        db.Index('ix_recurring_rule_user', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    description = db.Column(db.String(200))
+    tags = db.Column(db.String(200))
+    frequency = db.Column(db.String(10), nullable=False)
+    interval = db.Column(db.Integer, nullable=False, default=1)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime)
+    occurrences = db.Column(db.Integer, nullable=False, default=1)
+    next_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    category = db.relationship('Category')
+    
+    @property
+    def amount(self):
+        """float: Amount of each occurrence in major units, for display."""
+        return _from_cents(self.amount_cents)
 
 class Budget(db.Model):
     """Budget model for tracking spending limits.
@@ -147,49 +501,150 @@ class Budget(db.Model):
         id (int): Primary key
         user_id (int): Foreign key to User
         category_id (int): Foreign key to Category
-        limit_amount (float): Budget limit
+        limit_cents (int): Budget limit in minor units
         timeframe (str): Budget period (e.g., 'monthly')
         start_date (datetime): Budget start date
         end_date (datetime): Budget end date
         created_at (datetime): Creation timestamp
         updated_at (datetime): Last update timestamp
     """
+    __table_args__ = (
+        db.Index('ix_budget_user_category', 'user_id', 'category_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
-    limit_amount = db.Column(db.Float, nullable=False)
+    limit_cents = db.Column(db.Integer, nullable=False)
     timeframe = db.Column(db.String(20), nullable=False, default='monthly')
     start_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     end_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def limit_amount(self):
+        """float: Budget limit in major units, for display."""
+        return _from_cents(self.limit_cents)
 
     def get_spent(self):
         """Calculate how much has been spent in this budget's category during the current period.
         
+        Pages listing several budgets should use _get_budgets_spent() directly
+        so that all of them are evaluated with a single query.
+        
         Returns:
-            float: Total amount spent in the budget's category for the current period
+            int: Minor units spent in the budget's category for the current period
         """
-        # Get the start of the current period based on timeframe
-        now = datetime.utcnow()
-        if self.timeframe == 'monthly':
-            period_start = datetime(now.year, now.month, 1)
-        elif self.timeframe == 'weekly':
-            period_start = now - timedelta(days=now.weekday())
-        else:  # yearly
-            period_start = datetime(now.year, 1, 1)
-            
-        # Calculate total expenses for this category in the current period
-        total = db.session.query(db.func.sum(Transaction.amount)).filter(
-            and_(
-                Transaction.category_id == self.category_id,
-                Transaction.user_id == self.user_id,
-                Transaction.type == 'expense',
-                Transaction.date >= period_start
-            )
-        ).scalar()
-        
-        return total or 0.0
+        return _get_budgets_spent(self.user_id, [self], _get_user_now(self.user))[self.id]
+
+class DailyRollup(db.Model):
+    """Per-user daily transaction totals, maintained on every transaction write.
+    
+    Attributes:
+        user_id (int): Foreign key to User
+        day (date): Calendar day of the transactions
+        category_id (int): Foreign key to Category
+        type (str): Either 'income' or 'expense'
+        total_cents (int): Sum of transaction amounts in minor units
+        count (int): Number of transactions
+    """
+    __tablename__ = 'daily_rollup'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class MonthlyRollup(db.Model):
+    """Per-user monthly transaction totals, maintained alongside DailyRollup.
+    
+    Attributes:
+        user_id (int): Foreign key to User
+        month (date): First day of the month of the transactions
+        category_id (int): Foreign key to Category
+        type (str): Either 'income' or 'expense'
+        total_cents (int): Sum of transaction amounts in minor units
+        count (int): Number of transactions
+    """
+    __tablename__ = 'monthly_rollup'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    type = db.Column(db.String(10), primary_key=True)
+    total_cents = db.Column(db.Integer, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Association between transactions and their normalized tags
+transaction_tag = db.Table(
+    'transaction_tag',
+    db.Column('transaction_id', db.Integer, db.ForeignKey('transaction.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    # Transactions carrying a given tag
+    db.Index('ix_transaction_tag_tag', 'tag_id', 'transaction_id'),
+)
+
+class Tag(db.Model):
+    """Normalized transaction tag, unique per user.
+    
+    Transaction.tags keeps the display string; the tag and association
+    tables are kept in sync with it so that tag filters and totals are
+    answered by indexes instead of splitting strings.
+    
+    Attributes:
+        id (int): Primary key
+        user_id (int): Foreign key to User
+        name (str): Lower-case tag name
+        created_at (datetime): Creation timestamp
+    """
+    __table_args__ = (
+        db.Index('ix_tag_user_name', 'user_id', 'name', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    transactions = db.relationship('Transaction', secondary=transaction_tag, lazy='dynamic')
+
+class Job(db.Model):
+    """Background export or report job and its result file.
+    
+    Attributes:
+        id (int): Primary key
+        user_id (int): Foreign key to User
+        kind (str): One of JOB_KINDS ('export' or 'report')
+        params (str): JSON parameters, resolved when the job was submitted
+        status (str): 'queued', 'running', 'done', 'failed' or 'cancelled'
+        progress (int): Percentage done
+        error (str): Reason a job failed
+        result_name (str): Result file in the jobs folder, once done
+        created_at (datetime): Submission timestamp
+        started_at (datetime): When a worker claimed the job
+        heartbeat_at (datetime): Last progress report of the running job
+        finished_at (datetime): When the job ended, however it ended
+        expires_at (datetime): When the job and its result are deleted
+    """
+    __table_args__ = (
+        # Queue scans of the workers, and a user's job list
+        db.Index('ix_job_status_created', 'status', 'created_at'),
+        db.Index('ix_job_user_created', 'user_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(200))
+    result_name = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -198,10 +653,102 @@ def load_user(user_id):
     Args:
         user_id (int): User ID to load
         
+    Served from user_cache when possible; a cached user is a detached copy,
+    so views that modify the user must load it into the session first. The
+    data version keys cached responses and ETags, so it is left out of the
+    cached copy and read fresh (a primary key lookup) on every request: a
+    write in another process must not be hidden for the cache TTL.
+    
     Returns:
         User: User object if found, None otherwise
     """
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    values = user_cache.get(user_id)
+    if values is not None:
+        data_version = db.session.query(User.data_version).filter(User.id == user_id).scalar()
+        if data_version is None:
+            user_cache.pop(user_id)
+            return None
+        user = User(**values, data_version=data_version)
+        make_transient_to_detached(user)
+        return user
+    
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, {
+            column.key: getattr(user, column.key) for column in User.__table__.columns
+            if column.key != 'data_version'
+        })
+    return user
+
+# === Conditional Requests ===
+def _get_code_version():
+    """Return a marker that changes whenever the code or templates change.
+    
+    Included in every ETag so that a deploy never revalidates pages rendered
+    by the previous version. Uses file modification times, which are the same
+    for every worker process serving the same checkout.
+    
+    Returns:
+        str: Latest modification time of app.py and the templates
+    """
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [__file__] + [os.path.join(template_dir, name) for name in os.listdir(template_dir)]
+    return str(int(max(os.path.getmtime(path) for path in paths)))
+
+CODE_VERSION = os.environ.get('ETAG_SALT') or _get_code_version()
+
+def _get_etag():
+    """Compute the strong ETag of the current user's view of a page.
+    
+    The tag covers everything the response depends on: the user's data
+    version (bumped by every write), their settings, the endpoint and its
+    arguments, and the user's current local day (which moves the period
+    windows).
+    
+    Returns:
+        str: Hex digest usable as a strong ETag
+    """
+    parts = [
+        CODE_VERSION,
+        current_user.id,
+        current_user.data_version,
+        current_user.updated_at,
+        request.endpoint,
+        sorted(request.args.items(multi=True)),
+        _get_user_now().date(),
+    ]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+def conditional_get(view):
+    """Answer repeat GETs of an unchanged page with 304 Not Modified.
+    
+    The ETag is checked before the view runs, so an unchanged page costs no
+    aggregation queries at all. Must be applied below @login_required.
+    
+    Args:
+        view (function): View returning a cacheable GET response
+        
+    Returns:
+        function: Wrapped view
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Pending flash messages are part of the page and consumed by it
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+        
+        etag = _get_etag()
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
 
 # === Authentication Routes ===
 @app.route('/')
@@ -286,6 +833,7 @@ def logout():
 # === Dashboard Routes ===
 @app.route('/dashboard')
 @login_required
+@conditional_get
 def dashboard():
     """Main dashboard route showing financial overview.
     
@@ -294,64 +842,86 @@ def dashboard():
     """
     timeframe = request.args.get('timeframe', 'month')
     
-    # Calculate date ranges and metrics
-    metrics = _calculate_dashboard_metrics(timeframe)
-    
-    # Get recent transactions
-    recent_transactions = Transaction.query.filter_by(user_id=current_user.id)\
-        .order_by(Transaction.date.desc())\
-        .limit(5).all()
-    
-    # Get chart data
-    chart_data = _get_dashboard_chart_data(timeframe, metrics['start_date'])
-    
-    # Get category spending data
-    category_data = _get_category_spending_data(
-        metrics['current_transactions']
-    )
+    # Every widget comes from one snapshot built with a few aggregate queries
+    snapshot = _build_dashboard_snapshot(current_user.id, current_user.data_version, timeframe, _get_user_now())
+    metrics = snapshot['metrics']
     
     return render_template(
         'dashboard.html',
-        balance=metrics['current_balance'],
+        balance=metrics['balance'],
         balance_change=metrics['balance_change'],
-        income=metrics['current_income'],
+        income=metrics['income'],
         income_change=metrics['income_change'],
-        expenses=metrics['current_expenses'],
+        expenses=metrics['expenses'],
         expenses_change=metrics['expenses_change'],
-        savings=metrics['current_savings'],
+        savings=metrics['savings'],
         savings_change=metrics['savings_change'],
-        transactions=recent_transactions,
-        trend_labels=chart_data['labels'],
-        income_trend=chart_data['income'],
-        expenses_trend=chart_data['expenses'],
-        category_labels=category_data['labels'],
-        category_amounts=category_data['amounts'],
-        categories=Category.query.filter_by(user_id=current_user.id).all(),
+        transactions=snapshot['recent_transactions'],
+        trend_labels=snapshot['trend']['labels'],
+        income_trend=snapshot['trend']['income'],
+        expenses_trend=snapshot['trend']['expenses'],
+        category_labels=snapshot['category_spending']['labels'],
+        category_amounts=snapshot['category_spending']['amounts'],
+        categories=snapshot['categories'],
         user=current_user
     )
 
+@app.route('/api/dashboard/snapshot')
+@login_required
+@conditional_get
+def get_dashboard_snapshot():
+    """AJAX endpoint returning every dashboard widget in one response.
+    
+    Returns:
+        json: Metrics, trend and category charts, recent transactions and
+              categories for the requested timeframe
+    """
+    timeframe = request.args.get('timeframe', 'month')
+    now = _get_user_now()
+    
+    def build():
+        snapshot = _build_dashboard_snapshot(current_user.id, current_user.data_version, timeframe, now)
+        snapshot['start_date'] = snapshot['start_date'].strftime('%Y-%m-%d')
+        snapshot['end_date'] = snapshot['end_date'].strftime('%Y-%m-%d')
+        for transaction in snapshot['recent_transactions']:
+            transaction['date'] = transaction['date'].strftime('%Y-%m-%d')
+            transaction['category'] = transaction['category']['name']
+        return snapshot
+    
+    return jsonify(_get_cached_response('snapshot', (timeframe, now.date()), build))
+
 @app.route('/dashboard/chart-data')
 @login_required
+@conditional_get
 def get_chart_data():
     """AJAX endpoint for dashboard chart data.
     
+    The bucket size follows the timeframe unless ``granularity`` (day, week,
+    month, quarter or year) is given.
+    
     Returns:
         json: Chart data including labels and trend values
     """
     timeframe = request.args.get('timeframe', 'This Year')
-    today = datetime.utcnow()
+    granularity = request.args.get('granularity')
+    if granularity is not None and granularity not in TREND_GRANULARITIES:
+        return jsonify({'error': 'Invalid granularity'}), 400
+    today = _get_user_now()
     
-    # Calculate date ranges and prepare data
-    chart_data = _prepare_chart_data(timeframe, today)
+    def build():
+        # Calculate date ranges and prepare data
+        chart_data = _prepare_chart_data(timeframe, today, granularity)
+        return {
+            'trend_labels': chart_data['labels'],
+            'income_trend': [_from_cents(total) for total in chart_data['income']],
+            'expenses_trend': [_from_cents(total) for total in chart_data['expenses']]
+        }
     
-    return jsonify({
-        'trend_labels': chart_data['labels'],
-        'income_trend': chart_data['income'],
-        'expenses_trend': chart_data['expenses']
-    })
+    return jsonify(_get_cached_response('chart-data', (timeframe, granularity, today.date()), build))
 
 @app.route('/dashboard/category-data')
 @login_required
+@conditional_get
 def get_category_data():
     """AJAX endpoint for dashboard category spending data.
     
@@ -359,42 +929,76 @@ def get_category_data():
         json: Category spending data including labels and amounts
     """
     timeframe = request.args.get('timeframe', 'This Month')
-    today = datetime.utcnow()
+    today = _get_user_now()
     
-    # Calculate date ranges and category data
-    category_data = _get_category_data_for_period(timeframe, today)
+    def build():
+        # Calculate date ranges and category data
+        category_data = _get_category_data_for_period(timeframe, today)
+        return {
+            'category_labels': category_data['labels'],
+            'category_amounts': [_from_cents(total) for total in category_data['amounts']]
+        }
     
-    return jsonify({
-        'category_labels': category_data['labels'],
-        'category_amounts': category_data['amounts']
-    })
+    return jsonify(_get_cached_response('category-data', (timeframe, today.date()), build))
+
+@app.route('/dashboard/cache-stats')
+@login_required
+def get_cache_stats():
+    """AJAX endpoint reporting this process's response cache counters.
+    
+    Returns:
+        json: Hits, misses, hit rate, evictions and current size
+    """
+    return jsonify(response_cache.stats())
 
 # === Transactions Routes ===
 @app.route('/transactions')
 @login_required
 def transactions():
-    page = request.args.get('page', 1, type=int)
-    per_page = 10
+    """Transaction listing with keyset pagination.
+    
+    Pages are addressed by a ``cursor`` (the (date, id) key of the last or
+    first row shown) and a ``direction`` ('next' or 'prev'), so every page
+    costs the same index range scan however far back the user scrolls.
+    
+    Returns:
+        template: Renders transactions.html with one page of transactions
+    """
+    cursor = request.args.get('cursor')
+    direction = request.args.get('direction', 'next')
     
     # Base query
-    query = Transaction.query.filter_by(user_id=current_user.id)
+    query = Transaction.query.options(joinedload(Transaction.category))\
+        .filter_by(user_id=current_user.id)
     
-    # Apply search filter
+    # Apply search filter (full-text prefix match on description and tags)
     search = request.args.get('search', '')
     if search:
-        query = query.filter(Transaction.description.ilike(f'%{search}%'))
+        query = _filter_full_text(query, current_user.id, search)
+    
+    # Apply tag filter
+    tag = request.args.get('tag', '')
+    if tag:
+        query = _filter_tag(query, current_user.id, tag)
     
     # Apply type filter
     type_filter = request.args.get('type')
     if type_filter and type_filter != 'all':
-        query = query.filter_by(type=type_filter)
+        query = query.filter(Transaction.type == type_filter)
+    else:
+        type_filter = None
+    
+    # Get one page of results
+    transactions = _paginate_keyset(query, cursor, direction, TRANSACTIONS_PER_PAGE)
     
-    # Get paginated results
-    transactions = query.order_by(Transaction.date.desc()).paginate(page=page, per_page=per_page)
+    # Unfiltered totals come from the rollups; search results are not counted
+    if not search and not tag:
+        transactions.total = _get_transaction_count(current_user.id, type_filter)
     
     # Get categories separated by type
-    income_categories = Category.query.filter_by(user_id=current_user.id, type='income').all()
-    expense_categories = Category.query.filter_by(user_id=current_user.id, type='expense').all()
+    categories = _get_user_categories(current_user.id, current_user.data_version)
+    income_categories = [category for category in categories if category['type'] == 'income']
+    expense_categories = [category for category in categories if category['type'] == 'expense']
     
     return render_template('transactions.html',
         transactions=transactions,
@@ -404,6 +1008,137 @@ def transactions():
         user=current_user
     )
 
+@app.route('/transactions/search')
+@login_required
+def search_transactions():
+    """AJAX endpoint for ranked full-text transaction search.
+    
+    Query arguments: ``q`` (search terms, prefix-matched against descriptions
+    and tags), optional ``type``, ``start``/``end`` dates (YYYY-MM-DD,
+    inclusive) and ``limit`` (at most SEARCH_MAX_RESULTS).
+    
+    Returns:
+        json: Matching transactions, best match first
+    """
+    fts_query = _build_fts_query(current_user.id, request.args.get('q', ''))
+    if fts_query is None:
+        return jsonify({'results': []})
+    
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start_date = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end_date = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+    limit = min(request.args.get('limit', 20, type=int), SEARCH_MAX_RESULTS)
+    
+    rank = db.func.bm25(db.literal_column('transaction_fts'), *SEARCH_COLUMN_WEIGHTS)
+    query = db.session.query(Transaction, rank)\
+        .join(TRANSACTION_FTS, TRANSACTION_FTS.c.rowid == Transaction.id)\
+        .options(joinedload(Transaction.category))\
+        .filter(
+            db.literal_column('transaction_fts').op('MATCH')(fts_query),
+            Transaction.user_id == current_user.id
+        )
+    type_filter = request.args.get('type')
+    if type_filter and type_filter != 'all':
+        query = query.filter(Transaction.type == type_filter)
+    if start_date is not None:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.filter(Transaction.date < end_date)
+    
+    return jsonify({'results': [
+        {
+            'id': transaction.id,
+            'date': transaction.date.strftime('%Y-%m-%d'),
+            'description': transaction.description,
+            'tags': transaction.tags,
+            'category': transaction.category.name,
+            'type': transaction.type,
+            'amount': transaction.amount,
+            'rank': score
+        }
+        for transaction, score in query.order_by(rank).limit(limit)
+    ]})
+
+@app.route('/tags')
+@login_required
+def list_tags():
+    """AJAX endpoint listing the user's tags with their transaction counts.
+    
+    Returns:
+        json: Tags ordered by name
+    """
+    rows = db.session.query(Tag.name, db.func.count(transaction_tag.c.transaction_id))\
+        .join(transaction_tag, transaction_tag.c.tag_id == Tag.id)\
+        .filter(Tag.user_id == current_user.id)\
+        .group_by(Tag.id)\
+        .order_by(Tag.name)\
+        .all()
+    return jsonify({'tags': [{'name': name, 'count': count} for name, count in rows]})
+
+@app.route('/tags/<tag>/transactions')
+@login_required
+def get_tag_transactions(tag):
+    """AJAX endpoint listing the transactions carrying a tag.
+    
+    Uses the same keyset pagination as the transactions page (``cursor``,
+    ``direction``) and accepts an optional ``type`` filter.
+    
+    Returns:
+        json: One page of transactions, newest first, with page cursors
+    """
+    query = Transaction.query.options(joinedload(Transaction.category))\
+        .filter_by(user_id=current_user.id)
+    query = _filter_tag(query, current_user.id, tag)
+    type_filter = request.args.get('type')
+    if type_filter and type_filter != 'all':
+        query = query.filter(Transaction.type == type_filter)
+    
+    page = _paginate_keyset(query, request.args.get('cursor'),
+                            request.args.get('direction', 'next'), TRANSACTIONS_PER_PAGE)
+    return jsonify({
+        'transactions': [
+            {
+                'id': transaction.id,
+                'date': transaction.date.strftime('%Y-%m-%d'),
+                'description': transaction.description,
+                'tags': transaction.tags,
+                'category': transaction.category.name,
+                'type': transaction.type,
+                'amount': transaction.amount
+            }
+            for transaction in page
+        ],
+        'prev_cursor': page.prev_cursor if page.has_prev else None,
+        'next_cursor': page.next_cursor if page.has_next else None
+    })
+
+@app.route('/tags/spending')
+@login_required
+def get_tag_spending():
+    """AJAX endpoint for spending per tag per period.
+    
+    Query arguments: ``timeframe`` (month, quarter, year or all) or
+    ``start``/``end`` dates, ``granularity`` (day, week, month or year) and
+    ``type`` (expense by default).
+    
+    Returns:
+        json: Periods and, per tag, the total for each period
+    """
+    try:
+        start_date, end_date, _ = _get_export_range(request.args, _get_user_now())
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in TAG_PERIOD_FORMATS:
+        return jsonify({'error': 'Invalid granularity'}), 400
+    type_ = 'income' if request.args.get('type') == 'income' else 'expense'
+    
+    return jsonify(_get_tag_spending(current_user.id, start_date, end_date, granularity, type_))
+
 @app.route('/transactions/add', methods=['POST'])
 @login_required
 def add_transaction():
@@ -412,12 +1147,30 @@ def add_transaction():
             transaction = Transaction(
                 user_id=current_user.id,
                 category_id=request.form.get('category'),
-                amount=float(request.form.get('amount')),
+                amount_cents=_to_cents(request.form.get('amount')),
                 type=request.form.get('type'),
                 description=request.form.get('description'),
+                tags=_format_tags(request.form.get('tags')),
                 date=datetime.strptime(request.form.get('date'), '%Y-%m-%d')
             )
+            rule = _build_recurring_rule(transaction, request.form)
+            if rule is not None:
+                db.session.add(rule)
+                db.session.flush()
+                transaction.recurring = True
+                transaction.recurring_rule_id = rule.id
             db.session.add(transaction)
+            db.session.flush()
+            
+            deltas = {}
+            _add_rollup_delta(deltas, transaction, 1)
+            _apply_rollup_deltas(deltas)
+            _sync_transaction_tags(current_user.id, {transaction.id: transaction.tags})
+            if rule is not None:
+                # Catch up on occurrences between a past start date and today
+                _materialize_recurring(_get_user_now(), rule_ids=[rule.id])
+            _bump_data_version(current_user.id)
+            
             db.session.commit()
             flash('Transaction added successfully', 'success')
         except Exception as e:
@@ -434,6 +1187,12 @@ def delete_transaction(id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
+        deltas = {}
+        _add_rollup_delta(deltas, transaction, -1)
+        _apply_rollup_deltas(deltas)
+        _sync_transaction_tags(current_user.id, {transaction.id: None})
+        _bump_data_version(current_user.id)
+        
         db.session.delete(transaction)
         db.session.commit()
         return jsonify({'message': 'Transaction deleted successfully'})
@@ -449,26 +1208,132 @@ def edit_transaction(id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
+        date = datetime.strptime(request.form.get('date'), '%Y-%m-%d')
+        # A rule has at most one occurrence per date (ix_transaction_recurring_rule_date)
+        if transaction.recurring_rule_id is not None and date != transaction.date \
+                and _has_recurring_occurrence(transaction.recurring_rule_id, date):
+            flash('This recurring transaction already has an occurrence on that date', 'error')
+            return redirect(url_for('transactions'))
+        
+        # Move the old values out of the rollups and the new values in
+        deltas = {}
+        _add_rollup_delta(deltas, transaction, -1)
+        
         transaction.category_id = request.form.get('category')
-        transaction.amount = float(request.form.get('amount'))
+        transaction.amount_cents = _to_cents(request.form.get('amount'))
         transaction.type = request.form.get('type')
         transaction.description = request.form.get('description')
-        transaction.date = datetime.strptime(request.form.get('date'), '%Y-%m-%d')
+        transaction.tags = _format_tags(request.form.get('tags'))
+        transaction.date = date
+        
+        _add_rollup_delta(deltas, transaction, 1)
+        _apply_rollup_deltas(deltas)
+        _sync_transaction_tags(current_user.id, {transaction.id: transaction.tags})
+        _bump_data_version(current_user.id)
         db.session.commit()
         flash('Transaction updated successfully', 'success')
+    except IntegrityError:
+        # The materializer created that occurrence since the check above
+        db.session.rollback()
+        flash('This recurring transaction already has an occurrence on that date', 'error')
     except:
         db.session.rollback()
         flash('Error updating transaction', 'error')
     
     return redirect(url_for('transactions'))
 
+@app.route('/transactions/import', methods=['POST'])
+@login_required
+def import_transactions():
+    """Bulk import transactions from an uploaded CSV export or bank OFX file.
+    
+    Returns:
+        redirect: Redirects to the transactions page with a status message
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Please choose a file to import', 'error')
+        return redirect(url_for('transactions'))
+    
+    try:
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        records = _parse_import_file(stream, upload.filename)
+        imported = _import_transactions(current_user.id, records)
+        _bump_data_version(current_user.id)
+        db.session.commit()
+        flash(f'Imported {imported} transactions', 'success')
+    except ValueError as e:
+        db.session.rollback()
+        flash(f'Error importing transactions: {e}', 'error')
+    except Exception:
+        db.session.rollback()
+        flash('Error importing transactions', 'error')
+    
+    return redirect(url_for('transactions'))
+
+@app.route('/recurring')
+@login_required
+def list_recurring_rules():
+    """AJAX endpoint listing the user's recurring transaction rules.
+    
+    Returns:
+        json: Rules with their schedule and next due date
+    """
+    rules = RecurringRule.query.options(joinedload(RecurringRule.category))\
+        .filter_by(user_id=current_user.id)\
+        .order_by(RecurringRule.id).all()
+    return jsonify({'rules': [
+        {
+            'id': rule.id,
+            'description': rule.description,
+            'category': rule.category.name,
+            'type': rule.type,
+            'amount': rule.amount,
+            'frequency': rule.frequency,
+            'interval': rule.interval,
+            'start_date': rule.start_date.strftime('%Y-%m-%d'),
+            'end_date': rule.end_date.strftime('%Y-%m-%d') if rule.end_date else None,
+            'next_date': rule.next_date.strftime('%Y-%m-%d') if rule.next_date else None,
+            'occurrences': rule.occurrences
+        }
+        for rule in rules
+    ]})
+
+@app.route('/recurring/<int:id>/stop', methods=['POST'])
+@login_required
+def stop_recurring_rule(id):
+    """Stop a recurring rule; transactions created so far are kept."""
+    rule = RecurringRule.query.get_or_404(id)
+    if rule.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        # Rule dates are day boundaries, like the transaction dates they produce
+        rule.end_date = _get_user_now().replace(hour=0, minute=0, second=0, microsecond=0)
+        rule.next_date = None
+        db.session.commit()
+        return jsonify({'message': 'Recurring transaction stopped'})
+    except:
+        db.session.rollback()
+        return jsonify({'error': 'Error stopping recurring transaction'}), 500
+
 # === Budgets Routes ===
 @app.route('/budgets')
 @login_required
 def budgets():
-    budgets = Budget.query.filter_by(user_id=current_user.id).all()
-    categories = Category.query.filter_by(user_id=current_user.id).all()
-    return render_template('budgets.html', budgets=budgets, categories=categories, user=current_user)
+    budgets = Budget.query.options(joinedload(Budget.category))\
+        .filter_by(user_id=current_user.id).all()
+    categories = _get_user_categories(current_user.id, current_user.data_version)
+    
+    # Evaluate every budget's spending with one grouped query
+    budget_spent = _get_budgets_spent(current_user.id, budgets, _get_user_now())
+    
+    return render_template('budgets.html',
+        budgets=budgets,
+        budget_spent={id: _from_cents(spent) for id, spent in budget_spent.items()},
+        categories=categories,
+        user=current_user
+    )
 
 @app.route('/budgets/add', methods=['POST'])
 @login_required
@@ -488,10 +1353,11 @@ def add_budget():
             budget = Budget(
                 user_id=current_user.id,
                 category_id=request.form.get('category'),
-                limit_amount=float(request.form.get('limit_amount')),
+                limit_cents=_to_cents(request.form.get('limit_amount')),
                 timeframe=request.form.get('timeframe')
             )
             db.session.add(budget)
+            _bump_data_version(current_user.id)
             db.session.commit()
             flash('Budget added successfully')
         except Exception as e:
@@ -509,6 +1375,7 @@ def delete_budget(id):
     
     try:
         db.session.delete(budget)
+        _bump_data_version(current_user.id)
         db.session.commit()
         return jsonify({'message': 'Budget deleted successfully'})
     except:
@@ -524,8 +1391,9 @@ def edit_budget(id):
     
     try:
         budget.category_id = request.form.get('category')
-        budget.limit_amount = float(request.form.get('limit_amount'))
+        budget.limit_cents = _to_cents(request.form.get('limit_amount'))
         budget.timeframe = request.form.get('timeframe')
+        _bump_data_version(current_user.id)
         db.session.commit()
         flash('Budget updated successfully', 'success')
     except:
@@ -537,240 +1405,300 @@ def edit_budget(id):
 # === Reports Routes ===
 @app.route('/reports')
 @login_required
+@conditional_get
 def reports():
     # Get the timeframe from query parameters (default to 'month')
     timeframe = request.args.get('timeframe', 'month')
     
-    # Calculate date ranges
-    now = datetime.utcnow()
-    if timeframe == 'month':
-        start_date = datetime(now.year, now.month, 1)
-        end_date = start_date + relativedelta(months=1)
-        prev_start = start_date - relativedelta(months=1)
-        prev_end = start_date
-    elif timeframe == 'quarter':
-        quarter = (now.month - 1) // 3
-        start_date = datetime(now.year, quarter * 3 + 1, 1)
-        end_date = start_date + relativedelta(months=3)
-        prev_start = start_date - relativedelta(months=3)
-        prev_end = start_date
-    else:  # year
-        start_date = datetime(now.year, 1, 1)
-        end_date = datetime(now.year + 1, 1, 1)
-        prev_start = datetime(now.year - 1, 1, 1)
-        prev_end = start_date
-
-    # Calculate current period metrics
-    current_income = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'income',
-        Transaction.date >= start_date,
-        Transaction.date < end_date
-    ).scalar() or 0
-
-    current_expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date >= start_date,
-        Transaction.date < end_date
-    ).scalar() or 0
-
-    # Calculate previous period metrics
-    prev_income = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'income',
-        Transaction.date >= prev_start,
-        Transaction.date < prev_end
-    ).scalar() or 0
-
-    prev_expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date >= prev_start,
-        Transaction.date < prev_end
-    ).scalar() or 0
+    # Every report metric is answered by a fixed set of grouped queries
+    report = _build_reports_data(current_user.id, timeframe, _get_user_now())
+    
+    return render_template('reports.html', user=current_user, **report)
 
-    # Calculate changes
-    income_change = ((current_income - prev_income) / prev_income * 100) if prev_income > 0 else 0
-    expenses_change = ((current_expenses - prev_expenses) / prev_expenses * 100) if prev_expenses > 0 else 0
+@app.route('/reports/export')
+@login_required
+def export_reports():
+    """Stream the user's transactions for a period as a CSV download.
     
-    current_savings = current_income - current_expenses
-    prev_savings = prev_income - prev_expenses
-    savings_change = ((current_savings - prev_savings) / prev_savings * 100) if prev_savings > 0 else 0
+    The period is either a report timeframe ('month', 'quarter', 'year',
+    'all') or an explicit range given by ``start`` and/or ``end``
+    (YYYY-MM-DD, both inclusive). Large exports can be queued as a
+    background job with POST /jobs instead (see submit_job()).
     
-    savings_rate = (current_savings / current_income * 100) if current_income > 0 else 0
-    prev_savings_rate = (prev_savings / prev_income * 100) if prev_income > 0 else 0
-    savings_rate_change = savings_rate - prev_savings_rate
+    Returns:
+        Response: Streamed CSV file, or a JSON error for an invalid range
+    """
+    now = _get_user_now()
+    try:
+        start_date, end_date, label = _get_export_range(request.args, now)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range'}), 400
+    
+    rows = _get_export_rows(current_user.id, start_date, end_date)
+    
+    response = Response(stream_with_context(_generate_export_csv(rows)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=finance_report_{label}_{now.strftime("%Y%m%d")}.csv'
+    
+    return response
 
-    # Get trend data
-    if timeframe == 'month':
-        trend_dates = [start_date + timedelta(days=x) for x in range(0, 31)]
-    elif timeframe == 'quarter':
-        trend_dates = [start_date + relativedelta(months=x) for x in range(0, 3)]
-    else:
-        trend_dates = [start_date + relativedelta(months=x) for x in range(0, 12)]
+@app.route('/reports/ranges')
+@login_required
+@conditional_get
+def get_range_totals():
+    """Income and expense totals of any number of custom date ranges.
+    
+    Each ``range`` argument is ``YYYY-MM-DD..YYYY-MM-DD`` (start inclusive,
+    end exclusive), up to RANGE_MAX_RANGES per request. With
+    ``categories=1`` every range also lists its totals per category. Every
+    range is answered by two lookups in running totals (see
+    _get_range_totals).
+    
+    Returns:
+        json: Totals per range in argument order, or an error
+    """
+    try:
+        ranges = _parse_date_ranges(request.args.getlist('range'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    by_category = request.args.get('categories') == '1'
+    income, expenses, categories = _get_range_totals(
+        current_user.id,
+        [start for start, _ in ranges],
+        [end for _, end in ranges],
+        by_category
+    )
+    results = [
+        {
+            'start': start.date().isoformat(),
+            'end': end.date().isoformat(),
+            'income': _from_cents(range_income),
+            'expenses': _from_cents(range_expenses),
+            'net': _from_cents(range_income - range_expenses)
+        }
+        for (start, end), range_income, range_expenses in zip(ranges, income, expenses)
+    ]
+    
+    if by_category:
+        names = {
+            category['id']: category['name']
+            for category in _get_user_categories(current_user.id, current_user.data_version)
+        }
+        category_ids, category_income, category_expenses = categories
+        for result, row_income, row_expenses in zip(results, category_income, category_expenses):
+            result['categories'] = [
+                {
+                    'id': category_id,
+                    'name': names.get(category_id),
+                    'income': _from_cents(total_income),
+                    'expenses': _from_cents(total_expenses)
+                }
+                for category_id, total_income, total_expenses
+                in zip(category_ids, row_income, row_expenses)
+                if total_income or total_expenses
+            ]
+    
+    return jsonify({'ranges': results})
 
-    trend_labels = [d.strftime('%Y-%m-%d') for d in trend_dates]
+@app.route('/reports/rolling')
+@login_required
+@conditional_get
+def get_rolling_totals():
+    """Income and expense totals of trailing windows, day by day.
     
-    # Get income and expenses for each date in the trend
-    income_trend = []
-    expenses_trend = []
-    for date in trend_dates:
-        if timeframe == 'month':
-            period_start = date
-            period_end = date + timedelta(days=1)
-        else:
-            period_start = date
-            period_end = date + relativedelta(months=1)
-            
-        income = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.type == 'income',
-            Transaction.date >= period_start,
-            Transaction.date < period_end
-        ).scalar() or 0
-        
-        expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.type == 'expense',
-            Transaction.date >= period_start,
-            Transaction.date < period_end
-        ).scalar() or 0
-        
-        income_trend.append(income)
-        expenses_trend.append(expenses)
-
-    # Get category data
-    category_data = db.session.query(
-        Category.name,
-        db.func.sum(Transaction.amount)
-    ).join(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date >= start_date,
-        Transaction.date < end_date
-    ).group_by(Category.name).all()
+    For each of the ``days`` days up to ``end`` (YYYY-MM-DD, inclusive;
+    default: the user's today) and each ``window`` length in days (repeatable; default:
+    ROLLING_WINDOWS), returns the totals of the window ending on that day.
+    
+    Returns:
+        json: Dates and per-window income and expense series, or an error
+    """
+    windows = request.args.getlist('window', type=int) or list(ROLLING_WINDOWS)
+    days = request.args.get('days', 30, type=int)
+    try:
+        end = request.args.get('end')
+        end_date = datetime.strptime(end, '%Y-%m-%d') if end else _get_user_now()
+    except ValueError:
+        return jsonify({'error': 'Invalid end date'}), 400
+    if not 1 <= days <= ROLLING_MAX_DAYS \
+            or not all(1 <= window <= ROLLING_MAX_WINDOW for window in windows):
+        return jsonify({'error': f'days must be 1-{ROLLING_MAX_DAYS} and windows 1-{ROLLING_MAX_WINDOW}'}), 400
+    
+    # Every window of every day in one call: range i ends the day after day i
+    last_day = end_date.toordinal()
+    range_ends = list(range(last_day - days + 2, last_day + 2))
+    income, expenses, _ = _get_range_totals(
+        current_user.id,
+        [end - window for window in windows for end in range_ends],
+        range_ends * len(windows)
+    )
+    series = {}
+    for index, window in enumerate(windows):
+        window_rows = slice(index * days, (index + 1) * days)
+        series[str(window)] = {
+            'income': [_from_cents(total) for total in income[window_rows]],
+            'expenses': [_from_cents(total) for total in expenses[window_rows]]
+        }
+    
+    return jsonify({
+        'dates': [datetime.fromordinal(day - 1).strftime('%Y-%m-%d') for day in range_ends],
+        'windows': series
+    })
+
+# === Jobs Routes ===
+def _submit_job_response(kind, args):
+    """Validate job arguments, queue the job and answer 202 Accepted.
+    
+    Date ranges and the current date are resolved in the user's timezone at
+    submission, so the job computes what the user asked for whenever it runs.
+    
+    Args:
+        kind (str): One of JOB_KINDS
+        args (MultiDict): Request arguments ('timeframe', 'start', 'end')
+        
+    Returns:
+        Response: The job's JSON description, or a JSON error
+    """
+    now = _get_user_now()
+    if kind == 'export':
+        try:
+            start_date, end_date, label = _get_export_range(args, now)
+        except ValueError:
+            return jsonify({'error': 'Invalid date range'}), 400
+        params = {
+            'start_date': start_date.isoformat() if start_date else None,
+            'end_date': end_date.isoformat() if end_date else None,
+            'filename': f'finance_report_{label}_{now.strftime("%Y%m%d")}.csv'
+        }
+    elif kind == 'report':
+        timeframe = args.get('timeframe', 'month')
+        params = {
+            'timeframe': timeframe,
+            'now': now.isoformat(),
+            'filename': f'finance_report_{timeframe}_{now.strftime("%Y%m%d")}.json'
+        }
+    else:
+        return jsonify({'error': 'Invalid job kind'}), 400
+    
+    try:
+        job = _submit_job(current_user.id, kind, params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 429
+    response = jsonify(_serialize_job(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('get_job', id=job.id)
+    return response
 
-    category_labels = [item[0] for item in category_data]
-    category_amounts = [float(item[1]) for item in category_data]
-
-    # Get budget vs actual data
-    budgets = Budget.query.filter_by(user_id=current_user.id).all()
-    budget_labels = []
-    budget_data = []
-    actual_data = []
-
-    for budget in budgets:
-        budget_labels.append(budget.category.name)
-        budget_data.append(float(budget.limit_amount))
-        actual_data.append(float(budget.get_spent()))
-
-    # Calculate monthly savings data
-    savings_labels = []
-    savings_data = []
-    for i in range(6):
-        month_start = now - relativedelta(months=i)
-        month_start = datetime(month_start.year, month_start.month, 1)
-        month_end = month_start + relativedelta(months=1)
-        
-        month_income = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.type == 'income',
-            Transaction.date >= month_start,
-            Transaction.date < month_end
-        ).scalar() or 0
-        
-        month_expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.type == 'expense',
-            Transaction.date >= month_start,
-            Transaction.date < month_end
-        ).scalar() or 0
-        
-        savings_labels.insert(0, month_start.strftime('%b %Y'))
-        savings_data.insert(0, month_income - month_expenses)
-
-    return render_template('reports.html',
-                         total_income=current_income,
-                         total_expenses=current_expenses,
-                         net_savings=current_savings,
-                         savings_rate=savings_rate,
-                         income_change=income_change,
-                         expenses_change=expenses_change,
-                         savings_change=savings_change,
-                         savings_rate_change=savings_rate_change,
-                         trend_labels=trend_labels,
-                         income_trend=income_trend,
-                         expenses_trend=expenses_trend,
-                         category_labels=category_labels,
-                         category_data=category_amounts,
-                         budget_labels=budget_labels,
-                         budget_data=budget_data,
-                         actual_data=actual_data,
-                         savings_labels=savings_labels,
-                         savings_data=savings_data,
-                         user=current_user)
+@app.route('/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    """Queue an export or report job.
+    
+    Takes ``kind`` ('export' or 'report') and the arguments of the matching
+    page: ``timeframe``, or ``start``/``end`` for exports.
+    
+    Returns:
+        json: The queued job (202), or an error
+    """
+    args = request.form if request.form else request.args
+    return _submit_job_response(args.get('kind'), args)
 
-@app.route('/reports/export')
+@app.route('/jobs')
 @login_required
-def export_reports():
-    # Get the timeframe from query parameters (default to 'month')
-    timeframe = request.args.get('timeframe', 'month')
+def list_jobs():
+    """List the current user's recent jobs, newest first.
     
-    # Calculate date ranges
-    now = datetime.utcnow()
-    if timeframe == 'month':
-        start_date = datetime(now.year, now.month, 1)
-        end_date = start_date + relativedelta(months=1)
-    elif timeframe == 'quarter':
-        quarter = (now.month - 1) // 3
-        start_date = datetime(now.year, quarter * 3 + 1, 1)
-        end_date = start_date + relativedelta(months=3)
-    else:  # year
-        start_date = datetime(now.year, 1, 1)
-        end_date = datetime(now.year + 1, 1, 1)
+    Returns:
+        json: Up to 20 jobs
+    """
+    jobs = Job.query.filter_by(user_id=current_user.id)\
+        .order_by(Job.created_at.desc(), Job.id.desc()).limit(20).all()
+    return jsonify({'jobs': [_serialize_job(job) for job in jobs]})
 
-    # Get transactions for the period
-    transactions = Transaction.query.filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= start_date,
-        Transaction.date < end_date
-    ).order_by(Transaction.date).all()
+@app.route('/jobs/<int:id>')
+@login_required
+def get_job(id):
+    """Poll a job's status and progress.
+    
+    Returns:
+        json: The job, with its download URL once done
+    """
+    job = Job.query.get_or_404(id)
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(_serialize_job(job))
 
-    # Create CSV content
-    csv_content = "Date,Type,Category,Description,Amount\n"
-    for t in transactions:
-        csv_content += f"{t.date.strftime('%Y-%m-%d')},{t.type},{t.category.name},{t.description},{t.amount}\n"
+@app.route('/jobs/<int:id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(id):
+    """Cancel a queued or running job.
+    
+    A running job stops at its next progress report and deletes its partial
+    result.
+    
+    Returns:
+        json: The job, or an error if it already ended
+    """
+    job = Job.query.get_or_404(id)
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if job.status not in JOB_PENDING_STATUSES:
+        return jsonify({'error': f'Job is already {job.status}'}), 409
+    
+    now = datetime.utcnow()
+    job.status = 'cancelled'
+    job.finished_at = now
+    job.expires_at = now + timedelta(hours=app.config['JOB_RESULT_TTL'])
+    db.session.commit()
+    return jsonify(_serialize_job(job))
 
-    # Create response
-    response = make_response(csv_content)
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=finance_report_{timeframe}_{now.strftime("%Y%m%d")}.csv'
+@app.route('/jobs/<int:id>/download')
+@login_required
+def download_job(id):
+    """Download the result file of a finished job.
     
-    return response
+    Returns:
+        Response: The file, or a JSON error if it is not available
+    """
+    job = Job.query.get_or_404(id)
+    if job.user_id != current_user.id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    if job.status != 'done' or not job.result_name:
+        return jsonify({'error': f'Job is {job.status}'}), 409
+    return send_from_directory(
+        _get_job_dir(), job.result_name, as_attachment=True,
+        download_name=json.loads(job.params)['filename']
+    )
 
 # === Settings Routes ===
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
     if request.method == 'POST':
+        # current_user may be a cached, detached copy
+        user = db.session.get(User, current_user.id)
         try:
-            current_user.name = request.form.get('name')
-            current_user.email = request.form.get('email')
-            current_user.currency = request.form.get('currency')
-            current_user.date_format = request.form.get('date_format')
-            current_user.timezone = request.form.get('timezone')
+            user.name = request.form.get('name')
+            user.email = request.form.get('email')
+            user.currency = request.form.get('currency')
+            user.date_format = request.form.get('date_format')
+            timezone = request.form.get('timezone')
+            if timezone not in pytz.all_timezones_set:
+                flash('Unknown timezone', 'error')
+                return redirect(url_for('settings'))
+            user.timezone = timezone
             
             # Handle password change
             current_password = request.form.get('current_password')
             new_password = request.form.get('new_password')
             if current_password and new_password:
-                if check_password_hash(current_user.password_hash, current_password):
-                    current_user.password_hash = generate_password_hash(new_password)
+                if check_password_hash(user.password_hash, current_password):
+                    user.password_hash = generate_password_hash(new_password)
                 else:
                     flash('Current password is incorrect', 'error')
                     return redirect(url_for('settings'))
             
+            _invalidate_user_cache(user.id)
             db.session.commit()
             flash('Settings updated successfully', 'success')
         except:
@@ -784,291 +1712,4051 @@ def settings():
                          date_formats=['DD/MM/YYYY', 'MM/DD/YYYY', 'YYYY-MM-DD'],
                          timezones=['Asia/Kolkata', 'UTC', 'US/Pacific', 'US/Eastern', 'Europe/London'])
 
+# === Admin Routes ===
+def admin_required(view):
+    """Restrict a view to the users listed in ADMIN_EMAILS.
+    
+    Must be applied below @login_required.
+    
+    Args:
+        view (function): View to protect
+        
+    Returns:
+        function: Wrapped view answering 403 for everyone else
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if current_user.email.lower() not in app.config['ADMIN_EMAILS']:
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/admin/profiles')
+@login_required
+@admin_required
+def list_profiles():
+    """AJAX endpoint listing stored request profiles, newest first.
+    
+    Also returns a fresh signed token for the admin: append
+    ``?_profile=<token>`` to any URL to profile that request of theirs.
+    
+    Returns:
+        json: Profile metadata (route, user, latency, trigger) and a token
+    """
+    return jsonify({
+        'profiles': _list_profiles(),
+        'token': _create_profile_token(current_user.id),
+        'token_max_age': app.config['PROFILE_TOKEN_MAX_AGE'],
+    })
+
+@app.route('/admin/profiles/<name>')
+@login_required
+@admin_required
+def get_profile(name):
+    """AJAX endpoint showing the top cumulative functions of a profile.
+    
+    Returns:
+        json: Up to ``limit`` (default 25) functions by cumulative time
+    """
+    try:
+        functions = _get_profile_top_functions(name, request.args.get('limit', 25, type=int))
+    except FileNotFoundError:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify({'name': name, 'functions': functions})
+
+@app.route('/admin/profiles/users/<int:id>', methods=['POST'])
+@login_required
+@admin_required
+def set_user_profiling(id):
+    """Turn profiling of every request of a user on or off.
+    
+    Returns:
+        json: The user's new setting
+    """
+    user = db.session.get(User, id)
+    if user is None:
+        return jsonify({'error': 'User not found'}), 404
+    user.profile_requests = request.form.get('enabled') in ('1', 'true', 'on')
+    _invalidate_user_cache(user.id)
+    db.session.commit()
+    return jsonify({'user_id': user.id, 'profile_requests': user.profile_requests})
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint.
+    
+    Requires ``Authorization: Bearer <METRICS_TOKEN>`` or a logged-in admin.
+    
+    Returns:
+        Response: Metrics in text exposition format
+    """
+    token = app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+    if not authorized and not (current_user.is_authenticated
+                               and current_user.email.lower() in app.config['ADMIN_EMAILS']):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(_render_metrics(), mimetype='text/plain; version=0.0.4')
+
 # === Helper Functions ===
+def _get_timezone(name):
+    """Look up a timezone by name, falling back to UTC for unknown names."""
+    try:
+        return pytz.timezone(name or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
+def _get_user_now(user=None):
+    """Get the current wall-clock time in a user's timezone.
+    
+    Transaction dates (and so the rollup days) are calendar dates in the
+    user's own timezone, as entered, imported or generated by recurring
+    rules, so every period boundary must come from the user's local clock
+    rather than UTC. The offset in effect right now, DST included, is used.
+    
+    Args:
+        user (User, optional): User whose timezone to use (default: current_user)
+        
+    Returns:
+        datetime: Naive local date and time
+    """
+    user = user if user is not None else current_user
+    return datetime.now(_get_timezone(user.timezone)).replace(tzinfo=None)
+
+# Categories every new user starts with
+DEFAULT_EXPENSE_CATEGORIES = [
+    'Housing', 'Transportation', 'Food', 'Utilities', 
+    'Insurance', 'Healthcare', 'Entertainment',
+    'Personal Care', 'Education', 'Gifts', 'Other'
+]
+DEFAULT_INCOME_CATEGORIES = [
+    'Salary', 'Bonus', 'Allowance', 'Petty Cash', 
+    'Investment', 'Interest', 'Rental', 'Other Income'
+]
+
 def _create_default_categories(user_id):
     """Create default income and expense categories for new users.
     
     Args:
         user_id (int): ID of the user to create categories for
     """
-    expense_categories = [
-        'Housing', 'Transportation', 'Food', 'Utilities', 
-        'Insurance', 'Healthcare', 'Entertainment',
-        'Personal Care', 'Education', 'Gifts', 'Other'
-    ]
-    income_categories = [
-        'Salary', 'Bonus', 'Allowance', 'Petty Cash', 
-        'Investment', 'Interest', 'Rental', 'Other Income'
-    ]
-    
-    for category_name in expense_categories:
-        category = Category(name=category_name, user_id=user_id, type='expense')
-        db.session.add(category)
+    # One executemany instead of an INSERT per category
+    db.session.execute(db.insert(Category), [
+        {'name': category_name, 'user_id': user_id, 'type': 'expense'}
+        for category_name in DEFAULT_EXPENSE_CATEGORIES
+    ] + [
+        {'name': category_name, 'user_id': user_id, 'type': 'income'}
+        for category_name in DEFAULT_INCOME_CATEGORIES
+    ])
     
-    for category_name in income_categories:
-        category = Category(name=category_name, user_id=user_id, type='income')
-        db.session.add(category)
-        
+    _bump_data_version(user_id)
     db.session.commit()
 
-def _calculate_dashboard_metrics(timeframe):
-    """Calculate financial metrics for the dashboard.
+def _add_rollup_delta(deltas, transaction, sign):
+    """Accumulate a transaction's contribution to the rollup tables.
     
     Args:
-        timeframe (str): Period to calculate metrics for ('month', 'quarter', 'year')
-        
-    Returns:
-        dict: Dictionary containing calculated metrics
+        deltas (dict): Pending (total cents, count) deltas keyed by
+                       (user_id, category_id, type, day)
+        transaction (Transaction): Transaction being added or removed
+        sign (int): 1 when the transaction is added, -1 when it is removed
+    """
+    key = (
+        int(transaction.user_id),
+        int(transaction.category_id),
+        transaction.type,
+        transaction.date.date()
+    )
+    total, count = deltas.get(key, (0, 0))
+    deltas[key] = (total + sign * transaction.amount_cents, count + sign)
+
+def _apply_rollup_deltas(deltas):
+    """Apply accumulated deltas to the daily and monthly rollups.
+    
+    The upserts run in the current database transaction, so they are
+    committed or rolled back together with the transaction write itself.
+    Rollup rows whose count drops to zero are removed.
+    
+    Args:
+        deltas (dict): (total cents, count) deltas keyed by (user_id, category_id, type, day)
     """
-    today = datetime.utcnow()
+    monthly_deltas = {}
+    for (user_id, category_id, type_, day), (total, count) in deltas.items():
+        key = (user_id, category_id, type_, day.replace(day=1))
+        month_total, month_count = monthly_deltas.get(key, (0, 0))
+        monthly_deltas[key] = (month_total + total, month_count + count)
     
-    # Calculate date ranges
-    if timeframe == 'month':
-        start_date = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        last_start_date = (start_date - timedelta(days=1)).replace(day=1)
-    elif timeframe == 'quarter':
-        current_quarter = (today.month - 1) // 3 + 1
-        start_date = today.replace(month=(current_quarter - 1) * 3 + 1, day=1)
-        if current_quarter == 1:
-            last_start_date = start_date.replace(year=start_date.year - 1, month=10, day=1)
-        else:
-            last_start_date = start_date.replace(month=((current_quarter - 2) * 3 + 1))
-    else:  # year
-        start_date = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-        last_start_date = start_date.replace(year=start_date.year - 1)
-    
-    # Get transactions for current and previous periods
-    current_transactions = Transaction.query.filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= start_date,
-        Transaction.date <= today
-    ).all()
-    
-    previous_transactions = Transaction.query.filter(
-        Transaction.user_id == current_user.id,
-        Transaction.date >= last_start_date,
-        Transaction.date < start_date
-    ).all()
+    for model, period, period_deltas in (
+        (DailyRollup, 'day', deltas),
+        (MonthlyRollup, 'month', monthly_deltas)
+    ):
+        values = [
+            {
+                'user_id': user_id,
+                period: period_start,
+                'category_id': category_id,
+                'type': type_,
+                'total_cents': total,
+                'count': count
+            }
+            for (user_id, category_id, type_, period_start), (total, count) in period_deltas.items()
+            if total or count
+        ]
+        if not values:
+            continue
+        
+        table = model.__table__
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', period, 'category_id', 'type'],
+            set_={
+                'total_cents': table.c.total_cents + stmt.excluded.total_cents,
+                'count': table.c.count + stmt.excluded.count
+            }
+        )
+        db.session.execute(stmt, values)
+        
+        if any(value['count'] < 0 for value in values):
+            db.session.execute(db.delete(model).where(
+                model.user_id.in_({value['user_id'] for value in values}),
+                model.count <= 0
+            ))
     
-    # Calculate metrics
-    current_income = sum(t.amount for t in current_transactions if t.type == 'income')
-    current_expenses = sum(t.amount for t in current_transactions if t.type == 'expense')
-    current_savings = current_income - current_expenses
-    current_balance = current_savings
+    _queue_analytics_deltas(deltas)
+
+def _rebuild_rollups(user_id=None):
+    """Recompute the rollup tables from raw transactions.
     
-    previous_income = sum(t.amount for t in previous_transactions if t.type == 'income')
-    previous_expenses = sum(t.amount for t in previous_transactions if t.type == 'expense')
-    previous_savings = previous_income - previous_expenses
+    Args:
+        user_id (int, optional): Only rebuild this user's rollups
+    """
+    for model in (DailyRollup, MonthlyRollup):
+        stmt = db.delete(model)
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        db.session.execute(stmt)
     
-    # Calculate changes
-    income_change = ((current_income - previous_income) / previous_income * 100) if previous_income > 0 else 0
-    expenses_change = ((current_expenses - previous_expenses) / previous_expenses * 100) if previous_expenses > 0 else 0
-    savings_change = ((current_savings - previous_savings) / previous_savings * 100) if previous_savings > 0 else 0
-    balance_change = savings_change
+    db.session.execute(db.insert(DailyRollup).from_select(
+        ['user_id', 'day', 'category_id', 'type', 'total_cents', 'count'],
+        _expected_daily_rollups(user_id)
+    ))
     
-    return {
-        'start_date': start_date,
-        'current_transactions': current_transactions,
-        'current_income': current_income,
-        'current_expenses': current_expenses,
-        'current_savings': current_savings,
-        'current_balance': current_balance,
-        'income_change': income_change,
-        'expenses_change': expenses_change,
-        'savings_change': savings_change,
-        'balance_change': balance_change
-    }
+    month = db.func.date(DailyRollup.day, 'start of month')
+    select = db.select(
+        DailyRollup.user_id,
+        month,
+        DailyRollup.category_id,
+        DailyRollup.type,
+        db.func.sum(DailyRollup.total_cents),
+        db.func.sum(DailyRollup.count)
+    ).group_by(DailyRollup.user_id, month, DailyRollup.category_id, DailyRollup.type)
+    if user_id is not None:
+        select = select.where(DailyRollup.user_id == user_id)
+    db.session.execute(db.insert(MonthlyRollup).from_select(
+        ['user_id', 'month', 'category_id', 'type', 'total_cents', 'count'],
+        select
+    ))
 
-def _get_dashboard_chart_data(timeframe, start_date):
-    """Get chart data for the dashboard.
+def _expected_daily_rollups(user_id=None):
+    """Build the query aggregating raw transactions into daily rollup rows.
     
     Args:
-        timeframe (str): Period to get data for ('month', 'quarter', 'year')
-        start_date (datetime): Start date of the period
+        user_id (int, optional): Only aggregate this user's transactions
         
     Returns:
-        dict: Dictionary containing chart labels and data series
+        Select: Query yielding (user_id, day, category_id, type, total cents, count)
     """
-    today = datetime.utcnow()
-    trend_labels = []
-    income_trend = []
-    expenses_trend = []
-    
-    if timeframe == 'month':
-        days_in_month = calendar.monthrange(today.year, today.month)[1]
-        for day in range(1, days_in_month + 1):
-            date = today.replace(day=day)
-            if date <= today:
-                trend_labels.append(date.strftime('%d %b'))
-                
-                # Get transactions for this day
-                day_transactions = Transaction.query.filter(
-                    Transaction.user_id == current_user.id,
-                    Transaction.date >= date,
-                    Transaction.date < date + timedelta(days=1)
-                ).all()
-                
-                income_trend.append(sum(t.amount for t in day_transactions if t.type == 'income'))
-                expenses_trend.append(sum(t.amount for t in day_transactions if t.type == 'expense'))
+    day = db.func.date(Transaction.date)
+    select = db.select(
+        Transaction.user_id,
+        day,
+        Transaction.category_id,
+        Transaction.type,
+        db.func.sum(Transaction.amount_cents),
+        db.func.count()
+    ).group_by(Transaction.user_id, day, Transaction.category_id, Transaction.type)
+    if user_id is not None:
+        select = select.where(Transaction.user_id == user_id)
+    return select
+
+def _verify_rollups(user_id=None):
+    """Compare the rollup tables against totals recomputed from raw transactions.
     
-    elif timeframe == 'quarter':
-        for month in range(3):
-            date = start_date.replace(month=start_date.month + month)
-            if date <= today:
-                trend_labels.append(date.strftime('%b %Y'))
-                
-                # Get transactions for this month
-                month_transactions = Transaction.query.filter(
-                    Transaction.user_id == current_user.id,
-                    Transaction.date >= date,
-                    Transaction.date < date + relativedelta(months=1)
-                ).all()
-                
-                income_trend.append(sum(t.amount for t in month_transactions if t.type == 'income'))
-                expenses_trend.append(sum(t.amount for t in month_transactions if t.type == 'expense'))
+    Args:
+        user_id (int, optional): Only verify this user's rollups
+        
+    Returns:
+        list: Descriptions of every mismatching rollup row
+    """
+    expected_daily = {}
+    expected_monthly = {}
+    for user, day, category_id, type_, total, count in db.session.execute(_expected_daily_rollups(user_id)):
+        day = datetime.strptime(day, '%Y-%m-%d').date()
+        expected_daily[(user, day, category_id, type_)] = (total, count)
+        key = (user, day.replace(day=1), category_id, type_)
+        month_total, month_count = expected_monthly.get(key, (0, 0))
+        expected_monthly[key] = (month_total + total, month_count + count)
     
-    else:  # year
-        for month in range(12):
-            date = start_date.replace(month=month + 1)
-            if date <= today:
-                trend_labels.append(date.strftime('%b %Y'))
-                
-                # Get transactions for this month
-                month_transactions = Transaction.query.filter(
-                    Transaction.user_id == current_user.id,
-                    Transaction.date >= date,
-                    Transaction.date < date + relativedelta(months=1)
-                ).all()
-                
-                income_trend.append(sum(t.amount for t in month_transactions if t.type == 'income'))
-                expenses_trend.append(sum(t.amount for t in month_transactions if t.type == 'expense'))
+    mismatches = []
+    for model, period, expected in (
+        (DailyRollup, 'day', expected_daily),
+        (MonthlyRollup, 'month', expected_monthly)
+    ):
+        query = model.query
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        stored = {
+            (row.user_id, getattr(row, period), row.category_id, row.type): (row.total_cents, row.count)
+            for row in query.all()
+        }
+        for key in sorted(set(expected) | set(stored), key=str):
+            expected_total, expected_count = expected.get(key, (0, 0))
+            stored_total, stored_count = stored.get(key, (0, 0))
+            if (expected_total, expected_count) != (stored_total, stored_count):
+                mismatches.append(
+                    f'{model.__tablename__} {key}: expected {_format_cents(expected_total)}/{expected_count}, '
+                    f'stored {_format_cents(stored_total)}/{stored_count}'
+                )
+    return mismatches
+
+def _rollup_for_range(start_date, end_date):
+    """Pick the smallest rollup table that answers a date range exactly.
     
-    return {
-        'labels': trend_labels,
-        'income': income_trend,
-        'expenses': expenses_trend
-    }
+    Args:
+        start_date (datetime): Start of the range (inclusive), at midnight
+        end_date (datetime): End of the range (exclusive), at midnight
+        
+    Returns:
+        tuple: (rollup model, its period column)
+    """
+    if start_date.day == 1 and end_date.day == 1:
+        return MonthlyRollup, MonthlyRollup.month
+    return DailyRollup, DailyRollup.day
 
-def _get_category_spending_data(transactions):
-    """Calculate spending by category from a list of transactions.
+# Supported trend granularities: bucket length of each period. Day and week
+# buckets are grouped from DailyRollup, the others from MonthlyRollup.
+TREND_GRANULARITIES = {
+    'day': relativedelta(days=1),
+    'week': relativedelta(weeks=1),
+    'month': relativedelta(months=1),
+    'quarter': relativedelta(months=3),
+    'year': relativedelta(years=1),
+}
+
+# strftime() formats of trend bucket labels (quarters are formatted apart)
+TREND_LABEL_FORMATS = {
+    'day': '%d %b',
+    'week': '%d %b',
+    'month': '%b %Y',
+    'year': '%Y',
+}
+
+def _get_trend_bucket_start(date, granularity):
+    """Floor a date to the start of its trend bucket (weeks start on Monday).
     
     Args:
-        transactions (list): List of Transaction objects
+        date (datetime): Date to floor
+        granularity (str): One of TREND_GRANULARITIES
         
     Returns:
-        dict: Dictionary containing category labels and amounts
+        datetime: Midnight at the start of the bucket
     """
-    category_data = {}
+    date = datetime(date.year, date.month, date.day)
+    if granularity == 'week':
+        return date - timedelta(days=date.weekday())
+    if granularity == 'month':
+        return date.replace(day=1)
+    if granularity == 'quarter':
+        return datetime(date.year, (date.month - 1) // 3 * 3 + 1, 1)
+    if granularity == 'year':
+        return datetime(date.year, 1, 1)
+    return date
+
+def _get_trend_bucket_column(granularity):
+    """Build the SQL expression grouping rollup rows into trend buckets.
     
-    for transaction in transactions:
-        if transaction.type == 'expense':
-            category_name = transaction.category.name
-            if category_name not in category_data:
-                category_data[category_name] = 0
-            category_data[category_name] += transaction.amount
+    Rollup days are already the users' local calendar dates, so buckets are
+    computed with SQLite date functions on them, never per row in Python.
     
-    return {
-        'labels': list(category_data.keys()),
-        'amounts': list(category_data.values())
-    }
+    Args:
+        granularity (str): One of TREND_GRANULARITIES
+        
+    Returns:
+        tuple: (rollup model, its period column, bucket start expression)
+    """
+    if granularity in ('day', 'week'):
+        model, period = DailyRollup, DailyRollup.day
+    else:
+        model, period = MonthlyRollup, MonthlyRollup.month
+    
+    if granularity == 'week':
+        bucket = db.func.date(period, '-6 days', 'weekday 1', type_=db.Date)
+    elif granularity == 'quarter':
+        months_into_quarter = (db.cast(db.func.strftime('%m', period), db.Integer) - 1) % 3
+        bucket = db.func.date(
+            period, db.literal('-') + db.cast(months_into_quarter, db.String) + ' months', type_=db.Date
+        )
+    elif granularity == 'year':
+        bucket = db.func.date(period, 'start of year', type_=db.Date)
+    else:
+        bucket = period
+    return model, period, bucket
 
-def _prepare_chart_data(timeframe, today):
-    """Prepare chart data for AJAX endpoint.
+def _format_trend_bucket(bucket, granularity):
+    """Format a trend bucket start as a chart label."""
+    if granularity == 'quarter':
+        return f'Q{(bucket.month - 1) // 3 + 1} {bucket.year}'
+    return bucket.strftime(TREND_LABEL_FORMATS[granularity])
+
+def _get_trend_series(user_id, start_date, end_date, granularity):
+    """Get income and expense totals per time bucket with a single grouped query.
+    
+    Day and week buckets are grouped from DailyRollup, longer ones from
+    MonthlyRollup (or read from the user's UserAnalytics index with
+    ANALYTICS_ENGINE=numpy). Buckets with no transactions are zero-filled, so
+    the series always covers the whole range, and the last bucket is always
+    complete.
     
     Args:
-        timeframe (str): Period to prepare data for
-        today (datetime): Current date
+        user_id (int): ID of the user to aggregate transactions for
+        start_date (datetime): Start of the range (inclusive), floored to a bucket boundary
+        end_date (datetime): End of the range (exclusive), at midnight
+        granularity (str): Bucket size, one of TREND_GRANULARITIES
         
     Returns:
-        dict: Dictionary containing chart data
+        dict: Dictionary containing bucket start dates and income/expense
+              series in minor units
     """
-    if timeframe == 'This Month':
-        start_date = datetime(today.year, today.month, 1)
-        labels = [(start_date + timedelta(days=x)).strftime('%d %b') for x in range(31)]
-        period = 'days'
-    elif timeframe == 'This Quarter':
-        quarter = (today.month - 1) // 3
-        start_date = datetime(today.year, quarter * 3 + 1, 1)
-        labels = [(start_date + relativedelta(months=x)).strftime('%b %Y') for x in range(3)]
-        period = 'months'
-    else:  # This Year
-        start_date = datetime(today.year, 1, 1)
-        labels = [(start_date + relativedelta(months=x)).strftime('%b %Y') for x in range(12)]
-        period = 'months'
+    step = TREND_GRANULARITIES[granularity]
+    start_date = _get_trend_bucket_start(start_date, granularity)
+    model, period, bucket = _get_trend_bucket_column(granularity)
     
-    income_data = []
-    expenses_data = []
+    buckets = []
+    date = start_date
+    while date < end_date:
+        buckets.append(date)
+        date += step
     
-    for i in range(len(labels)):
-        if period == 'days':
-            period_start = start_date + timedelta(days=i)
-            period_end = period_start + timedelta(days=1)
-        else:
-            period_start = start_date + relativedelta(months=i)
-            period_end = period_start + relativedelta(months=1)
-        
-        # Get transactions for this period
-        income = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.type == 'income',
-            Transaction.date >= period_start,
-            Transaction.date < period_end
-        ).scalar() or 0
-        
-        expenses = db.session.query(db.func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.type == 'expense',
-            Transaction.date >= period_start,
-            Transaction.date < period_end
-        ).scalar() or 0
-        
-        income_data.append(float(income))
-        expenses_data.append(float(expenses))
+    if _analytics_enabled():
+        income, expenses = _get_user_analytics(user_id).range_totals(buckets + [date])
+        return {'buckets': buckets, 'income': income.tolist(), 'expenses': expenses.tolist()}
+    
+    rows = db.session.query(
+        bucket,
+        model.type,
+        db.func.sum(model.total_cents)
+    ).filter(
+        model.user_id == user_id,
+        period >= start_date.date(),
+        period < date.date()
+    ).group_by(bucket, model.type).all()
+    totals = {(key, type_): amount for key, type_, amount in rows}
     
     return {
-        'labels': labels,
-        'income': income_data,
-        'expenses': expenses_data
+        'buckets': buckets,
+        'income': [totals.get((date.date(), 'income')) or 0 for date in buckets],
+        'expenses': [totals.get((date.date(), 'expense')) or 0 for date in buckets]
     }
 
-def _get_category_data_for_period(timeframe, today):
-    """Get category spending data for a specific period.
+def _get_category_spending_data(user_id, start_date, end_date):
+    """Get expense totals per category for a date range from the rollups.
     
     Args:
-        timeframe (str): Period to get data for
-        today (datetime): Current date
+        user_id (int): ID of the user to aggregate transactions for
+        start_date (datetime): Start of the range (inclusive), at midnight
+        end_date (datetime): End of the range (exclusive), at midnight
         
     Returns:
-        dict: Dictionary containing category data
+        dict: Dictionary containing category labels and amounts in minor units
     """
-    if timeframe == 'This Month':
-        start_date = datetime(today.year, today.month, 1)
-        end_date = start_date + relativedelta(months=1)
-    elif timeframe == 'This Quarter':
-        quarter = (today.month - 1) // 3
-        start_date = datetime(today.year, quarter * 3 + 1, 1)
-        end_date = start_date + relativedelta(months=3)
-    else:  # This Year
-        start_date = datetime(today.year, 1, 1)
-        end_date = datetime(today.year + 1, 1, 1)
+    if _analytics_enabled():
+        names = {
+            category['id']: category['name']
+            for category in _get_user_categories(user_id, _get_user_data_version(user_id))
+        }
+        totals = {}
+        for category_id, amount in _get_user_analytics(user_id).category_expenses(start_date, end_date).items():
+            if category_id in names:
+                totals[names[category_id]] = totals.get(names[category_id], 0) + amount
+        labels = sorted(totals)
+        return {'labels': labels, 'amounts': [totals[label] for label in labels]}
     
-    # Get category spending data
+    model, period = _rollup_for_range(start_date, end_date)
     category_data = db.session.query(
         Category.name,
-        db.func.sum(Transaction.amount)
-    ).join(Transaction).filter(
-        Transaction.user_id == current_user.id,
-        Transaction.type == 'expense',
-        Transaction.date >= start_date,
-        Transaction.date < end_date
+        db.func.sum(model.total_cents)
+    ).join(Category, Category.id == model.category_id).filter(
+        model.user_id == user_id,
+        model.type == 'expense',
+        period >= start_date.date(),
+        period < end_date.date()
     ).group_by(Category.name).all()
     
     return {
         'labels': [item[0] for item in category_data],
-        'amounts': [float(item[1]) for item in category_data]
+        'amounts': [item[1] for item in category_data]
     }
 
+TRANSACTIONS_PER_PAGE = 10
+
+class KeysetPage:
+    """One page of transactions returned by keyset pagination.
+    
+    Attributes:
+        items (list): Transactions on the page, newest first
+        has_prev (bool): Whether newer transactions exist
+        has_next (bool): Whether older transactions exist
+        prev_cursor (str): Cursor of the first item, for the previous page
+        next_cursor (str): Cursor of the last item, for the next page
+        total (int): Total number of matching transactions, if known
+    """
+    def __init__(self, items, has_prev, has_next):
+        self.items = items
+        self.has_prev = has_prev and bool(items)
+        self.has_next = has_next and bool(items)
+        self.prev_cursor = _encode_cursor(items[0]) if items else None
+        self.next_cursor = _encode_cursor(items[-1]) if items else None
+        self.total = None
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __len__(self):
+        return len(self.items)
+
+def _encode_cursor(transaction):
+    """Encode a transaction's (date, id) sort key as a pagination cursor.
+    
+    Args:
+        transaction (Transaction): Transaction at the edge of a page
+        
+    Returns:
+        str: Cursor of the form '<ISO date>_<id>'
+    """
+    return f'{transaction.date.isoformat()}_{transaction.id}'
+
+def _decode_cursor(cursor):
+    """Decode a pagination cursor back into its (date, id) sort key.
+    
+    Args:
+        cursor (str): Cursor produced by _encode_cursor()
+        
+    Returns:
+        tuple: (date, id)
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    date, _, id_ = cursor.rpartition('_')
+    date, id_ = datetime.fromisoformat(date), int(id_)
+    # An id SQLite cannot bind would fail in the query instead
+    if not 0 <= id_ < 2 ** 63:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return date, id_
+
+def _paginate_keyset(query, cursor, direction, per_page):
+    """Fetch one page of transactions ordered by (date, id) descending.
+    
+    Instead of an OFFSET, the page is selected with a row-value comparison
+    against the cursor, which the (user_id, date) indexes answer directly.
+    
+    Args:
+        query (Query): Filtered Transaction query
+        cursor (str): Cursor of the page edge, or None for the first page
+        direction (str): 'next' for older rows after the cursor, 'prev' for
+                         newer rows before it
+        per_page (int): Number of transactions per page
+        
+    Returns:
+        KeysetPage: The requested page
+    """
+    try:
+        key = _decode_cursor(cursor) if cursor else None
+    except ValueError:
+        key = None
+    sort_key = db.tuple_(Transaction.date, Transaction.id)
+    
+    if key is not None and direction == 'prev':
+        items = query.filter(sort_key > key)\
+            .order_by(Transaction.date.asc(), Transaction.id.asc())\
+            .limit(per_page + 1).all()
+        has_prev = len(items) > per_page
+        items = items[:per_page][::-1]
+        return KeysetPage(items, has_prev, True)
+    
+    if key is not None:
+        query = query.filter(sort_key < key)
+    items = query.order_by(Transaction.date.desc(), Transaction.id.desc())\
+        .limit(per_page + 1).all()
+    return KeysetPage(items[:per_page], key is not None, len(items) > per_page)
+
+# bm25 weights of the description, tags and owner columns of transaction_fts
+SEARCH_COLUMN_WEIGHTS = (1.0, 0.5, 0.0)
+SEARCH_MAX_RESULTS = 100
+SEARCH_MAX_TERMS = 10
+SEARCH_TERM_PATTERN = re.compile(r'\w+')
+
+def _build_fts_query(user_id, search):
+    """Build an FTS5 MATCH expression for a user's search text.
+    
+    Every word becomes a prefix term matched against the description and
+    tags, and all terms must match; the query is restricted to the user's
+    rows through the owner column.
+    
+    Args:
+        user_id (int): ID of the searching user
+        search (str): Search text as typed by the user
+        
+    Returns:
+        str: MATCH expression, or None if the text contains no words
+    """
+    terms = SEARCH_TERM_PATTERN.findall(search)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    # The column filter keeps terms such as 'u' off the owner tokens
+    return f'owner:u{int(user_id)} AND {{description tags}}:(' \
+        + ' AND '.join(f'"{term}"*' for term in terms) + ')'
+
+def _filter_full_text(query, user_id, search):
+    """Restrict a Transaction query to rows matching a full-text search.
+    
+    Args:
+        query (Query): Transaction query to filter
+        user_id (int): ID of the searching user
+        search (str): Search text as typed by the user
+        
+    Returns:
+        Query: Filtered query
+    """
+    fts_query = _build_fts_query(user_id, search)
+    if fts_query is None:
+        return query
+    return query.join(TRANSACTION_FTS, TRANSACTION_FTS.c.rowid == Transaction.id)\
+        .filter(db.literal_column('transaction_fts').op('MATCH')(fts_query))
+
+# Tags longer than this are truncated to fit Tag.name
+TAG_MAX_LENGTH = 50
+# Transactions whose tags are synchronized per batch when rebuilding
+TAG_SYNC_BATCH_SIZE = 1000
+TAG_SPLIT_PATTERN = re.compile(r'[,;]')
+
+# strftime() formats grouping tag totals into periods
+TAG_PERIOD_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+def _parse_tags(value):
+    """Split a comma-separated tag string into normalized tag names.
+    
+    Args:
+        value (str): Tags as entered or stored, may be None
+        
+    Returns:
+        list: Unique lower-case tag names in their original order
+    """
+    names = []
+    for part in TAG_SPLIT_PATTERN.split(value or ''):
+        name = ' '.join(part.split()).lower()[:TAG_MAX_LENGTH]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def _format_tags(value):
+    """Normalize a tag string for storage in Transaction.tags.
+    
+    Args:
+        value (str): Tags as entered by the user
+        
+    Returns:
+        str: Comma-separated normalized tags, or None if there are none
+    """
+    return ','.join(_parse_tags(value))[:200] or None
+
+def _sync_transaction_tags(user_id, tags_by_transaction):
+    """Replace the tag associations of a batch of transactions.
+    
+    Missing tags are created with a single upsert and all links are
+    rewritten with set-based statements, so this works for one edited
+    transaction and for a whole migration batch alike.
+    
+    Args:
+        user_id (int): Owner of the transactions
+        tags_by_transaction (dict): Transaction ID -> tag string (None to
+                                    drop all of the transaction's tags)
+    """
+    if not tags_by_transaction:
+        return
+    names_by_transaction = {
+        transaction_id: _parse_tags(tags)
+        for transaction_id, tags in tags_by_transaction.items()
+    }
+    
+    db.session.execute(
+        transaction_tag.delete()
+        .where(transaction_tag.c.transaction_id.in_(list(names_by_transaction)))
+    )
+    
+    names = {name for tag_names in names_by_transaction.values() for name in tag_names}
+    if not names:
+        return
+    now = datetime.utcnow()
+    db.session.execute(
+        sqlite_insert(Tag.__table__)
+        .values([{'user_id': user_id, 'name': name, 'created_at': now} for name in names])
+        .on_conflict_do_nothing(index_elements=['user_id', 'name'])
+    )
+    tag_ids = dict(
+        db.session.query(Tag.name, Tag.id)
+        .filter(Tag.user_id == user_id, Tag.name.in_(names))
+        .all()
+    )
+    db.session.execute(transaction_tag.insert(), [
+        {'transaction_id': transaction_id, 'tag_id': tag_ids[name]}
+        for transaction_id, tag_names in names_by_transaction.items()
+        for name in tag_names
+    ])
+
+def _sync_all_transaction_tags(batch_size=TAG_SYNC_BATCH_SIZE):
+    """Rebuild the tag tables from every transaction's tag string.
+    
+    Args:
+        batch_size (int): Transactions synchronized per statement batch
+    """
+    rows = db.session.query(Transaction.user_id, Transaction.id, Transaction.tags)\
+        .filter(Transaction.tags.isnot(None), Transaction.tags != '')\
+        .order_by(Transaction.user_id, Transaction.id)\
+        .all()
+    batches = {}
+    for user_id, transaction_id, tags in rows:
+        batch = batches.setdefault(user_id, {})
+        batch[transaction_id] = tags
+        if len(batch) >= batch_size:
+            _sync_transaction_tags(user_id, batches.pop(user_id))
+    for user_id, batch in batches.items():
+        _sync_transaction_tags(user_id, batch)
+
+def _filter_tag(query, user_id, tag):
+    """Restrict a Transaction query to rows carrying a tag.
+    
+    Args:
+        query (Query): Transaction query to filter
+        user_id (int): ID of the user owning the tag
+        tag (str): Tag name, matched case-insensitively
+        
+    Returns:
+        Query: Filtered query
+    """
+    names = _parse_tags(tag)
+    tag_id = db.session.query(Tag.id)\
+        .filter(Tag.user_id == user_id, Tag.name == (names[0] if names else ''))\
+        .scalar_subquery()
+    tagged = db.select(transaction_tag.c.transaction_id)\
+        .where(transaction_tag.c.tag_id == tag_id)
+    return query.filter(Transaction.id.in_(tagged))
+
+def _get_tag_spending(user_id, start_date, end_date, granularity, type_='expense'):
+    """Total a user's transactions per tag and period in one grouped query.
+    
+    Args:
+        user_id (int): ID of the user
+        start_date (datetime): Inclusive start of the range, or None
+        end_date (datetime): Exclusive end of the range, or None
+        granularity (str): Key of TAG_PERIOD_FORMATS
+        type_ (str): 'expense' or 'income'
+        
+    Returns:
+        dict: 'periods' (sorted period labels) and 'tags' (tag name ->
+              {'total', 'periods': {period label -> total}}), with totals
+              summed in minor units and returned in major units
+    """
+    period = db.func.strftime(TAG_PERIOD_FORMATS[granularity], Transaction.date)
+    query = db.session.query(Tag.name, period, db.func.sum(Transaction.amount_cents))\
+        .select_from(Transaction)\
+        .join(transaction_tag, transaction_tag.c.transaction_id == Transaction.id)\
+        .join(Tag, Tag.id == transaction_tag.c.tag_id)\
+        .filter(Transaction.user_id == user_id, Transaction.type == type_)
+    if start_date is not None:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.filter(Transaction.date < end_date)
+    
+    periods = set()
+    tags = {}
+    for name, label, total in query.group_by(Tag.name, period).all():
+        periods.add(label)
+        entry = tags.setdefault(name, {'total': 0, 'periods': {}})
+        entry['periods'][label] = _from_cents(total)
+        entry['total'] += total
+    for entry in tags.values():
+        entry['total'] = _from_cents(entry['total'])
+    return {'periods': sorted(periods), 'tags': tags}
+
+def _get_transaction_count(user_id, type_=None):
+    """Count a user's transactions from the monthly rollups.
+    
+    Args:
+        user_id (int): ID of the user
+        type_ (str, optional): Only count 'income' or 'expense' transactions
+        
+    Returns:
+        int: Number of transactions
+    """
+    query = db.session.query(db.func.sum(MonthlyRollup.count))\
+        .filter(MonthlyRollup.user_id == user_id)
+    if type_:
+        query = query.filter(MonthlyRollup.type == type_)
+    return query.scalar() or 0
+
+def _bump_data_version(user_id=None):
+    """Invalidate everything cached for a user by bumping their data version.
+    
+    Must be called in the same database transaction as every write to the
+    user's transactions, budgets or categories.
+    
+    Args:
+        user_id (int, optional): User whose data changed (default: all users)
+    """
+    statement = db.update(User).values(data_version=User.data_version + 1)
+    if user_id is not None:
+        statement = statement.where(User.id == user_id)
+    db.session.execute(statement)
+    _invalidate_user_cache(user_id)
+
+def _invalidate_user_cache(user_id=None):
+    """Drop a user's cached record once the current transaction commits.
+    
+    Invalidating after the commit (rather than immediately) keeps a
+    concurrent request from re-caching the pre-commit row.
+    
+    Args:
+        user_id (int, optional): User to drop (default: all users)
+    """
+    db.session.info.setdefault('invalidated_users', set()).add(user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_user_cache_invalidations(session):
+    user_ids = session.info.pop('invalidated_users', ())
+    if None in user_ids:
+        user_cache.clear()
+        category_cache.clear()
+        return
+    for user_id in user_ids:
+        user_cache.pop(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_cache_invalidations(session):
+    session.info.pop('invalidated_users', None)
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed time.
+    
+    Attributes:
+        max_entries (int): Entries kept before evicting the least recently used
+        ttl (float): Seconds an entry stays valid; 0 disables the cache
+        hits (int): Lookups answered from the cache
+        misses (int): Lookups that found no valid entry
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+user_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+category_cache = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+def _get_user_categories(user_id, data_version):
+    """Get a user's categories, cached per data version.
+    
+    Category writes bump the data version, so a new version never sees a
+    stale list.
+    
+    Args:
+        user_id (int): ID of the user
+        data_version (int): The user's current data version
+        
+    Returns:
+        list: Categories as dicts with 'id', 'name' and 'type', ordered by
+              type and name
+    """
+    key = (user_id, data_version)
+    categories = category_cache.get(key)
+    if categories is None:
+        categories = [
+            {'id': row.id, 'name': row.name, 'type': row.type}
+            for row in db.session.query(Category.id, Category.name, Category.type)
+                .filter(Category.user_id == user_id)
+                .order_by(Category.type, Category.name)
+        ]
+        category_cache.set(key, categories)
+    return categories
+
+class SharedCacheStore:
+    """Size-bounded key/value store in a local SQLite file.
+    
+    Lets every worker process on a host share cached responses. Errors are
+    swallowed and reported as misses, so a broken store never breaks a page.
+    
+    Attributes:
+        path (str): Path of the SQLite file
+        max_entries (int): Number of entries kept; oldest writes are dropped
+    """
+    PRUNE_INTERVAL = 100
+    
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+    
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS response_cache '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_stored '
+                               'ON response_cache (stored)')
+            self._local.connection = connection
+        return connection
+    
+    def get(self, key):
+        try:
+            row = self._connect().execute(
+                'SELECT value FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+    
+    def set(self, key, value):
+        try:
+            connection = self._connect()
+            connection.execute('INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?)',
+                               (key, json.dumps(value), time.time()))
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                # Everything from the (max_entries + 1)-th newest entry on
+                connection.execute(
+                    'DELETE FROM response_cache WHERE stored <= ('
+                    'SELECT stored FROM response_cache ORDER BY stored DESC LIMIT 1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+        except sqlite3.Error:
+            pass
+
+class ResponseCache:
+    """Thread-safe LRU cache of JSON-serializable responses.
+    
+    Keys include the user's data version, so writes never have to delete
+    entries: stale versions are simply no longer requested and age out.
+    
+    Attributes:
+        max_entries (int): Entries kept in process before evicting the least
+                           recently used one
+        shared (SharedCacheStore): Optional second-level store
+        hits (int): Lookups answered from the cache
+        misses (int): Lookups that had to build the response
+        evictions (int): Entries dropped to respect max_entries
+    """
+    def __init__(self, max_entries, shared=None):
+        self.max_entries = max_entries
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self.shared.get(key) if self.shared else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._store(key, value)
+        return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        if self.shared:
+            self.shared.set(key, value)
+    
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'shared': self.shared is not None
+            }
+
+response_cache = ResponseCache(
+    app.config['RESPONSE_CACHE_SIZE'],
+    SharedCacheStore(app.config['RESPONSE_CACHE_PATH'], app.config['RESPONSE_CACHE_SIZE'])
+    if app.config['RESPONSE_CACHE_PATH'] else None
+)
+
+def _get_cached_response(endpoint, params, build):
+    """Return a current user's cached response, building it on a miss.
+    
+    Args:
+        endpoint (str): Name of the cached endpoint
+        params (tuple): Request parameters the response depends on
+        build (callable): Computes the JSON-serializable response
+        
+    Returns:
+        dict: The cached or freshly built response
+    """
+    key = '|'.join(str(part) for part in
+                   (current_user.id, current_user.data_version, endpoint) + tuple(params))
+    value = response_cache.get(key)
+    if value is None:
+        value = build()
+        response_cache.set(key, value)
+    return value
+
+class QueryCounter:
+    """Context manager counting the SQL statements executed on the database engine.
+    
+    Used to check that a code path issues a fixed number of queries, e.g.::
+    
+        with QueryCounter() as counter:
+            _build_reports_data(user_id, 'month', now)
+        assert counter.count <= REPORTS_MAX_QUERIES
+    
+    Transaction control statements (BEGIN) are not counted.
+    
+    Attributes:
+        count (int): Number of statements executed so far
+        statements (list): SQL text of every executed statement
+    """
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('BEGIN'):
+            return
+        self.count += 1
+        self.statements.append(statement)
+    
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return False
+
+# Queries issued by _build_reports_data, independent of timeframe and budget count
+REPORTS_MAX_QUERIES = 6
+
+def _get_report_period(timeframe, now):
+    """Calculate the current and previous period boundaries for a report.
+    
+    Args:
+        timeframe (str): Report period ('month', 'quarter', 'year')
+        now (datetime): Current date
+        
+    Returns:
+        tuple: (start_date, end_date, prev_start) where the previous period
+               runs from prev_start up to start_date
+    """
+    if timeframe == 'month':
+        start_date = datetime(now.year, now.month, 1)
+        end_date = start_date + relativedelta(months=1)
+        prev_start = start_date - relativedelta(months=1)
+    elif timeframe == 'quarter':
+        quarter = (now.month - 1) // 3
+        start_date = datetime(now.year, quarter * 3 + 1, 1)
+        end_date = start_date + relativedelta(months=3)
+        prev_start = start_date - relativedelta(months=3)
+    else:  # year
+        start_date = datetime(now.year, 1, 1)
+        end_date = datetime(now.year + 1, 1, 1)
+        prev_start = datetime(now.year - 1, 1, 1)
+    return start_date, end_date, prev_start
+
+def _percent_change(current, previous):
+    """Calculate the percentage change between two period values.
+    
+    Args:
+        current (float): Value for the current period
+        previous (float): Value for the previous period
+        
+    Returns:
+        float: Percentage change, or 0 when the previous value is not positive
+    """
+    return ((current - previous) / previous * 100) if previous > 0 else 0
+
+def _get_period_totals(user_id, start_date, end_date, prev_start):
+    """Get income and expense totals for the current and previous periods in one query.
+    
+    Args:
+        user_id (int): ID of the user to aggregate transactions for
+        start_date (datetime): Start of the current period (end of the previous one)
+        end_date (datetime): End of the current period (exclusive), at midnight
+        prev_start (datetime): Start of the previous period, at midnight
+        
+    Returns:
+        dict: Totals in minor units keyed by ('current' | 'previous', 'income' | 'expense')
+    """
+    if _analytics_enabled():
+        income, expenses = _get_user_analytics(user_id).range_totals([prev_start, start_date, end_date])
+        return {
+            ('previous', 'income'): int(income[0]),
+            ('previous', 'expense'): int(expenses[0]),
+            ('current', 'income'): int(income[1]),
+            ('current', 'expense'): int(expenses[1]),
+        }
+    
+    model, period_start = _rollup_for_range(prev_start, end_date)
+    period = db.case((period_start >= start_date.date(), 'current'), else_='previous')
+    rows = db.session.query(
+        period,
+        model.type,
+        db.func.sum(model.total_cents)
+    ).filter(
+        model.user_id == user_id,
+        period_start >= prev_start.date(),
+        period_start < end_date.date()
+    ).group_by(period, model.type).all()
+    
+    totals = {
+        (name, type_): 0
+        for name in ('current', 'previous')
+        for type_ in ('income', 'expense')
+    }
+    for name, type_, amount in rows:
+        totals[(name, type_)] = amount or 0
+    return totals
+
+def _budget_period_start(timeframe, now):
+    """Calculate the start of a budget's current period.
+    
+    Args:
+        timeframe (str): Budget timeframe ('weekly', 'monthly', 'yearly')
+        now (datetime): Current date
+        
+    Returns:
+        datetime: Midnight at the start of the current period
+    """
+    if timeframe == 'monthly':
+        return datetime(now.year, now.month, 1)
+    elif timeframe == 'weekly':
+        return datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+    else:  # yearly
+        return datetime(now.year, 1, 1)
+
+def _get_budgets_spent(user_id, budgets, now):
+    """Calculate the amount spent against several budgets with one grouped query.
+    
+    Each budget timeframe present gets its own conditional sum column, so
+    weekly, monthly and yearly budgets are answered by the same scan of the
+    daily rollups, however many budgets the user has.
+    
+    Args:
+        user_id (int): ID of the user owning the budgets
+        budgets (list): List of Budget objects
+        now (datetime): Current date
+        
+    Returns:
+        dict: Minor units spent keyed by budget ID
+    """
+    if not budgets:
+        return {}
+    
+    period_starts = {
+        timeframe: _budget_period_start(timeframe, now)
+        for timeframe in sorted({budget.timeframe for budget in budgets})
+    }
+    if _analytics_enabled():
+        analytics = _get_user_analytics(user_id)
+        spent_by_timeframe = {
+            timeframe: analytics.category_expenses(start)
+            for timeframe, start in period_starts.items()
+        }
+        return {
+            budget.id: spent_by_timeframe[budget.timeframe].get(budget.category_id, 0)
+            for budget in budgets
+        }
+    
+    timeframes = list(period_starts)
+    rows = db.session.query(
+        DailyRollup.category_id,
+        *[
+            db.func.sum(db.case((DailyRollup.day >= period_starts[timeframe].date(), DailyRollup.total_cents), else_=0))
+            for timeframe in timeframes
+        ]
+    ).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.type == 'expense',
+        DailyRollup.category_id.in_({budget.category_id for budget in budgets}),
+        DailyRollup.day >= min(period_starts.values()).date()
+    ).group_by(DailyRollup.category_id).all()
+    
+    spent_by_category = {
+        row[0]: dict(zip(timeframes, row[1:]))
+        for row in rows
+    }
+    return {
+        budget.id: spent_by_category.get(budget.category_id, {}).get(budget.timeframe) or 0
+        for budget in budgets
+    }
+
+def _build_reports_data(user_id, timeframe, now):
+    """Compute every metric shown on the reports page.
+    
+    The whole report is answered by REPORTS_MAX_QUERIES grouped queries:
+    period totals, trend series, category breakdown, budgets, budget actuals
+    and the 6-month savings series. Everything is computed in minor units
+    and converted to major units for the template.
+    
+    Args:
+        user_id (int): ID of the user to build the report for
+        timeframe (str): Report period ('month', 'quarter', 'year')
+        now (datetime): Current date
+        
+    Returns:
+        dict: Template context for reports.html
+    """
+    start_date, end_date, prev_start = _get_report_period(timeframe, now)
+    
+    # Current vs previous period totals
+    totals = _get_period_totals(user_id, start_date, end_date, prev_start)
+    current_income = totals[('current', 'income')]
+    current_expenses = totals[('current', 'expense')]
+    prev_income = totals[('previous', 'income')]
+    prev_expenses = totals[('previous', 'expense')]
+    
+    current_savings = current_income - current_expenses
+    prev_savings = prev_income - prev_expenses
+    
+    savings_rate = (current_savings / current_income * 100) if current_income > 0 else 0
+    prev_savings_rate = (prev_savings / prev_income * 100) if prev_income > 0 else 0
+    
+    # Trend series: daily for a month, monthly otherwise
+    trend = _get_trend_series(
+        user_id, start_date, end_date,
+        'day' if timeframe == 'month' else 'month'
+    )
+    
+    # Category breakdown
+    category_data = _get_category_spending_data(user_id, start_date, end_date)
+    
+    # Budget vs actual
+    budgets = Budget.query.options(joinedload(Budget.category)).filter_by(user_id=user_id).all()
+    spent = _get_budgets_spent(user_id, budgets, now)
+    
+    # Monthly savings for the last six months
+    savings_start = datetime(now.year, now.month, 1) - relativedelta(months=5)
+    savings = _get_trend_series(
+        user_id, savings_start, savings_start + relativedelta(months=6), 'month'
+    )
+    
+    return {
+        'total_income': _from_cents(current_income),
+        'total_expenses': _from_cents(current_expenses),
+        'net_savings': _from_cents(current_savings),
+        'savings_rate': savings_rate,
+        'income_change': _percent_change(current_income, prev_income),
+        'expenses_change': _percent_change(current_expenses, prev_expenses),
+        'savings_change': _percent_change(current_savings, prev_savings),
+        'savings_rate_change': savings_rate - prev_savings_rate,
+        'trend_labels': [date.strftime('%Y-%m-%d') for date in trend['buckets']],
+        'income_trend': [_from_cents(total) for total in trend['income']],
+        'expenses_trend': [_from_cents(total) for total in trend['expenses']],
+        'category_labels': category_data['labels'],
+        'category_data': [_from_cents(total) for total in category_data['amounts']],
+        'budget_labels': [budget.category.name for budget in budgets],
+        'budget_data': [budget.limit_amount for budget in budgets],
+        'actual_data': [_from_cents(spent[budget.id]) for budget in budgets],
+        'savings_labels': [date.strftime('%b %Y') for date in savings['buckets']],
+        'savings_data': [
+            _from_cents(income - expenses)
+            for income, expenses in zip(savings['income'], savings['expenses'])
+        ]
+    }
+
+# Column order of exported (and importable) transaction CSV files
+EXPORT_CSV_HEADER = ['Date', 'Type', 'Category', 'Description', 'Amount']
+
+# Rows fetched per round trip while exporting, and CSV bytes buffered per chunk
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Most ranges accepted by one /reports/ranges request
+RANGE_MAX_RANGES = 500
+# Default trailing windows of /reports/rolling, and its limits (in days)
+ROLLING_WINDOWS = (7, 30, 90)
+ROLLING_MAX_WINDOW = 3660
+ROLLING_MAX_DAYS = 366
+
+def _parse_date_ranges(values):
+    """Parse 'YYYY-MM-DD..YYYY-MM-DD' range arguments.
+    
+    Args:
+        values (list): Range arguments; the start is inclusive, the end exclusive
+        
+    Returns:
+        list: (start, end) datetime tuples in argument order
+        
+    Raises:
+        ValueError: If there are no ranges or too many, or a range is
+                    malformed or empty
+    """
+    if not values:
+        raise ValueError('No range given')
+    if len(values) > RANGE_MAX_RANGES:
+        raise ValueError(f'At most {RANGE_MAX_RANGES} ranges per request')
+    ranges = []
+    for value in values:
+        start, separator, end = value.partition('..')
+        # fromisoformat() is much faster than strptime() for hundreds of ranges
+        try:
+            if len(start) != 10 or len(end) != 10:
+                raise ValueError
+            start_date = datetime.fromisoformat(start)
+            end_date = datetime.fromisoformat(end)
+        except ValueError:
+            raise ValueError(f'Invalid range: {value}')
+        if not separator or start_date >= end_date:
+            raise ValueError(f'Invalid range: {value}')
+        ranges.append((start_date, end_date))
+    return ranges
+
+def _get_range_totals(user_id, starts, ends, by_category=False):
+    """Total income and expenses of many [start, end) date ranges at once.
+    
+    With the NumPy engine the ranges are looked up in the user's prefix-sum
+    index. Otherwise one grouped query reads the daily rollups covering all
+    ranges, and running sums over those days answer each range with two
+    binary searches, whatever its length.
+    
+    Args:
+        user_id (int): ID of the user
+        starts (list): Start of each range (inclusive), as datetimes or day ordinals
+        ends (list): End of each range (exclusive), as datetimes or day ordinals
+        by_category (bool): Also total every range per category
+        
+    Returns:
+        tuple: (income, expenses, categories) where income and expenses are
+               lists of minor units, one per range, and categories is None
+               or (category_ids, income rows, expense rows) with one row per
+               range and one column per category
+    """
+    if _analytics_enabled():
+        analytics = _get_user_analytics(user_id)
+        income, expenses = analytics.totals(starts, ends)
+        categories = None
+        if by_category:
+            category_income, category_expenses = analytics.category_totals(starts, ends)
+            categories = (analytics.category_ids.tolist(),
+                          category_income.tolist(), category_expenses.tolist())
+        return income.tolist(), expenses.tolist(), categories
+    
+    starts = [day if isinstance(day, int) else day.toordinal() for day in starts]
+    ends = [day if isinstance(day, int) else day.toordinal() for day in ends]
+    columns = [DailyRollup.day, DailyRollup.type]
+    if by_category:
+        columns.append(DailyRollup.category_id)
+    rows = db.session.query(
+        *columns,
+        db.func.sum(DailyRollup.total_cents)
+    ).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day >= datetime.fromordinal(min(starts)).date(),
+        DailyRollup.day < datetime.fromordinal(max(ends)).date()
+    ).group_by(*columns).order_by(DailyRollup.day).all()
+    
+    # (type, category ID or None) -> ascending day ordinals and the running
+    # total before each of them, plus the grand total at the end
+    running = {}
+    for row in rows:
+        day, type_, total = row[0].toordinal(), row[1], row[-1]
+        keys = [(type_, None)] + ([(type_, row[2])] if by_category else [])
+        for key in keys:
+            days, sums = running.setdefault(key, ([], [0]))
+            if days and days[-1] == day:
+                sums[-1] += total
+            else:
+                days.append(day)
+                sums.append(sums[-1] + total)
+    
+    def totals(key):
+        if key not in running:
+            return [0] * len(starts)
+        days, sums = running[key]
+        return [sums[bisect_left(days, end)] - sums[bisect_left(days, start)]
+                for start, end in zip(starts, ends)]
+    
+    categories = None
+    if by_category:
+        category_ids = sorted({category_id for _, category_id in running if category_id is not None})
+        income_columns = [totals(('income', category_id)) for category_id in category_ids]
+        expense_columns = [totals(('expense', category_id)) for category_id in category_ids]
+        categories = (
+            category_ids,
+            [[column[index] for column in income_columns] for index in range(len(starts))],
+            [[column[index] for column in expense_columns] for index in range(len(starts))],
+        )
+    return totals(('income', None)), totals(('expense', None)), categories
+
+def _get_export_range(args, now):
+    """Resolve the date range of an export request.
+    
+    Args:
+        args (MultiDict): Request arguments ('timeframe', 'start', 'end')
+        now (datetime): Current date
+        
+    Returns:
+        tuple: (start_date, end_date, label); either bound may be None
+        
+    Raises:
+        ValueError: If a date is malformed or the range is empty
+    """
+    start = args.get('start')
+    end = args.get('end')
+    if start or end:
+        start_date = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end_date = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+        if start_date and end_date and start_date >= end_date:
+            raise ValueError('Export range is empty')
+        label = f"{start or 'start'}_to_{end or 'now'}"
+        return start_date, end_date, label
+    
+    timeframe = args.get('timeframe', 'month')
+    if timeframe == 'all':
+        return None, None, 'all'
+    if timeframe not in ('month', 'quarter', 'year'):
+        timeframe = 'year'
+    start_date, end_date, _ = _get_report_period(timeframe, now)
+    return start_date, end_date, timeframe
+
+def _get_export_rows(user_id, start_date=None, end_date=None):
+    """Build the batched query streaming a user's transactions for export.
+    
+    Category names are joined in the same query, and rows are fetched
+    EXPORT_BATCH_SIZE at a time so memory stays flat for any history size.
+    
+    Args:
+        user_id (int): ID of the user to export
+        start_date (datetime, optional): Start of the range (inclusive)
+        end_date (datetime, optional): End of the range (exclusive)
+        
+    Returns:
+        Query: Iterable of (date, type, category name, description, amount cents) rows
+    """
+    query = db.session.query(
+        Transaction.date,
+        Transaction.type,
+        Category.name,
+        Transaction.description,
+        Transaction.amount_cents
+    ).join(Category, Category.id == Transaction.category_id).filter(
+        Transaction.user_id == user_id
+    )
+    if start_date is not None:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date is not None:
+        query = query.filter(Transaction.date < end_date)
+    return query.order_by(Transaction.date, Transaction.id).yield_per(EXPORT_BATCH_SIZE)
+
+def _generate_export_csv(rows, header=True):
+    """Generate CSV text for exported transactions in chunks.
+    
+    Args:
+        rows (iterable): (date, type, category name, description, amount cents) rows
+        header (bool): Whether to start with the EXPORT_CSV_HEADER row
+        
+    Yields:
+        str: CSV chunks of roughly EXPORT_CHUNK_SIZE characters
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_CSV_HEADER)
+    for date, type_, category_name, description, amount_cents in rows:
+        writer.writerow([date.strftime('%Y-%m-%d'), type_, category_name, description or '',
+                         _format_cents(amount_cents)])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+# Rows inserted per bulk statement while importing, and characters read per OFX chunk
+IMPORT_CHUNK_SIZE = 10000
+IMPORT_READ_SIZE = 64 * 1024
+
+# Categories used for imported rows that carry no category (e.g. OFX statements)
+IMPORT_DEFAULT_CATEGORIES = {'expense': 'Other', 'income': 'Other Income'}
+
+# Format SQLAlchemy uses to store DateTime values in SQLite
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+IMPORT_INSERT_SQL = (
+    'INSERT INTO "transaction" (user_id, category_id, amount_cents, type, description, '
+    'date, recurring, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+OFX_TAG_PATTERN = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+# OFX transaction types implying a direction; TRNAMT must carry the matching sign
+OFX_TRANSACTION_TYPES = {'CREDIT': 'income', 'DEP': 'income', 'DEBIT': 'expense'}
+
+def _parse_import_file(stream, filename):
+    """Pick the parser for an import file based on its extension.
+    
+    Args:
+        stream (file): Text stream of the file
+        filename (str): Original file name
+        
+    Returns:
+        generator: Parsed transaction records
+    """
+    if filename.lower().endswith(('.ofx', '.qfx')):
+        return _parse_ofx_transactions(stream)
+    return _parse_csv_transactions(stream)
+
+def _parse_csv_transactions(stream):
+    """Stream-parse transactions from a CSV file in the export format.
+    
+    The Date, Category and Amount columns are required. When Type is missing
+    or empty, negative amounts are treated as expenses; a negative amount
+    given Type income is rejected rather than imported as income.
+    
+    Args:
+        stream (file): Text stream of the CSV file
+        
+    Yields:
+        dict: Record with date, type, category, description and amount_cents
+        
+    Raises:
+        ValueError: If a column is missing or a row cannot be parsed
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {name.strip().lower(): index for index, name in enumerate(header)}
+    for name in ('date', 'category', 'amount'):
+        if name not in columns:
+            raise ValueError(f'missing "{name.title()}" column')
+    
+    for line_number, row in enumerate(reader, start=2):
+        if not any(field.strip() for field in row):
+            continue
+        try:
+            amount = _to_cents(row[columns['amount']])
+            type_ = row[columns['type']].strip().lower() if 'type' in columns else ''
+            if not type_:
+                type_ = 'expense' if amount < 0 else 'income'
+            if type_ not in IMPORT_DEFAULT_CATEGORIES:
+                raise ValueError(f'unknown type "{type_}"')
+            if amount < 0 and type_ == 'income':
+                raise ValueError('negative amount for type "income"')
+            yield {
+                'date': _parse_import_date(row[columns['date']]),
+                'type': type_,
+                'category': row[columns['category']].strip(),
+                'description': row[columns['description']].strip() if 'description' in columns else '',
+                'amount_cents': abs(amount)
+            }
+        except (ValueError, IndexError) as e:
+            raise ValueError(f'line {line_number}: {e}') from None
+
+def _parse_import_date(value):
+    """Parse a YYYY-MM-DD date from an import file.
+    
+    Args:
+        value (str): Date text
+        
+    Returns:
+        datetime: Midnight of the given day
+        
+    Raises:
+        ValueError: If the text is not a YYYY-MM-DD date
+    """
+    value = value.strip()
+    if len(value) != 10:
+        raise ValueError(f'invalid date "{value}"')
+    # fromisoformat is implemented in C and much faster than strptime
+    return datetime.fromisoformat(value)
+
+def _parse_ofx_transactions(stream):
+    """Stream-parse the <STMTTRN> records of an OFX (SGML or XML) bank statement.
+    
+    Args:
+        stream (file): Text stream of the OFX file
+        
+    Yields:
+        dict: Record with date, type, category, description and amount_cents
+        
+    Raises:
+        ValueError: If a record is malformed or a </STMTTRN> has no opening tag
+    """
+    buffer = ''
+    # Line of the file buffer[0] is on, for error messages
+    line_number = 1
+    while True:
+        chunk = stream.read(IMPORT_READ_SIZE)
+        buffer += chunk
+        
+        while True:
+            end = buffer.find('</STMTTRN>')
+            if end == -1:
+                break
+            start = buffer.find('<STMTTRN>')
+            if start == -1 or start > end:
+                line_number += buffer.count('\n', 0, end)
+                raise ValueError(f'line {line_number}: </STMTTRN> without an opening <STMTTRN>')
+            line_number += buffer.count('\n', 0, start)
+            try:
+                yield _parse_ofx_transaction(buffer[start:end])
+            except ValueError as e:
+                raise ValueError(f'line {line_number}: {e}') from None
+            line_number += buffer.count('\n', start, end)
+            buffer = buffer[end + len('</STMTTRN>'):]
+        
+        if not chunk:
+            break
+        # Only keep the unfinished record (or a possibly split tag) in memory
+        start = buffer.rfind('<STMTTRN>')
+        if start == -1:
+            start = max(0, len(buffer) - len('<STMTTRN>'))
+        line_number += buffer.count('\n', 0, start)
+        buffer = buffer[start:]
+
+def _parse_ofx_transaction(block):
+    """Parse a single OFX <STMTTRN> block.
+    
+    Args:
+        block (str): Text of the block
+        
+    Returns:
+        dict: Record with date, type, category, description and amount_cents
+        
+    Raises:
+        ValueError: If the date or amount is missing or malformed, or the
+            amount's sign contradicts the TRNTYPE
+    """
+    fields = {
+        tag.upper(): value.strip()
+        for closing, tag, value in OFX_TAG_PATTERN.findall(block)
+        if not closing
+    }
+    try:
+        amount = _to_cents(fields['TRNAMT'].replace(',', '.'))
+        date = datetime.strptime(fields['DTPOSTED'][:8], '%Y%m%d')
+    except (KeyError, ValueError):
+        raise ValueError(f'invalid OFX transaction {fields.get("FITID", "")}'.strip()) from None
+    
+    type_ = 'expense' if amount < 0 else 'income'
+    expected = OFX_TRANSACTION_TYPES.get(fields.get('TRNTYPE', '').upper())
+    if amount and expected and expected != type_:
+        raise ValueError(f'TRNTYPE {fields["TRNTYPE"]} contradicts amount {fields["TRNAMT"]}')
+    
+    return {
+        'date': date,
+        'type': type_,
+        'category': '',
+        'description': fields.get('NAME') or fields.get('MEMO') or '',
+        'amount_cents': abs(amount)
+    }
+
+def _import_transactions(user_id, records, chunk_size=IMPORT_CHUNK_SIZE):
+    """Bulk insert parsed transaction records for a user.
+    
+    Category names are resolved through a lookup table loaded once (missing
+    categories are created), rows are inserted chunk_size at a time with
+    executemany, and the rollups are updated per chunk. The caller commits.
+    
+    Args:
+        user_id (int): ID of the user to import transactions for
+        records (iterable): Records yielded by one of the import parsers
+        chunk_size (int): Number of rows per bulk insert
+        
+    Returns:
+        int: Number of imported transactions
+    """
+    category_ids = {
+        (category.name.lower(), category.type): category.id
+        for category in Category.query.filter_by(user_id=user_id)
+    }
+    now = datetime.utcnow()
+    imported = 0
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            imported += _insert_import_chunk(user_id, chunk, category_ids, now)
+            chunk = []
+    if chunk:
+        imported += _insert_import_chunk(user_id, chunk, category_ids, now)
+    return imported
+
+def _insert_import_chunk(user_id, records, category_ids, now):
+    """Insert one chunk of imported records with a single executemany.
+    
+    Args:
+        user_id (int): ID of the user to import transactions for
+        records (list): Parsed transaction records
+        category_ids (dict): Category IDs keyed by (lowercase name, type); updated
+                             with any categories created for this chunk
+        now (datetime): Timestamp stored as created_at/updated_at
+        
+    Returns:
+        int: Number of inserted transactions
+    """
+    missing = {}
+    for record in records:
+        name = (record['category'] or IMPORT_DEFAULT_CATEGORIES[record['type']])[:50]
+        record['category'] = name
+        key = (name.lower(), record['type'])
+        if key not in category_ids:
+            missing.setdefault(key, name)
+    if missing:
+        created = {
+            key: Category(user_id=user_id, name=name, type=key[1])
+            for key, name in missing.items()
+        }
+        db.session.add_all(created.values())
+        db.session.flush()
+        category_ids.update({key: category.id for key, category in created.items()})
+    
+    # Rows are bound positionally in SQLite's DateTime storage format, which
+    # skips SQLAlchemy's per-value bind processing on this hot path
+    timestamp = now.strftime(SQLITE_DATETIME_FORMAT)
+    rows = []
+    deltas = {}
+    for record in records:
+        category_id = category_ids[(record['category'].lower(), record['type'])]
+        rows.append((
+            user_id,
+            category_id,
+            record['amount_cents'],
+            record['type'],
+            record['description'][:200],
+            record['date'].strftime(SQLITE_DATETIME_FORMAT),
+            False,
+            timestamp,
+            timestamp
+        ))
+        key = (user_id, category_id, record['type'], record['date'].date())
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + record['amount_cents'], count + 1)
+    
+    db.session.connection().exec_driver_sql(IMPORT_INSERT_SQL, rows)
+    _apply_rollup_deltas(deltas)
+    return len(rows)
+
+# Frequencies of recurring rules: relativedelta unit of one interval
+RECURRENCE_FREQUENCIES = {
+    'daily': 'days',
+    'weekly': 'weeks',
+    'monthly': 'months',
+    'yearly': 'years',
+}
+
+# Due rules processed per materializer batch
+RECURRING_BATCH_SIZE = 5000
+# Furthest any timezone runs ahead of UTC (Pacific/Kiritimati); rules due
+# before UTC now plus this are candidates for their owner's local day
+RECURRING_MAX_UTC_OFFSET = timedelta(hours=14)
+
+# Occurrences of the current batch, staged in a per-connection temp table so
+# that inserts, rollup deltas and tag links are all computed set-based
+RECURRING_STAGING_DDL = (
+    'CREATE TEMP TABLE IF NOT EXISTS recurring_occurrence '
+    '(rule_id INTEGER NOT NULL, date TEXT NOT NULL, PRIMARY KEY (rule_id, date))'
+)
+RECURRING_PENDING_SQL = """
+    FROM recurring_occurrence o JOIN recurring_rule r ON r.id = o.rule_id
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "transaction" t
+        WHERE t.recurring_rule_id = o.rule_id AND t.date = o.date
+    )"""
+RECURRING_DELTAS_SQL = (
+    'SELECT r.user_id, r.category_id, r.type, substr(o.date, 1, 10), sum(r.amount_cents), count(*)'
+    + RECURRING_PENDING_SQL
+    + ' GROUP BY r.user_id, r.category_id, r.type, substr(o.date, 1, 10)'
+)
+RECURRING_INSERT_SQL = (
+    'INSERT INTO "transaction" (user_id, category_id, amount_cents, type, description, date, '
+    'tags, recurring, recurring_rule_id, created_at, updated_at) '
+    'SELECT r.user_id, r.category_id, r.amount_cents, r.type, r.description, o.date, '
+    'r.tags, 1, r.id, ?, ?'
+    + RECURRING_PENDING_SQL
+)
+# Tag names are normalized (no commas), so the tag string is turned into a
+# JSON array and joined against the user's tags with json_each()
+RECURRING_TAGS_SQL = r"""
+    INSERT OR IGNORE INTO transaction_tag (transaction_id, tag_id)
+    SELECT t.id, tag.id
+    FROM recurring_occurrence o
+    JOIN recurring_rule r ON r.id = o.rule_id
+    JOIN "transaction" t ON t.recurring_rule_id = o.rule_id AND t.date = o.date
+    JOIN json_each('["' || replace(replace(replace(r.tags, '\', '\\'), '"', '\"'), ',', '","') || '"]') AS name
+    JOIN tag ON tag.user_id = r.user_id AND tag.name = name.value
+    WHERE r.tags IS NOT NULL
+"""
+
+def _recurrence_date(start_date, frequency, interval, index):
+    """Get the date of a recurring rule's occurrence.
+    
+    Args:
+        start_date (datetime): Date of the first occurrence
+        frequency (str): Key of RECURRENCE_FREQUENCIES
+        interval (int): Number of frequency units between occurrences
+        index (int): Zero-based occurrence number
+        
+    Returns:
+        datetime: Date of the occurrence
+    """
+    return start_date + relativedelta(**{RECURRENCE_FREQUENCIES[frequency]: interval * index})
+
+def _build_recurring_rule(transaction, form):
+    """Build the recurring rule requested for a new transaction, if any.
+    
+    Args:
+        transaction (Transaction): The first occurrence
+        form (MultiDict): Submitted 'frequency', 'interval' and 'end_date'
+        
+    Returns:
+        RecurringRule: Unsaved rule, or None if the transaction does not repeat
+        
+    Raises:
+        ValueError: If the interval or end date is malformed
+    """
+    frequency = form.get('frequency')
+    if frequency not in RECURRENCE_FREQUENCIES:
+        return None
+    interval = max(1, int(form.get('interval') or 1))
+    end = form.get('end_date')
+    end_date = datetime.strptime(end, '%Y-%m-%d') if end else None
+    
+    next_date = _recurrence_date(transaction.date, frequency, interval, 1)
+    return RecurringRule(
+        user_id=transaction.user_id,
+        category_id=transaction.category_id,
+        amount_cents=transaction.amount_cents,
+        type=transaction.type,
+        description=transaction.description,
+        tags=transaction.tags,
+        frequency=frequency,
+        interval=interval,
+        start_date=transaction.date,
+        end_date=end_date,
+        occurrences=1,
+        next_date=next_date if end_date is None or next_date <= end_date else None
+    )
+
+def _has_recurring_occurrence(rule_id, date):
+    """Check whether a rule already has a transaction dated exactly `date`.
+    
+    Args:
+        rule_id (int): ID of the recurring rule
+        date (datetime): Occurrence date
+        
+    Returns:
+        bool: True if an occurrence exists on that date
+    """
+    return db.session.query(
+        db.session.query(Transaction.id)
+        .filter(Transaction.recurring_rule_id == rule_id, Transaction.date == date)
+        .exists()
+    ).scalar()
+
+def _materialize_recurring(until=None, rule_ids=None, batch_size=RECURRING_BATCH_SIZE):
+    """Create every occurrence of the recurring rules due up to a date.
+    
+    Due rules are read in batches; each batch is staged and inserted with a
+    few set-based statements that skip occurrences which already exist, so
+    re-runs (or concurrent runs) never duplicate transactions. Rollups, tag
+    links and data versions are updated in the same database transaction.
+    
+    Args:
+        until (datetime, optional): Create occurrences dated up to and
+            including this (default: each rule owner's local current time,
+            so rules fire on the owner's calendar day rather than UTC's)
+        rule_ids (list, optional): Only materialize these rules
+        batch_size (int): Rules per batch
+        
+    Returns:
+        int: Number of transactions created
+    """
+    connection = db.session.connection()
+    connection.exec_driver_sql(RECURRING_STAGING_DDL)
+    horizon = until or datetime.utcnow() + RECURRING_MAX_UTC_OFFSET
+    local_now = {}
+    created = 0
+    last_id = 0
+    while True:
+        query = db.session.query(
+            RecurringRule.id,
+            RecurringRule.frequency,
+            RecurringRule.interval,
+            RecurringRule.start_date,
+            RecurringRule.end_date,
+            RecurringRule.occurrences,
+            RecurringRule.next_date,
+            User.timezone
+        ).join(User, User.id == RecurringRule.user_id).filter(
+            RecurringRule.next_date.isnot(None),
+            RecurringRule.next_date <= horizon,
+            RecurringRule.id > last_id
+        )
+        if rule_ids is not None:
+            query = query.filter(RecurringRule.id.in_(rule_ids))
+        rules = query.order_by(RecurringRule.id).limit(batch_size).all()
+        if not rules:
+            return created
+        last_id = rules[-1].id
+        
+        due = []
+        for rule in rules:
+            rule_until = until
+            if rule_until is None:
+                if rule.timezone not in local_now:
+                    local_now[rule.timezone] = datetime.now(_get_timezone(rule.timezone)).replace(tzinfo=None)
+                rule_until = local_now[rule.timezone]
+            if rule.next_date <= rule_until:
+                due.append((rule, rule_until))
+        if due:
+            created += _materialize_recurring_batch(connection, due)
+
+def _materialize_recurring_batch(connection, rules):
+    """Create the due occurrences of one batch of rules.
+    
+    Args:
+        connection (Connection): Connection of the current session
+        rules (list): (rule, until) pairs, where rule is a row of (id,
+                      frequency, interval, start_date, end_date, occurrences)
+                      and occurrences are created up to and including until
+        
+    Returns:
+        int: Number of transactions created
+    """
+    occurrences = []
+    updates = []
+    timestamp = datetime.utcnow().strftime(SQLITE_DATETIME_FORMAT)
+    for rule, until in rules:
+        last_date = min(until, rule.end_date) if rule.end_date else until
+        index = rule.occurrences
+        date = _recurrence_date(rule.start_date, rule.frequency, rule.interval, index)
+        while date <= last_date:
+            occurrences.append((rule.id, date.strftime(SQLITE_DATETIME_FORMAT)))
+            index += 1
+            date = _recurrence_date(rule.start_date, rule.frequency, rule.interval, index)
+        ended = rule.end_date is not None and date > rule.end_date
+        updates.append((
+            index,
+            None if ended else date.strftime(SQLITE_DATETIME_FORMAT),
+            timestamp,
+            rule.id
+        ))
+    
+    connection.exec_driver_sql('DELETE FROM recurring_occurrence')
+    connection.exec_driver_sql('INSERT INTO recurring_occurrence VALUES (?, ?)', occurrences)
+    deltas = {
+        (user_id, category_id, type_, datetime.strptime(day, '%Y-%m-%d').date()): (total, count)
+        for user_id, category_id, type_, day, total, count
+        in connection.exec_driver_sql(RECURRING_DELTAS_SQL)
+    }
+    connection.exec_driver_sql(RECURRING_INSERT_SQL, (timestamp, timestamp))
+    connection.exec_driver_sql(RECURRING_TAGS_SQL)
+    connection.exec_driver_sql(
+        'UPDATE recurring_rule SET occurrences = ?, next_date = ?, updated_at = ? WHERE id = ?',
+        updates
+    )
+    
+    _apply_rollup_deltas(deltas)
+    user_ids = {key[0] for key in deltas}
+    if user_ids:
+        db.session.execute(
+            db.update(User).where(User.id.in_(user_ids))
+            .values(data_version=User.data_version + 1)
+        )
+        for user_id in user_ids:
+            _invalidate_user_cache(user_id)
+    return sum(count for _, count in deltas.values())
+
+def _run_recurring_worker(interval):
+    """Materialize due recurring transactions every `interval` seconds."""
+    while True:
+        with app.app_context():
+            try:
+                _materialize_recurring()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Recurring transaction materialization failed')
+        time.sleep(interval)
+
+def _start_recurring_worker():
+    """Start the background materializer thread if RECURRING_INTERVAL is set.
+    
+    Returns:
+        Thread: The started daemon thread, or None when disabled
+    """
+    interval = app.config['RECURRING_INTERVAL']
+    if interval <= 0:
+        return None
+    worker = threading.Thread(target=_run_recurring_worker, args=(interval,),
+                              name='recurring-materializer', daemon=True)
+    worker.start()
+    return worker
+
+# Queries issued by _build_dashboard_snapshot, independent of timeframe
+DASHBOARD_MAX_QUERIES = 5
+
+def _build_dashboard_snapshot(user_id, data_version, timeframe, now):
+    """Build every dashboard widget from a fixed set of aggregate queries.
+    
+    Totals and charts are read from the rollups; only the five most recent
+    transactions are loaded, as plain rows joined with their category.
+    Amounts are aggregated in minor units and returned in major units, ready
+    for the template or JSON.
+    
+    Args:
+        user_id (int): ID of the user
+        data_version (int): The user's current data version
+        timeframe (str): Dashboard period ('month', 'quarter', 'year')
+        now (datetime): Current date
+        
+    Returns:
+        dict: 'timeframe', 'start_date', 'end_date', 'metrics', 'trend',
+              'category_spending', 'recent_transactions' and 'categories'
+    """
+    metrics = _calculate_dashboard_metrics(user_id, timeframe, now)
+    start_date = metrics.pop('start_date')
+    end_date = metrics.pop('end_date')
+    
+    recent = db.session.query(
+        Transaction.id,
+        Transaction.date,
+        Transaction.description,
+        Transaction.tags,
+        Transaction.type,
+        Transaction.amount_cents,
+        Transaction.category_id,
+        Category.name
+    ).join(Category, Category.id == Transaction.category_id)\
+        .filter(Transaction.user_id == user_id)\
+        .order_by(Transaction.date.desc(), Transaction.id.desc())\
+        .limit(5).all()
+    
+    trend = _get_dashboard_chart_data(user_id, timeframe, start_date, now)
+    category_spending = _get_category_spending_data(user_id, start_date, end_date)
+    
+    return {
+        'timeframe': timeframe,
+        'start_date': start_date,
+        'end_date': end_date,
+        'metrics': {
+            'balance': _from_cents(metrics['current_balance']),
+            'balance_change': metrics['balance_change'],
+            'income': _from_cents(metrics['current_income']),
+            'income_change': metrics['income_change'],
+            'expenses': _from_cents(metrics['current_expenses']),
+            'expenses_change': metrics['expenses_change'],
+            'savings': _from_cents(metrics['current_savings']),
+            'savings_change': metrics['savings_change']
+        },
+        'trend': {
+            'labels': trend['labels'],
+            'income': [_from_cents(total) for total in trend['income']],
+            'expenses': [_from_cents(total) for total in trend['expenses']]
+        },
+        'category_spending': {
+            'labels': category_spending['labels'],
+            'amounts': [_from_cents(total) for total in category_spending['amounts']]
+        },
+        'recent_transactions': [
+            {
+                'id': row.id,
+                'date': row.date,
+                'description': row.description,
+                'tags': row.tags,
+                'type': row.type,
+                'amount': _from_cents(row.amount_cents),
+                'category_id': row.category_id,
+                'category': {'name': row.name}
+            }
+            for row in recent
+        ],
+        'categories': _get_user_categories(user_id, data_version)
+    }
+
+def _calculate_dashboard_metrics(user_id, timeframe, today):
+    """Calculate financial metrics for the dashboard.
+    
+    Args:
+        user_id (int): ID of the user
+        timeframe (str): Period to calculate metrics for ('month', 'quarter', 'year')
+        today (datetime): Current date
+        
+    Returns:
+        dict: Dictionary containing calculated metrics, amounts in minor units
+    """
+
+    # Calculate date ranges; the current period runs up to and including today
+    if timeframe == 'month':
+        start_date = datetime(today.year, today.month, 1)
+        last_start_date = start_date - relativedelta(months=1)
+    elif timeframe == 'quarter':
+        current_quarter = (today.month - 1) // 3 + 1
+        start_date = datetime(today.year, (current_quarter - 1) * 3 + 1, 1)
+        last_start_date = start_date - relativedelta(months=3)
+    else:  # year
+        start_date = datetime(today.year, 1, 1)
+        last_start_date = datetime(today.year - 1, 1, 1)
+    end_date = datetime(today.year, today.month, today.day) + timedelta(days=1)
+    
+    # Current and previous period totals from the rollups
+    totals = _get_period_totals(user_id, start_date, end_date, last_start_date)
+    
+    # Calculate metrics
+    current_income = totals[('current', 'income')]
+    current_expenses = totals[('current', 'expense')]
+    current_savings = current_income - current_expenses
+    current_balance = current_savings
+    
+    previous_income = totals[('previous', 'income')]
+    previous_expenses = totals[('previous', 'expense')]
+    previous_savings = previous_income - previous_expenses
+    
+    # Calculate changes
+    income_change = _percent_change(current_income, previous_income)
+    expenses_change = _percent_change(current_expenses, previous_expenses)
+    savings_change = _percent_change(current_savings, previous_savings)
+    balance_change = savings_change
+    
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'current_income': current_income,
+        'current_expenses': current_expenses,
+        'current_savings': current_savings,
+        'current_balance': current_balance,
+        'income_change': income_change,
+        'expenses_change': expenses_change,
+        'savings_change': savings_change,
+        'balance_change': balance_change
+    }
+
+def _get_dashboard_chart_data(user_id, timeframe, start_date, today):
+    """Get chart data for the dashboard.
+    
+    Args:
+        user_id (int): ID of the user
+        timeframe (str): Period to get data for ('month', 'quarter', 'year')
+        start_date (datetime): Start date of the period
+        today (datetime): Current date
+        
+    Returns:
+        dict: Dictionary containing chart labels and data series
+    """
+
+    if timeframe == 'month':
+        # One bucket per day of the current month, up to and including today
+        series = _get_trend_series(
+            user_id,
+            datetime(today.year, today.month, 1),
+            datetime(today.year, today.month, today.day) + timedelta(days=1),
+            'day'
+        )
+        label_format = '%d %b'
+    else:
+        # One bucket per month of the period, up to and including this month
+        months = 3 if timeframe == 'quarter' else 12
+        period_end = datetime(start_date.year, start_date.month, 1) + relativedelta(months=months)
+        series = _get_trend_series(
+            user_id,
+            start_date,
+            min(period_end, datetime(today.year, today.month, 1) + relativedelta(months=1)),
+            'month'
+        )
+        label_format = '%b %Y'
+    
+    return {
+        'labels': [bucket.strftime(label_format) for bucket in series['buckets']],
+        'income': series['income'],
+        'expenses': series['expenses']
+    }
+
+def _prepare_chart_data(timeframe, today, granularity=None):
+    """Prepare chart data for AJAX endpoint.
+    
+    Args:
+        timeframe (str): Period to prepare data for
+        today (datetime): Current date in the user's timezone
+        granularity (str, optional): Bucket size overriding the timeframe's default
+        
+    Returns:
+        dict: Dictionary containing chart data
+    """
+    if timeframe == 'This Month':
+        start_date = datetime(today.year, today.month, 1)
+        end_date = start_date + relativedelta(months=1)
+        granularity = granularity or 'day'
+    elif timeframe == 'This Quarter':
+        quarter = (today.month - 1) // 3
+        start_date = datetime(today.year, quarter * 3 + 1, 1)
+        end_date = start_date + relativedelta(months=3)
+        granularity = granularity or 'month'
+    else:  # This Year
+        start_date = datetime(today.year, 1, 1)
+        end_date = datetime(today.year + 1, 1, 1)
+        granularity = granularity or 'month'
+    
+    series = _get_trend_series(current_user.id, start_date, end_date, granularity)
+    
+    return {
+        'labels': [_format_trend_bucket(bucket, granularity) for bucket in series['buckets']],
+        'income': series['income'],
+        'expenses': series['expenses']
+    }
+
+def _get_category_data_for_period(timeframe, today):
+    """Get category spending data for a specific period.
+    
+    Args:
+        timeframe (str): Period to get data for
+        today (datetime): Current date
+        
+    Returns:
+        dict: Dictionary containing category data
+    """
+    if timeframe == 'This Month':
+        start_date = datetime(today.year, today.month, 1)
+        end_date = start_date + relativedelta(months=1)
+    elif timeframe == 'This Quarter':
+        quarter = (today.month - 1) // 3
+        start_date = datetime(today.year, quarter * 3 + 1, 1)
+        end_date = start_date + relativedelta(months=3)
+    else:  # This Year
+        start_date = datetime(today.year, 1, 1)
+        end_date = datetime(today.year + 1, 1, 1)
+    
+    return _get_category_spending_data(current_user.id, start_date, end_date)
+
+# === Columnar Analytics ===
+# With ANALYTICS_ENGINE=numpy every user has a prefix-sum index over their
+# daily rollups: running income and expense totals per day and category,
+# held in NumPy arrays. The total of any [start, end) range is the difference
+# of two rows, so custom ranges and rolling windows cost the same however
+# long they are. The index is loaded with one query, cached per data version,
+# and patched in place by the writing process when transactions change.
+#
+# The aggregate helpers (_get_period_totals, _get_trend_series,
+# _get_category_spending_data, _get_budgets_spent and _get_range_totals)
+# read the index instead of issuing a grouped query each.
+
+# julianday() of the day before 0001-01-01, turning SQLite dates into
+# date.toordinal() day numbers
+JULIAN_DAY_ORDINAL_OFFSET = 1721424.5
+
+class UserAnalytics:
+    """Prefix-sum index over one user's daily rollups.
+    
+    Row i of each running-sum matrix holds the totals of every day before
+    first_day + i, one column per category, so the total of a date range is
+    the difference of two rows. Amounts stay in integer cents, so every
+    result matches the SQL path exactly.
+    
+    Attributes:
+        first_day (int): date.toordinal() of the first indexed day
+        category_ids (ndarray): Indexed category IDs, ascending
+        income (ndarray): Running income cents, shape (days + 1, categories)
+        expenses (ndarray): Running expense cents, same shape
+        expense_counts (ndarray): Running number of expense transactions, same shape
+        income_totals (ndarray): Running income cents of all categories, shape (days + 1,)
+        expense_totals (ndarray): Running expense cents of all categories, same shape
+    """
+    def __init__(self, first_day, category_ids, income, expenses, expense_counts):
+        self.first_day = first_day
+        self.category_ids = category_ids
+        self.income = income
+        self.expenses = expenses
+        self.expense_counts = expense_counts
+        self.income_totals = income.sum(axis=1)
+        self.expense_totals = expenses.sum(axis=1)
+    
+    @classmethod
+    def from_rows(cls, days, types, category_ids, cents, counts):
+        """Build the index from daily rollup rows.
+        
+        Args:
+            days (sequence): Day number of each row
+            types (sequence): 'income' or 'expense' for each row
+            category_ids (sequence): Category ID of each row
+            cents (sequence): Total cents of each row
+            counts (sequence): Transaction count of each row
+            
+        Returns:
+            UserAnalytics: The index
+        """
+        days = np.asarray(days, dtype=np.int64)
+        is_income = np.fromiter((type_ == 'income' for type_ in types), dtype=bool, count=len(types))
+        category_ids, columns = np.unique(np.asarray(category_ids, dtype=np.int64), return_inverse=True)
+        first_day = int(days.min()) if len(days) else 0
+        shape = (int(days.max()) - first_day + 2 if len(days) else 1, len(category_ids))
+        rows = days - first_day + 1
+        
+        matrices = []
+        for mask, values in ((is_income, cents), (~is_income, cents), (~is_income, counts)):
+            matrix = np.zeros(shape, dtype=np.int64)
+            # (day, category, type) is unique per rollup row, so no sums are lost
+            matrix[rows[mask], columns[mask]] = np.asarray(values, dtype=np.int64)[mask]
+            matrices.append(np.cumsum(matrix, axis=0, out=matrix))
+        return cls(first_day, category_ids, *matrices)
+    
+    @classmethod
+    def load(cls, user_id):
+        """Read a user's daily rollups into an index with a single query.
+        
+        Args:
+            user_id (int): ID of the user to load
+            
+        Returns:
+            UserAnalytics: The user's index
+        """
+        day_number = db.cast(db.func.julianday(DailyRollup.day) - JULIAN_DAY_ORDINAL_OFFSET, db.Integer)
+        rows = db.session.query(
+            day_number,
+            DailyRollup.type,
+            DailyRollup.category_id,
+            DailyRollup.total_cents,
+            DailyRollup.count
+        ).filter(DailyRollup.user_id == user_id).all()
+        return cls.from_rows(*zip(*rows)) if rows else cls.from_rows((), (), (), (), ())
+    
+    def with_deltas(self, deltas):
+        """Return a copy of the index with rollup deltas applied.
+        
+        The copy grows to cover new days and categories; every running sum
+        from a delta's day onwards is adjusted, without touching the database.
+        
+        Args:
+            deltas (dict): (total cents, count) deltas keyed by
+                           (user_id, category_id, type, day), as built by
+                           _add_rollup_delta()
+            
+        Returns:
+            UserAnalytics: The updated index
+        """
+        delta_days = [day.toordinal() for _, _, _, day in deltas]
+        old_days = len(self.income) - 1
+        first_day = min([self.first_day] + delta_days) if old_days else min(delta_days)
+        last_day = max([self.first_day + old_days - 1] + delta_days) if old_days else max(delta_days)
+        category_ids = np.union1d(self.category_ids, [category_id for _, category_id, _, _ in deltas])
+        columns = np.searchsorted(category_ids, self.category_ids)
+        offset = self.first_day - first_day if old_days else 0
+        
+        matrices = []
+        for old in (self.income, self.expenses, self.expense_counts):
+            matrix = np.zeros((last_day - first_day + 2, len(category_ids)), dtype=np.int64)
+            matrix[offset:offset + len(old), columns] = old
+            matrix[offset + len(old):, columns] = old[-1]
+            matrices.append(matrix)
+        income, expenses, expense_counts = matrices
+        
+        for (_, category_id, type_, day), (total, count) in deltas.items():
+            row = day.toordinal() - first_day + 1
+            column = np.searchsorted(category_ids, category_id)
+            if type_ == 'income':
+                income[row:, column] += total
+            else:
+                expenses[row:, column] += total
+                expense_counts[row:, column] += count
+        return UserAnalytics(first_day, category_ids, income, expenses, expense_counts)
+    
+    def rows(self, dates):
+        """Map dates to rows of the running sums.
+        
+        Args:
+            dates (sequence): Datetimes/dates, or day numbers
+            
+        Returns:
+            ndarray: Row holding the totals of every day before each date
+        """
+        days = np.fromiter(
+            (date if isinstance(date, (int, np.integer)) else date.toordinal() for date in dates),
+            dtype=np.int64, count=len(dates)
+        )
+        return np.clip(days - self.first_day, 0, len(self.income) - 1)
+    
+    def totals(self, starts, ends):
+        """Total income and expenses of many [start, end) ranges at once.
+        
+        Args:
+            starts (sequence): Start of each range (inclusive)
+            ends (sequence): End of each range (exclusive)
+            
+        Returns:
+            tuple: (income, expenses) arrays of cents, one entry per range
+        """
+        starts, ends = self.rows(starts), self.rows(ends)
+        return (self.income_totals[ends] - self.income_totals[starts],
+                self.expense_totals[ends] - self.expense_totals[starts])
+    
+    def category_totals(self, starts, ends):
+        """Total income and expenses per category of many ranges at once.
+        
+        Args:
+            starts (sequence): Start of each range (inclusive)
+            ends (sequence): End of each range (exclusive)
+            
+        Returns:
+            tuple: (income, expenses) arrays of cents, shape (ranges,
+                   categories), with columns in category_ids order
+        """
+        starts, ends = self.rows(starts), self.rows(ends)
+        return self.income[ends] - self.income[starts], self.expenses[ends] - self.expenses[starts]
+    
+    def range_totals(self, edges):
+        """Total income and expenses between consecutive dates.
+        
+        Args:
+            edges (list): Ascending datetimes; interval i is [edges[i], edges[i + 1])
+            
+        Returns:
+            tuple: (income, expenses) arrays of cents, one entry per interval
+        """
+        rows = self.rows(edges)
+        return np.diff(self.income_totals[rows]), np.diff(self.expense_totals[rows])
+    
+    def category_expenses(self, start_date, end_date=None):
+        """Total expenses per category over a date range.
+        
+        Args:
+            start_date (datetime): Start of the range (inclusive)
+            end_date (datetime, optional): End of the range (exclusive; default: no end)
+            
+        Returns:
+            dict: Cents keyed by category ID, for categories with expense rows in the range
+        """
+        start, end = self.rows([start_date, end_date or datetime.max])
+        counts = self.expense_counts[end] - self.expense_counts[start]
+        totals = self.expenses[end] - self.expenses[start]
+        present = np.flatnonzero(counts)
+        return dict(zip(self.category_ids[present].tolist(), totals[present].tolist()))
+
+analytics_cache = TTLCache(app.config['ANALYTICS_CACHE_SIZE'], app.config['ANALYTICS_CACHE_TTL'])
+
+def _analytics_enabled():
+    """Whether the aggregate helpers should use the NumPy engine."""
+    return app.config['ANALYTICS_ENGINE'] == 'numpy' and np is not None
+
+def _get_user_data_version(user_id):
+    """Get a user's data version, from the logged-in user on read requests."""
+    if has_request_context() and request.method in ('GET', 'HEAD') \
+            and current_user.is_authenticated and current_user.id == user_id:
+        return current_user.data_version
+    return db.session.query(User.data_version).filter(User.id == user_id).scalar()
+
+def _get_user_analytics(user_id):
+    """Get a user's prefix-sum index, cached per data version.
+    
+    Args:
+        user_id (int): ID of the user
+        
+    Returns:
+        UserAnalytics: The user's index
+    """
+    data_version = _get_user_data_version(user_id)
+    cached = analytics_cache.get(user_id)
+    if cached is not None and cached[0] == data_version:
+        return cached[1]
+    analytics = UserAnalytics.load(user_id)
+    analytics_cache.set(user_id, (data_version, analytics))
+    return analytics
+
+def _queue_analytics_deltas(deltas):
+    """Remember rollup deltas to patch this process's cached indexes with.
+    
+    Called after the rollups are written, when the transaction holds the
+    database write lock: a cached index is only patched if its data version
+    is still the stored one, so no other write is missing from it. The
+    patched index is cached under the version the commit ends with.
+    
+    Args:
+        deltas (dict): (total cents, count) deltas keyed by (user_id, category_id, type, day)
+    """
+    if np is None:
+        return
+    pending = db.session.info.setdefault('analytics_deltas', {})
+    for user_id in {key[0] for key in deltas}:
+        if user_id not in pending:
+            cached = analytics_cache.get(user_id)
+            if cached is None or cached[0] != _get_user_data_version(user_id):
+                continue
+            pending[user_id] = (cached[1], {})
+        user_deltas = pending[user_id][1]
+        for key, (total, count) in deltas.items():
+            if key[0] == user_id:
+                previous_total, previous_count = user_deltas.get(key, (0, 0))
+                user_deltas[key] = (previous_total + total, previous_count + count)
+
+@event.listens_for(Session, 'before_commit')
+def _read_analytics_versions(session):
+    pending = session.info.get('analytics_deltas')
+    if pending:
+        session.info['analytics_versions'] = dict(session.execute(
+            db.select(User.id, User.data_version).where(User.id.in_(list(pending)))
+        ).all())
+
+@event.listens_for(Session, 'after_commit')
+def _apply_analytics_deltas(session):
+    pending = session.info.pop('analytics_deltas', None) or {}
+    versions = session.info.pop('analytics_versions', None) or {}
+    for user_id, (analytics, deltas) in pending.items():
+        if user_id in versions and deltas:
+            analytics_cache.set(user_id, (versions[user_id], analytics.with_deltas(deltas)))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_analytics_deltas(session):
+    session.info.pop('analytics_deltas', None)
+    session.info.pop('analytics_versions', None)
+
+if app.config['ANALYTICS_ENGINE'] == 'numpy' and np is None:
+    app.logger.warning('ANALYTICS_ENGINE=numpy but NumPy is not installed; using the SQL engine')
+
+# === Background Jobs ===
+# Large exports and reports run as jobs outside the request. A job row is
+# queued by the web process; worker threads (started by `python app.py` or
+# `flask jobs worker`) claim jobs with a single UPDATE that enforces the
+# concurrency limits, write the result under instance/jobs and report their
+# progress, which clients poll until they can download the file.
+
+# Job kinds and the extension of their result file
+JOB_KINDS = {'export': 'csv', 'report': 'json'}
+JOB_PENDING_STATUSES = ('queued', 'running')
+# Transactions written per batch (and progress report) of an export job
+JOB_EXPORT_BATCH_SIZE = 5000
+# Running jobs without a progress report for this many seconds are failed
+JOB_STALE_SECONDS = 300
+# Seconds between cleanups of expired jobs by the first worker thread
+JOB_CLEANUP_INTERVAL = 600
+# A job queued this many seconds while the web process runs no worker
+# threads means no `flask jobs worker` runs either; logged once per process
+JOB_UNCLAIMED_WARNING_SECONDS = 60
+
+# Claims the oldest queued job of the user whose last job started longest
+# ago (users never served sort first, as NULLs sort first in SQLite), unless
+# the global or that user's limit of running jobs is reached. One statement,
+# so concurrent workers never claim the same job.
+JOB_CLAIM_SQL = '''
+UPDATE job SET status = 'running', started_at = ?, heartbeat_at = ?
+WHERE status = 'queued' AND id = (
+    SELECT candidate.id FROM job AS candidate
+    WHERE candidate.status = 'queued'
+      AND (SELECT count(*) FROM job WHERE status = 'running') < ?
+      AND (SELECT count(*) FROM job AS running
+           WHERE running.status = 'running' AND running.user_id = candidate.user_id) < ?
+    ORDER BY (SELECT max(served.started_at) FROM job AS served
+              WHERE served.user_id = candidate.user_id),
+             candidate.id
+    LIMIT 1
+)
+RETURNING id
+'''
+
+class JobCancelled(Exception):
+    """Raised in a running job once it has been cancelled."""
+
+def _get_job_dir():
+    """Get the folder holding job results, creating it if needed."""
+    directory = os.path.join(app.instance_path, 'jobs')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def _submit_job(user_id, kind, params):
+    """Queue a job for a user.
+    
+    Args:
+        user_id (int): ID of the submitting user
+        kind (str): One of JOB_KINDS
+        params (dict): JSON-serializable job parameters
+        
+    Returns:
+        Job: The queued job
+        
+    Raises:
+        ValueError: If the user already has JOB_MAX_PENDING_PER_USER
+                    queued or running jobs
+    """
+    pending = db.session.query(db.func.count(Job.id)).filter(
+        Job.user_id == user_id,
+        Job.status.in_(JOB_PENDING_STATUSES)
+    ).scalar()
+    if pending >= app.config['JOB_MAX_PENDING_PER_USER']:
+        raise ValueError('Too many jobs in progress')
+    job = Job(user_id=user_id, kind=kind, params=json.dumps(params))
+    db.session.add(job)
+    db.session.commit()
+    _warn_if_jobs_unclaimed(datetime.utcnow())
+    return job
+
+# Worker threads started in this process, and whether unclaimed jobs were reported
+_job_worker_threads = []
+_unclaimed_jobs_warned = threading.Event()
+
+def _warn_if_jobs_unclaimed(now):
+    """Log once if jobs sit in the queue while this process runs no workers.
+    
+    Under a WSGI server no worker threads start, so jobs only run when a
+    `flask jobs worker` process does; a job left queued for
+    JOB_UNCLAIMED_WARNING_SECONDS suggests there is none.
+    
+    Args:
+        now (datetime): Current UTC time
+    """
+    if _job_worker_threads or _unclaimed_jobs_warned.is_set():
+        return
+    oldest = db.session.query(db.func.min(Job.created_at)).filter(Job.status == 'queued').scalar()
+    if oldest is not None and (now - oldest).total_seconds() >= JOB_UNCLAIMED_WARNING_SECONDS:
+        _unclaimed_jobs_warned.set()
+        app.logger.warning(
+            'Background jobs have been queued since %s and this process runs no job workers; '
+            'start `flask jobs worker` to run them', oldest.isoformat(timespec='seconds')
+        )
+
+def _serialize_job(job):
+    """Describe a job for the JSON API.
+    
+    Args:
+        job (Job): Job to describe
+        
+    Returns:
+        dict: Status, progress and timestamps, with the download URL once done
+    """
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'url': url_for('get_job', id=job.id),
+    }
+    for field in ('created_at', 'started_at', 'finished_at', 'expires_at'):
+        value = getattr(job, field)
+        data[field] = value.isoformat(timespec='seconds') + 'Z' if value else None
+    if job.status == 'done':
+        data['download_url'] = url_for('download_job', id=job.id)
+    return data
+
+def _claim_job(now):
+    """Fail stale running jobs, then claim the next queued job if allowed.
+    
+    Args:
+        now (datetime): Current UTC time
+        
+    Returns:
+        int: ID of the claimed job, or None if none may start
+    """
+    connection = db.session.connection()
+    stale = (now - timedelta(seconds=JOB_STALE_SECONDS)).strftime(SQLITE_DATETIME_FORMAT)
+    timestamp = now.strftime(SQLITE_DATETIME_FORMAT)
+    expires = (now + timedelta(hours=app.config['JOB_RESULT_TTL'])).strftime(SQLITE_DATETIME_FORMAT)
+    connection.exec_driver_sql(
+        "UPDATE job SET status = 'failed', error = 'Worker stopped', finished_at = ?, expires_at = ? "
+        "WHERE status = 'running' AND heartbeat_at < ?",
+        (timestamp, expires, stale)
+    )
+    return connection.exec_driver_sql(JOB_CLAIM_SQL, (
+        timestamp, timestamp,
+        app.config['JOB_MAX_RUNNING'], app.config['JOB_MAX_RUNNING_PER_USER']
+    )).scalar()
+
+def _set_job_progress(job_id, progress):
+    """Record a running job's progress and commit.
+    
+    Args:
+        job_id (int): ID of the running job
+        progress (int): Percentage done
+        
+    Raises:
+        JobCancelled: If the job is no longer running
+    """
+    result = db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id, Job.status == 'running')
+        .values(progress=progress, heartbeat_at=datetime.utcnow())
+    )
+    db.session.commit()
+    if result.rowcount == 0:
+        raise JobCancelled()
+
+def _finish_job(job_id, status, **values):
+    """Move a running job to a final status and commit.
+    
+    Args:
+        job_id (int): ID of the running job
+        status (str): 'done' or 'failed'
+        **values: Other columns to set
+        
+    Returns:
+        bool: False if the job had been cancelled in the meantime
+    """
+    now = datetime.utcnow()
+    result = db.session.execute(
+        db.update(Job)
+        .where(Job.id == job_id, Job.status == 'running')
+        .values(status=status, finished_at=now,
+                expires_at=now + timedelta(hours=app.config['JOB_RESULT_TTL']), **values)
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+def _run_export_job(job, params, path):
+    """Write a user's transactions to a CSV file in keyset batches.
+    
+    Each batch is a separate short query, so no read transaction stays open
+    while progress is committed, and a cancellation stops the job within
+    one batch.
+    
+    Args:
+        job (Job): The running job
+        params (dict): 'start_date' and 'end_date' (ISO datetimes or None)
+        path (str): Result file to write
+    """
+    start_date = datetime.fromisoformat(params['start_date']) if params['start_date'] else None
+    end_date = datetime.fromisoformat(params['end_date']) if params['end_date'] else None
+    rows = _get_export_rows(job.user_id, start_date, end_date).add_columns(Transaction.id)
+    total = rows.order_by(None).count()
+    
+    written = 0
+    key = None
+    with open(path, 'w', newline='') as f:
+        while True:
+            query = rows if key is None else rows.filter(db.tuple_(Transaction.date, Transaction.id) > key)
+            batch = query.limit(JOB_EXPORT_BATCH_SIZE).all()
+            for chunk in _generate_export_csv((row[:5] for row in batch), header=key is None):
+                f.write(chunk)
+            written += len(batch)
+            if len(batch) < JOB_EXPORT_BATCH_SIZE:
+                break
+            key = (batch[-1][0], batch[-1][5])
+            _set_job_progress(job.id, min(99, written * 100 // max(total, 1)))
+
+def _run_report_job(job, params, path):
+    """Compute a report and write it to a JSON file.
+    
+    Args:
+        job (Job): The running job
+        params (dict): 'timeframe' and the user's local 'now' at submission
+        path (str): Result file to write
+    """
+    report = _build_reports_data(job.user_id, params['timeframe'], datetime.fromisoformat(params['now']))
+    with open(path, 'w') as f:
+        json.dump(report, f)
+
+JOB_RUNNERS = {
+    'export': _run_export_job,
+    'report': _run_report_job,
+}
+
+def _run_job(job_id):
+    """Run a claimed job, recording its result or failure.
+    
+    Args:
+        job_id (int): ID of a job claimed by _claim_job()
+    """
+    job = db.session.get(Job, job_id)
+    name = f'{job.id}.{JOB_KINDS[job.kind]}'
+    path = os.path.join(_get_job_dir(), name)
+    try:
+        JOB_RUNNERS[job.kind](job, json.loads(job.params), path)
+        db.session.rollback()
+        finished = _finish_job(job_id, 'done', progress=100, result_name=name)
+    except JobCancelled:
+        finished = False
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('Job %s failed', job_id)
+        _finish_job(job_id, 'failed', error='Job failed')
+        finished = False
+    
+    if not finished and os.path.exists(path):
+        os.remove(path)
+
+def _cleanup_jobs(now):
+    """Delete expired jobs with their results, and stale result files of no job.
+    
+    Only the files of the rows deleted here are removed, so results of jobs
+    finishing or claimed meanwhile by another worker are never touched. A file
+    no job refers to (left by a crash) is removed once it is older than
+    JOB_RESULT_TTL.
+    
+    Args:
+        now (datetime): Current UTC time
+        
+    Returns:
+        int: Number of deleted jobs
+    """
+    expired = db.session.query(Job.id, Job.kind).filter(Job.expires_at < now).all()
+    if expired:
+        db.session.execute(db.delete(Job).where(Job.id.in_([job_id for job_id, _ in expired])))
+    db.session.commit()
+    
+    directory = _get_job_dir()
+    for job_id, kind in expired:
+        path = os.path.join(directory, f'{job_id}.{JOB_KINDS[kind]}')
+        if os.path.exists(path):
+            os.remove(path)
+    
+    known = {str(job_id) for job_id, in db.session.query(Job.id)}
+    stale_before = pytz.utc.localize(now - timedelta(hours=app.config['JOB_RESULT_TTL'])).timestamp()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.split('.', 1)[0] not in known and os.path.getmtime(path) < stale_before:
+            os.remove(path)
+    return len(expired)
+
+def _run_job_worker(poll_interval, cleanup=False):
+    """Claim and run queued jobs until the process exits.
+    
+    Args:
+        poll_interval (float): Seconds to wait when no job may start
+        cleanup (bool): Also delete expired jobs every JOB_CLEANUP_INTERVAL
+    """
+    last_cleanup = None
+    while True:
+        with app.app_context():
+            job_id = None
+            try:
+                if cleanup and (last_cleanup is None or time.monotonic() - last_cleanup >= JOB_CLEANUP_INTERVAL):
+                    _cleanup_jobs(datetime.utcnow())
+                    last_cleanup = time.monotonic()
+                job_id = _claim_job(datetime.utcnow())
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Claiming a background job failed')
+            if job_id is not None:
+                _run_job(job_id)
+                continue
+        time.sleep(poll_interval)
+
+def _start_job_workers(count=None):
+    """Start background job worker threads.
+    
+    Args:
+        count (int, optional): Number of threads (default: JOB_WORKERS)
+        
+    Returns:
+        list: The started threads (empty if disabled)
+    """
+    count = app.config['JOB_WORKERS'] if count is None else count
+    workers = []
+    for index in range(count):
+        worker = threading.Thread(
+            target=_run_job_worker, args=(app.config['JOB_POLL_INTERVAL'], index == 0),
+            name=f'job-worker-{index}', daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+    _job_worker_threads.extend(workers)
+    return workers
+
+# === Query Instrumentation ===
+# Every request records the SQL statements it issues through engine events.
+# The totals are reported in a Server-Timing header and a JSON log line, and
+# checked against a per-endpoint query budget.
+
+# Maximum queries per endpoint; endpoints not listed get QUERY_BUDGET_DEFAULT.
+# Each is the highest count measured with a cold cache under either analytics
+# engine; tests/test_query_budgets.py requests every one of them in strict
+# mode. The +1 covers loading the user (or its data version when cached).
+QUERY_BUDGETS = {
+    'dashboard': DASHBOARD_MAX_QUERIES + 1,
+    'get_dashboard_snapshot': DASHBOARD_MAX_QUERIES + 1,
+    'reports': REPORTS_MAX_QUERIES + 1,
+    'get_chart_data': 2,
+    # With ANALYTICS_ENGINE=numpy, category names may need loading as well
+    'get_category_data': 3,
+    # categories=1 also loads the category names
+    'get_range_totals': 3,
+    'get_rolling_totals': 2,
+    # A 'prev' page also looks up whether a newer page exists
+    'transactions': 4,
+    'budgets': 4,
+    # 9 for a plain transaction; a recurring one also runs the materializer's
+    # set-based statements, whatever the number of occurrences
+    'add_transaction': 22,
+}
+
+# Slowest statements kept per request for the log line and debug panel
+QUERY_SLOWEST_KEPT = 3
+
+query_logger = app.logger.getChild('queries')
+if os.environ.get('QUERY_LOG_LEVEL'):
+    query_logger.setLevel(os.environ['QUERY_LOG_LEVEL'].upper())
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised when a request issues more queries than its budget allows."""
+
+class RequestQueryStats:
+    """SQL statements issued while handling one request.
+    
+    Attributes:
+        count (int): Number of statements (BEGIN is not counted)
+        duration (float): Total seconds spent executing them
+        slowest (list): Up to QUERY_SLOWEST_KEPT (seconds, statement) pairs,
+                        slowest first
+        started (float): perf_counter() when the current statement started
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+        self.started = None
+    
+    def record(self, statement, duration):
+        """Add a finished statement."""
+        self.count += 1
+        self.duration += duration
+        if len(self.slowest) < QUERY_SLOWEST_KEPT or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[QUERY_SLOWEST_KEPT:]
+
+def _current_query_stats():
+    """Return the stats of the request being handled on this thread, if any."""
+    return g.get('query_stats') if has_request_context() else None
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_query_stats()
+    if stats is not None:
+        stats.started = time.perf_counter()
+
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_query_stats()
+    if stats is not None and stats.started is not None and not statement.startswith('BEGIN'):
+        stats.record(statement, time.perf_counter() - stats.started)
+        stats.started = None
+
+with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', _start_query_timer)
+    event.listen(db.engine, 'after_cursor_execute', _stop_query_timer)
+
+@app.before_request
+def _start_request_stats():
+    if app.config['QUERY_STATS']:
+        g.query_stats = RequestQueryStats()
+        g.request_started = time.perf_counter()
+
+def _render_query_panel(stats, elapsed, budget):
+    """Render the HTML debug panel appended to pages when QUERY_DEBUG_PANEL is set.
+    
+    Args:
+        stats (RequestQueryStats): Statements of the request
+        elapsed (float): Seconds spent handling the request
+        budget (int): Query budget of the endpoint
+        
+    Returns:
+        str: HTML fragment
+    """
+    rows = ''.join(
+        f'<li><code>{duration * 1000:.2f}ms</code> {escape(" ".join(statement.split()))}</li>'
+        for duration, statement in stats.slowest
+    )
+    return (
+        '<div id="query-debug-panel" style="position:fixed;bottom:0;right:0;z-index:9999;'
+        'max-width:40rem;max-height:40vh;overflow:auto;padding:.5rem;font:12px monospace;'
+        'background:#111827;color:#f9fafb;opacity:.9">'
+        f'<strong>{escape(request.endpoint or "")}</strong>: {stats.count}/{budget} queries, '
+        f'{stats.duration * 1000:.1f}ms in SQL, {elapsed * 1000:.1f}ms total'
+        f'<ol>{rows}</ol></div>'
+    )
+
+@app.after_request
+def _report_request_stats(response):
+    """Report the request's SQL statistics and enforce its query budget.
+    
+    For streamed responses (CSV export) only the statements issued before
+    streaming started are counted.
+    """
+    stats = g.pop('query_stats', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - g.pop('request_started')
+    budget = QUERY_BUDGETS.get(request.endpoint, app.config['QUERY_BUDGET_DEFAULT'])
+    _record_request_metrics(request.endpoint, response.status_code, elapsed, stats)
+    
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+        f'app;dur={elapsed * 1000:.1f}'
+    )
+    if query_logger.isEnabledFor(logging.INFO):
+        query_logger.info(json.dumps({
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'status': response.status_code,
+            'user_id': current_user.get_id() if current_user else None,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 2),
+            'total_ms': round(elapsed * 1000, 2),
+            'slowest': [
+                {'ms': round(duration * 1000, 2), 'sql': ' '.join(statement.split())[:200]}
+                for duration, statement in stats.slowest
+            ],
+        }))
+    
+    if stats.count > budget:
+        message = f'{request.endpoint} issued {stats.count} queries (budget {budget})'
+        if app.testing or app.config['QUERY_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        query_logger.warning(message)
+    
+    if app.config['QUERY_DEBUG_PANEL'] and response.mimetype == 'text/html' \
+            and not response.is_streamed:
+        html = response.get_data(as_text=True)
+        panel = _render_query_panel(stats, elapsed, budget)
+        if '</body>' in html:
+            html = html.replace('</body>', panel + '</body>', 1)
+        else:
+            html += panel
+        response.set_data(html)
+    return response
+
+# === Request Profiling ===
+# A request is profiled with cProfile when it carries a valid signed
+# ?_profile= token issued for the signed-in user, when its user has profile_requests set by an admin, or
+# when it is picked by 1-in-PROFILE_SAMPLE_RATE sampling. The profiler covers
+# the view, its helpers and template rendering; each dump is written to
+# instance/profiles with a JSON file of metadata next to it.
+PROFILE_TOKEN_SALT = 'request-profile'
+PROFILE_NAME_PATTERN = re.compile(r'^[\w.-]+$')
+
+def _get_profile_dir():
+    """Return the directory holding profile dumps, creating it if needed."""
+    path = os.path.join(app.instance_path, 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _create_profile_token(user_id):
+    """Create a signed token profiling one user's requests for PROFILE_TOKEN_MAX_AGE seconds.
+    
+    Args:
+        user_id (int): User whose requests the token profiles; it is useless
+                       to anyone signed in as someone else
+        
+    Returns:
+        str: Value for the ``_profile`` query argument
+    """
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=PROFILE_TOKEN_SALT)\
+        .dumps({'user_id': int(user_id)})
+
+def _get_profile_trigger():
+    """Decide whether the current request should be profiled.
+    
+    Returns:
+        str: 'token', 'user' or 'sample', or None to skip profiling
+    """
+    token = request.args.get('_profile')
+    if token and current_user.is_authenticated:
+        try:
+            payload = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=PROFILE_TOKEN_SALT)\
+                .loads(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+        except BadSignature:
+            payload = None
+        if isinstance(payload, dict) and payload.get('user_id') == current_user.id:
+            return 'token'
+    if current_user.is_authenticated and current_user.profile_requests:
+        return 'user'
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if rate > 0 and random.random() * rate < 1:
+        return 'sample'
+    return None
+
+@app.before_request
+def _start_request_profile():
+    if request.endpoint in (None, 'static'):
+        return
+    trigger = _get_profile_trigger()
+    if trigger is not None:
+        g.profile_trigger = trigger
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def _save_request_profile(response):
+    """Stop the request's profiler and write the dump with its metadata."""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    elapsed = time.perf_counter() - g.profile_started
+    
+    user_id = current_user.get_id() if current_user.is_authenticated else None
+    now = datetime.utcnow()
+    name = f'{now.strftime("%Y%m%dT%H%M%S%f")}-{request.endpoint}-u{user_id or 0}-{elapsed * 1000:.0f}ms'
+    directory = _get_profile_dir()
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    with open(os.path.join(directory, name + '.json'), 'w') as f:
+        json.dump({
+            'name': name,
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'user_id': user_id,
+            'trigger': g.profile_trigger,
+            'latency_ms': round(elapsed * 1000, 2),
+            'created_at': now.isoformat(timespec='seconds'),
+        }, f)
+    _prune_profiles(directory, app.config['PROFILE_MAX_DUMPS'])
+    return response
+
+@app.teardown_request
+def _stop_request_profile(exc):
+    # A view that raised skips after_request; never leave the profiler running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+def _prune_profiles(directory, keep):
+    """Delete all but the newest profile dumps.
+    
+    Args:
+        directory (str): Profile directory
+        keep (int): Number of dumps to keep
+    """
+    names = sorted(name[:-len('.prof')] for name in os.listdir(directory) if name.endswith('.prof'))
+    for name in names[:max(0, len(names) - keep)]:
+        for suffix in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(directory, name + suffix))
+            except FileNotFoundError:
+                pass
+
+def _list_profiles():
+    """Load the metadata of every stored profile dump, newest first.
+    
+    Returns:
+        list: Metadata dicts written by _save_request_profile()
+    """
+    directory = _get_profile_dir()
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+def _get_profile_top_functions(name, limit=25):
+    """Summarize a profile dump by cumulative time.
+    
+    Args:
+        name (str): Dump name, as listed by _list_profiles()
+        limit (int): Number of functions to return
+        
+    Returns:
+        list: Dicts with function, calls, total and cumulative time (ms),
+              highest cumulative time first
+        
+    Raises:
+        FileNotFoundError: If there is no dump with this name
+    """
+    if not PROFILE_NAME_PATTERN.match(name):
+        raise FileNotFoundError(name)
+    stats = pstats.Stats(os.path.join(_get_profile_dir(), name + '.prof'))
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            'function': pstats.func_std_string(function),
+            'calls': calls,
+            'total_ms': round(total_time * 1000, 3),
+            'cumulative_ms': round(cumulative_time * 1000, 3),
+        }
+        for function, (primitive_calls, calls, total_time, cumulative_time, callers) in rows
+    ]
+
+# === Metrics ===
+# Prometheus text-format metrics. Each worker process counts into memory and
+# every METRICS_FLUSH_INTERVAL seconds writes a snapshot to its own file in
+# METRICS_DIR; /metrics sums the snapshots of all processes, so any worker
+# of a forking server can answer the scrape. Snapshot files are named by pid
+# and start time, so a recycled worker reusing a pid starts a file of its own
+# instead of overwriting (and lowering) a dead worker's totals, and a process
+# exiting normally folds its totals into METRICS_EXITED_FILE. METRICS_DIR is
+# per host; snapshots of killed workers stay until it is emptied on deploy.
+
+# Totals of exited processes, and the lock serializing folds with scrapes
+METRICS_EXITED_FILE = 'exited.json'
+METRICS_LOCK_FILE = '.lock'
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 50, 100)
+
+# name -> (type, help text, histogram buckets)
+METRICS = {
+    'finance_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.', None),
+    'finance_http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'finance_db_queries_total': ('counter', 'SQL statements issued by endpoint.', None),
+    'finance_db_query_duration_seconds_total': ('counter', 'Seconds spent in SQL by endpoint.', None),
+    'finance_db_queries_per_request': ('histogram', 'SQL statements per request by endpoint.', QUERY_COUNT_BUCKETS),
+    'finance_cache_hits_total': ('counter', 'Cache lookups answered from the cache.', None),
+    'finance_cache_misses_total': ('counter', 'Cache lookups that missed.', None),
+    'finance_transactions': ('gauge', 'Transactions stored per user.', None),
+}
+
+class MetricsRegistry:
+    """Counters and histograms of this process, merged across processes on scrape.
+    
+    Recording is a dictionary update under a lock; the file write happens at
+    most once per flush interval, from the request that crosses it.
+    
+    Attributes:
+        directory (str): Directory holding one snapshot file per process
+        flush_interval (float): Seconds between snapshot writes
+    """
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _caches(self):
+        return (('response', response_cache), ('user', user_cache), ('category', category_cache))
+    
+    def _reset(self):
+        # Also called in a forked child, which must not re-count its parent
+        self._pid = os.getpid()
+        self._file_name = f'{self._pid}-{time.time_ns()}.json'
+        self._counters = {}
+        self._histograms = {}
+        self._cache_base = {name: (cache.hits, cache.misses) for name, cache in self._caches()}
+        self._last_flush = time.monotonic()
+    
+    def inc(self, name, labels, value=1):
+        """Add to a counter; labels is a tuple of (name, value) pairs."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            key = (name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name, labels, value):
+        """Record a histogram observation."""
+        buckets = METRICS[name][2]
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            key = (name, labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, then +Inf, sum
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[index] += 1
+                    break
+            else:
+                histogram[len(buckets)] += 1
+            histogram[-1] += value
+    
+    def maybe_flush(self):
+        """Write this process's snapshot if the flush interval has passed."""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def _snapshot(self):
+        """Copy this process's counters and histograms, including cache counts."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self._last_flush = time.monotonic()
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+            for cache_name, cache in self._caches():
+                labels = (('cache', cache_name),)
+                base_hits, base_misses = self._cache_base[cache_name]
+                counters[('finance_cache_hits_total', labels)] = cache.hits - base_hits
+                counters[('finance_cache_misses_total', labels)] = cache.misses - base_misses
+            return os.path.join(self.directory, self._file_name), counters, histograms
+    
+    def _write(self, path, counters, histograms):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+            }, f)
+        os.replace(path + '.tmp', path)
+    
+    @staticmethod
+    def _merge(path, counters, histograms):
+        """Add a snapshot file to counters and histograms; unreadable files add nothing."""
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        for metric, labels, value in snapshot['counters']:
+            key = (metric, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for metric, labels, values in snapshot['histograms']:
+            key = (metric, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+    
+    def _locked(self):
+        """Hold the directory lock shared by every process (a no-op without fcntl)."""
+        if fcntl is None:
+            return nullcontext()
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, METRICS_LOCK_FILE), 'w')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock  # closing the file releases the lock
+    
+    def flush(self):
+        """Write this process's snapshot file."""
+        self._write(*self._snapshot())
+    
+    def retire(self):
+        """Fold this process's totals into METRICS_EXITED_FILE and remove its file.
+        
+        Registered with atexit, so a worker recycled by the server leaves no
+        file behind while its counts stay in the sum. A process that never
+        wrote a snapshot was never scraped and leaves nothing.
+        """
+        path, counters, histograms = self._snapshot()
+        if fcntl is None or not os.path.exists(path):
+            return
+        exited = os.path.join(self.directory, METRICS_EXITED_FILE)
+        with self._locked():
+            self._merge(exited, counters, histograms)
+            self._write(exited, counters, histograms)
+            os.remove(path)
+    
+    def collect(self):
+        """Sum the snapshots of every process, including a fresh one of this process.
+        
+        Returns:
+            tuple: (counters, histograms) keyed by (name, labels)
+        """
+        self.flush()
+        counters = {}
+        histograms = {}
+        # Under the lock, no exited process is counted both in its own file
+        # and in METRICS_EXITED_FILE, nor in neither
+        with self._locked():
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    self._merge(os.path.join(self.directory, name), counters, histograms)
+        return counters, histograms
+
+metrics_registry = MetricsRegistry(
+    app.config['METRICS_DIR'] or os.path.join(app.instance_path, 'metrics'),
+    app.config['METRICS_FLUSH_INTERVAL']
+)
+atexit.register(metrics_registry.retire)
+
+def _record_request_metrics(endpoint, status, elapsed, stats):
+    """Count a finished request; called from _report_request_stats().
+    
+    Args:
+        endpoint (str): Flask endpoint, or None when no route matched
+        status (int): Response status code
+        elapsed (float): Seconds spent handling the request
+        stats (RequestQueryStats): SQL statements of the request
+    """
+    endpoint = endpoint or 'none'
+    labels = (('endpoint', endpoint),)
+    metrics_registry.inc('finance_http_requests_total',
+                         labels + (('method', request.method), ('status', str(status))))
+    metrics_registry.observe('finance_http_request_duration_seconds', labels, elapsed)
+    metrics_registry.inc('finance_db_queries_total', labels, stats.count)
+    metrics_registry.inc('finance_db_query_duration_seconds_total', labels, stats.duration)
+    metrics_registry.observe('finance_db_queries_per_request', labels, stats.count)
+    metrics_registry.maybe_flush()
+
+def _format_metric_labels(labels, extra=()):
+    """Format labels as {name="value",...} with Prometheus escaping."""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def _render_metrics():
+    """Render every metric in Prometheus text exposition format.
+    
+    Returns:
+        str: Exposition text
+    """
+    counters, histograms = metrics_registry.collect()
+    gauges = {
+        ('finance_transactions', (('user_id', str(user_id)),)): count
+        for user_id, count in db.session.query(
+            MonthlyRollup.user_id, db.func.sum(MonthlyRollup.count)
+        ).group_by(MonthlyRollup.user_id)
+    }
+    
+    lines = []
+    for name, (type_, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {type_}')
+        if type_ == 'histogram':
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_metric_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_metric_labels(labels)} {values[-1]}')
+                lines.append(f'{name}_count{_format_metric_labels(labels)} {cumulative}')
+        else:
+            for (metric, labels), value in sorted((counters if type_ == 'counter' else gauges).items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_metric_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+# === Schema Migrations ===
+# Ordered (version, description, upgrade) steps; the applied version is
+# tracked in SQLite's PRAGMA user_version. Versions are never reused:
+# version 2 used to backfill the rollup tables and was retired when
+# migration 7 took over rebuilding them from integer amounts, so databases
+# at version 1 go straight to 3 and get their rollups from 7.
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a schema migration step.
+    
+    Args:
+        version (int): Schema version the step upgrades to
+        description (str): Short description shown when the step runs
+        
+    Returns:
+        function: Decorator registering the upgrade function
+    """
+    def decorator(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return upgrade
+    return decorator
+
+@migration(1, 'Add composite indexes for the transaction, budget and category hot filters')
+def _migrate_hot_filter_indexes():
+    connection = db.session.connection()
+    names = {
+        'ix_transaction_user_date',
+        'ix_transaction_user_type_date',
+        'ix_transaction_user_category_date',
+        'ix_budget_user_category',
+        'ix_category_user_type',
+    }
+    for model in (Transaction, Budget, Category):
+        for index in model.__table__.indexes:
+            if index.name in names:
+                index.create(connection, checkfirst=True)
+
+@migration(3, 'Add the full-text search index over transaction descriptions and tags')
+def _migrate_transaction_fts():
+    connection = db.session.connection()
+    for statement in TRANSACTION_FTS_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO transaction_fts(transaction_fts) VALUES ('rebuild')")
+
+@migration(4, 'Normalize transaction tags into the tag and transaction_tag tables')
+def _migrate_normalize_tags():
+    connection = db.session.connection()
+    Tag.__table__.create(connection, checkfirst=True)
+    transaction_tag.create(connection, checkfirst=True)
+    _sync_all_transaction_tags()
+
+@migration(5, 'Add the per-user data version keying cached responses')
+def _migrate_user_data_version():
+    connection = db.session.connection()
+    columns = {column['name'] for column in db.inspect(connection).get_columns('user')}
+    if 'data_version' not in columns:
+        connection.exec_driver_sql(
+            'ALTER TABLE user ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'
+        )
+
+@migration(6, 'Add recurring transaction rules')
+def _migrate_recurring_rules():
+    connection = db.session.connection()
+    RecurringRule.__table__.create(connection, checkfirst=True)
+    columns = {column['name'] for column in db.inspect(connection).get_columns('transaction')}
+    if 'recurring_rule_id' not in columns:
+        connection.exec_driver_sql(
+            'ALTER TABLE "transaction" ADD COLUMN recurring_rule_id INTEGER REFERENCES recurring_rule (id)'
+        )
+    for index in Transaction.__table__.indexes:
+        if index.name == 'ix_transaction_recurring_rule_date':
+            index.create(connection, checkfirst=True)
+
+# (table, float column, integer minor-unit column) converted by migration 7
+MONEY_COLUMNS = [
+    ('transaction', 'amount', 'amount_cents'),
+    ('budget', 'limit_amount', 'limit_cents'),
+    ('recurring_rule', 'amount', 'amount_cents'),
+]
+
+@migration(7, 'Store amounts as integer minor units and rebuild the rollups')
+def _migrate_integer_amounts():
+    connection = db.session.connection()
+    for table, old, new in MONEY_COLUMNS:
+        columns = {column['name'] for column in db.inspect(connection).get_columns(table)}
+        if new not in columns:
+            connection.exec_driver_sql(
+                f'ALTER TABLE "{table}" ADD COLUMN {new} INTEGER NOT NULL DEFAULT 0'
+            )
+        if old in columns:
+            # round() first: 0.29 * 100 is 28.999999999999996 in binary floating point
+            connection.exec_driver_sql(
+                f'UPDATE "{table}" SET {new} = CAST(round({old} * {MINOR_UNITS}) AS INTEGER)'
+            )
+            # Requires SQLite 3.35+; none of these columns is indexed
+            connection.exec_driver_sql(f'ALTER TABLE "{table}" DROP COLUMN {old}')
+    for model in (DailyRollup, MonthlyRollup):
+        model.__table__.drop(connection, checkfirst=True)
+        model.__table__.create(connection)
+    _rebuild_rollups()
+
+@migration(8, 'Add the per-user request profiling switch')
+def _migrate_user_profile_requests():
+    connection = db.session.connection()
+    columns = {column['name'] for column in db.inspect(connection).get_columns('user')}
+    if 'profile_requests' not in columns:
+        connection.exec_driver_sql(
+            'ALTER TABLE user ADD COLUMN profile_requests BOOLEAN NOT NULL DEFAULT 0'
+        )
+
+@migration(9, 'Add the background job table')
+def _migrate_jobs():
+    Job.__table__.create(db.session.connection(), checkfirst=True)
+
+def _get_schema_version():
+    """Get the schema version recorded in the database.
+    
+    Returns:
+        int: Version of the last applied migration
+    """
+    return db.session.execute(db.text('PRAGMA user_version')).scalar()
+
+def _run_migrations(echo=None):
+    """Create missing tables and apply every pending schema migration.
+    
+    A new database gets the current schema from create_all() and is stamped
+    with the latest version; existing databases run each pending step in its
+    own transaction, together with the version bump.
+    
+    Args:
+        echo (callable, optional): Called with a message for each applied step
+        
+    Returns:
+        int: Schema version after upgrading
+    """
+    is_new = not db.inspect(db.engine).has_table('user')
+    db.create_all()
+    latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+    
+    if is_new:
+        db.session.execute(db.text(f'PRAGMA user_version = {latest}'))
+        db.session.commit()
+        return latest
+    
+    version = _get_schema_version()
+    for target, description, upgrade in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            upgrade()
+            db.session.execute(db.text(f'PRAGMA user_version = {int(target)}'))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        version = target
+        if echo:
+            echo(f'Applied migration {target}: {description}')
+    return version
+
+# GET routes exercised by the query plan check: (endpoint, query arguments)
+QUERY_PLAN_ROUTES = [
+    ('dashboard', {'timeframe': 'month'}),
+    ('dashboard', {'timeframe': 'quarter'}),
+    ('dashboard', {'timeframe': 'year'}),
+    ('get_chart_data', {'timeframe': 'This Month'}),
+    ('get_chart_data', {'timeframe': 'This Year'}),
+    ('get_chart_data', {'timeframe': 'This Year', 'granularity': 'week'}),
+    ('get_chart_data', {'timeframe': 'This Year', 'granularity': 'quarter'}),
+    ('get_category_data', {'timeframe': 'This Month'}),
+    ('get_dashboard_snapshot', {'timeframe': 'year'}),
+    ('transactions', {}),
+    ('transactions', {'search': 'rent', 'type': 'expense'}),
+    ('transactions', {'cursor': '2000-01-01T00:00:00_1'}),
+    ('transactions', {'cursor': '2000-01-01T00:00:00_1', 'direction': 'prev', 'type': 'income'}),
+    ('transactions', {'tag': 'groceries', 'type': 'expense'}),
+    ('search_transactions', {'q': 'gro sto', 'type': 'expense', 'start': '2020-01-01'}),
+    ('list_tags', {}),
+    ('get_tag_transactions', {'tag': 'groceries', 'cursor': '2000-01-01T00:00:00_1'}),
+    ('get_tag_spending', {'timeframe': 'year', 'granularity': 'month'}),
+    ('budgets', {}),
+    ('reports', {'timeframe': 'month'}),
+    ('reports', {'timeframe': 'year'}),
+    ('get_range_totals', {'range': ['2020-01-01..2021-01-01', '2024-03-01..2024-04-01'], 'categories': '1'}),
+    ('get_rolling_totals', {'days': 30}),
+    ('export_reports', {'timeframe': 'month'}),
+    ('settings', {}),
+]
+
+def _check_query_plans(user_id):
+    """Run EXPLAIN QUERY PLAN on every query issued by the read-only routes.
+    
+    Each route in QUERY_PLAN_ROUTES is requested through the test client as
+    the given user, and every distinct statement is explained with the
+    parameters it ran with.
+    
+    Args:
+        user_id (int): ID of the user to issue the requests as
+        
+    Returns:
+        list: (endpoint, statement, plan details) for every full table scan
+    """
+    captured = []
+    
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((request.endpoint, statement, parameters))
+    
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['_user_id'] = str(user_id)
+        flask_session['_fresh'] = True
+    
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        for endpoint, args in QUERY_PLAN_ROUTES:
+            with app.test_request_context():
+                url = url_for(endpoint, **args)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    
+    scans = []
+    seen = set()
+    with db.engine.connect() as connection:
+        for endpoint, statement, parameters in captured:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+            details = [row[-1] for row in plan]
+            if any(detail.startswith('SCAN ')
+                   and not detail.startswith('SCAN CONSTANT ROW')
+                   and 'VIRTUAL TABLE INDEX' not in detail
+                   for detail in details):
+                scans.append((endpoint, statement, details))
+    return scans
+
+# === Storage Benchmark ===
+# Workload of `flask db bench-storage`: readers run the dashboard's period
+# aggregate, writers run the read-then-write pattern of a transaction POST
+STORAGE_BENCH_USERS = 50
+STORAGE_BENCH_READ_SQL = (
+    'SELECT type, sum(amount_cents), count(*) FROM "transaction" '
+    'WHERE user_id = ? AND date >= ? GROUP BY type'
+)
+
+def _setup_storage_bench(path, rows):
+    """Create a benchmark database file with the application schema.
+    
+    Args:
+        path (str): Path of the SQLite file to (re)create
+        rows (int): Number of transactions to insert
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'name': f'User {n}', 'email': f'bench{n}@example.com', 'password_hash': '-'}
+            for n in range(STORAGE_BENCH_USERS)
+        ])
+        connection.execute(Category.__table__.insert(), [
+            {'user_id': n + 1, 'name': 'Other', 'type': 'expense'}
+            for n in range(STORAGE_BENCH_USERS)
+        ])
+        connection.exec_driver_sql(IMPORT_INSERT_SQL, [
+            (
+                n % STORAGE_BENCH_USERS + 1,
+                n % STORAGE_BENCH_USERS + 1,
+                n % 500 * MINOR_UNITS,
+                'expense',
+                f'Transaction {n}',
+                (now - timedelta(days=n % 365)).strftime(SQLITE_DATETIME_FORMAT),
+                False,
+                now.strftime(SQLITE_DATETIME_FORMAT),
+                now.strftime(SQLITE_DATETIME_FORMAT)
+            )
+            for n in range(rows)
+        ])
+    engine.dispose()
+
+def _run_storage_bench_worker(path, profile, role, seconds, results):
+    """Run reads or writes against a benchmark file until time runs out.
+    
+    Writers run inside a POST request context so that they start their
+    transactions exactly like the application's write requests.
+    
+    Args:
+        path (str): Path of the benchmark database
+        profile (str): Key of SQLITE_STORAGE_PROFILES
+        role (str): 'read' or 'write'
+        seconds (float): Duration of the run
+        results (Queue): Receives (role, operations, errors, latencies)
+    """
+    engine = create_engine(f'sqlite:///{path}')
+    _configure_sqlite_engine(engine, profile)
+    since = (datetime.utcnow() - timedelta(days=30)).strftime(SQLITE_DATETIME_FORMAT)
+    operations = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    with app.test_request_context(method='POST' if role == 'write' else 'GET'):
+        while time.perf_counter() < deadline:
+            user_id = operations % STORAGE_BENCH_USERS + 1
+            started = time.perf_counter()
+            try:
+                with engine.begin() as connection:
+                    if role == 'read':
+                        connection.exec_driver_sql(STORAGE_BENCH_READ_SQL, (user_id, since)).all()
+                    else:
+                        connection.exec_driver_sql(
+                            'SELECT data_version FROM user WHERE id = ?', (user_id,)
+                        ).scalar()
+                        timestamp = datetime.utcnow().strftime(SQLITE_DATETIME_FORMAT)
+                        connection.exec_driver_sql(IMPORT_INSERT_SQL, (
+                            user_id, user_id, MINOR_UNITS, 'expense', 'Benchmark', timestamp,
+                            False, timestamp, timestamp
+                        ))
+                        connection.exec_driver_sql(
+                            'UPDATE user SET data_version = data_version + 1 WHERE id = ?', (user_id,)
+                        )
+                operations += 1
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+    engine.dispose()
+    results.put((role, operations, errors, latencies))
+
+def _percentile(values, fraction):
+    """Return the value at a fraction (0-1) of a list's sorted order."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def _benchmark_storage(path, profile, readers, writers, seconds, rows):
+    """Measure read throughput and writer contention for a storage profile.
+    
+    Readers and writers run as separate processes, like gunicorn workers,
+    against a freshly created local SQLite file.
+    
+    Args:
+        path (str): Path of the benchmark database file
+        profile (str): Key of SQLITE_STORAGE_PROFILES
+        readers (int): Number of reader processes
+        writers (int): Number of writer processes
+        seconds (float): Duration of the run
+        rows (int): Number of transactions in the database
+        
+    Returns:
+        dict: Throughput (operations per second), errors and write latency
+              percentiles (ms) for the profile
+    """
+    _setup_storage_bench(path, rows)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_run_storage_bench_worker,
+                                args=(path, profile, role, seconds, results))
+        for role in ['read'] * readers + ['write'] * writers
+    ]
+    for worker in workers:
+        worker.start()
+    totals = {'read': [0, 0, []], 'write': [0, 0, []]}
+    for _ in workers:
+        role, operations, errors, latencies = results.get()
+        totals[role][0] += operations
+        totals[role][1] += errors
+        totals[role][2].extend(latencies)
+    for worker in workers:
+        worker.join()
+    
+    return {
+        'profile': profile,
+        'reads_per_second': totals['read'][0] / seconds,
+        'read_errors': totals['read'][1],
+        'writes_per_second': totals['write'][0] / seconds,
+        'write_errors': totals['write'][1],
+        'write_p50_ms': _percentile(totals['write'][2], 0.5) * 1000,
+        'write_p95_ms': _percentile(totals['write'][2], 0.95) * 1000,
+    }
+
+# === CLI Commands ===
+@app.cli.group('rollups')
+def rollups_cli():
+    """Maintain the per-user transaction rollup tables."""
+
+@rollups_cli.command('rebuild')
+@click.option('--user-id', type=int, help='Only rebuild this user\'s rollups.')
+def rebuild_rollups_command(user_id):
+    """Recompute the rollup tables from raw transactions."""
+    _rebuild_rollups(user_id)
+    _bump_data_version(user_id)
+    db.session.commit()
+    click.echo('Rollups rebuilt.')
+
+@rollups_cli.command('verify')
+@click.option('--user-id', type=int, help='Only verify this user\'s rollups.')
+def verify_rollups_command(user_id):
+    """Check the rollup tables against the raw transactions."""
+    mismatches = _verify_rollups(user_id)
+    for mismatch in mismatches:
+        click.echo(mismatch)
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} rollup rows out of date; run "flask rollups rebuild".')
+    click.echo('Rollups match transactions.')
+
+@app.cli.group('db')
+def db_cli():
+    """Manage the database schema."""
+
+@db_cli.command('upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending migrations."""
+    version = _run_migrations(echo=click.echo)
+    click.echo(f'Database is at schema version {version}.')
+
+@db_cli.command('check-plans')
+@click.option('--user-id', type=int, help='User to issue the requests as (default: first user).')
+def db_check_plans_command(user_id):
+    """Fail if any read-only route runs a full table scan."""
+    if user_id is None:
+        user_id = db.session.query(db.func.min(User.id)).scalar()
+        if user_id is None:
+            raise click.ClickException('The query plan check needs at least one user in the database.')
+    
+    scans = _check_query_plans(user_id)
+    for endpoint, statement, details in scans:
+        click.echo(f'[{endpoint}] {" ".join(statement.split())}')
+        for detail in details:
+            click.echo(f'    {detail}')
+    if scans:
+        raise click.ClickException(f'{len(scans)} queries fall back to a full table scan.')
+    click.echo('No full table scans found.')
+
+@db_cli.command('bench-storage')
+@click.option('--profile', 'profiles', multiple=True,
+              type=click.Choice(sorted(SQLITE_STORAGE_PROFILES)),
+              help='Profile to measure (repeatable; default: all).')
+@click.option('--readers', default=4, show_default=True, help='Reader processes.')
+@click.option('--writers', default=2, show_default=True, help='Writer processes.')
+@click.option('--seconds', default=5.0, show_default=True, help='Duration per profile.')
+@click.option('--rows', default=50000, show_default=True, help='Transactions in the test database.')
+@click.option('--directory', default=None, help='Where to create the test files (default: instance folder).')
+def db_bench_storage_command(profiles, readers, writers, seconds, rows, directory):
+    """Compare read throughput and writer contention of the storage profiles."""
+    directory = directory or app.instance_path
+    os.makedirs(directory, exist_ok=True)
+    click.echo(f'{"profile":<8} {"reads/s":>9} {"writes/s":>9} {"read err":>9} '
+               f'{"write err":>9} {"write p50":>10} {"write p95":>10}')
+    for profile in profiles or sorted(SQLITE_STORAGE_PROFILES):
+        path = os.path.join(directory, f'storage-bench-{profile}.db')
+        result = _benchmark_storage(path, profile, readers, writers, seconds, rows)
+        click.echo(f'{profile:<8} {result["reads_per_second"]:>9.0f} {result["writes_per_second"]:>9.0f} '
+                   f'{result["read_errors"]:>9} {result["write_errors"]:>9} '
+                   f'{result["write_p50_ms"]:>8.1f}ms {result["write_p95_ms"]:>8.1f}ms')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+@app.cli.group('recurring')
+def recurring_cli():
+    """Manage recurring transactions."""
+
+@recurring_cli.command('materialize')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Create occurrences up to this date (default: each user\'s local now).')
+def materialize_recurring_command(until):
+    """Create all due occurrences of recurring transactions."""
+    started = time.perf_counter()
+    created = _materialize_recurring(until)
+    db.session.commit()
+    click.echo(f'Created {created} recurring transactions in {time.perf_counter() - started:.2f}s.')
+
+@app.cli.command('import-transactions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--email', required=True, help='Email of the user to import the transactions for.')
+def import_transactions_command(path, email):
+    """Bulk import transactions from a CSV export or bank OFX file."""
+    user = User.query.filter_by(email=email).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}.')
+    
+    started = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            imported = _import_transactions(user.id, _parse_import_file(stream, path))
+        _bump_data_version(user.id)
+        db.session.commit()
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(f'Error importing transactions: {e}')
+    
+    elapsed = time.perf_counter() - started
+    click.echo(f'Imported {imported} transactions in {elapsed:.2f}s ({imported / max(elapsed, 1e-9):.0f} rows/s).')
+
+@app.cli.group('jobs')
+def jobs_cli():
+    """Run and maintain background jobs."""
+
+@jobs_cli.command('worker')
+@click.option('--threads', default=None, type=int,
+              help='Worker threads (default: JOB_WORKERS, at least 1).')
+def jobs_worker_command(threads):
+    """Run queued export and report jobs until interrupted."""
+    workers = _start_job_workers(max(1, threads or app.config['JOB_WORKERS']))
+    click.echo(f'{len(workers)} job workers running; press Ctrl+C to stop.')
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+
+@jobs_cli.command('cleanup')
+def jobs_cleanup_command():
+    """Delete expired jobs and their result files."""
+    deleted = _cleanup_jobs(datetime.utcnow())
+    click.echo(f'Deleted {deleted} expired jobs.')
+
+@app.cli.group('profile')
+def profile_cli():
+    """Inspect request profiles."""
+
+@profile_cli.command('token')
+@click.argument('email')
+def profile_token_command(email):
+    """Print a signed token profiling EMAIL's requests via ?_profile=<token>."""
+    user = User.query.filter(db.func.lower(User.email) == email.strip().lower()).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {email}.')
+    click.echo(_create_profile_token(user.id))
+    click.echo(f'Valid for {app.config["PROFILE_TOKEN_MAX_AGE"]} seconds.')
+
+@profile_cli.command('list')
+def profile_list_command():
+    """List stored request profiles, newest first."""
+    for profile in _list_profiles():
+        click.echo(f'{profile["name"]}  {profile["endpoint"]}  user {profile["user_id"]}  '
+                   f'{profile["latency_ms"]:.1f}ms  ({profile["trigger"]})')
+
+@profile_cli.command('show')
+@click.argument('name')
+@click.option('--limit', default=25, show_default=True, help='Functions to show.')
+def profile_show_command(name, limit):
+    """Show the top cumulative functions of a stored profile."""
+    try:
+        functions = _get_profile_top_functions(name, limit)
+    except FileNotFoundError:
+        raise click.ClickException(f'No profile named {name}.')
+    click.echo(f'{"cumulative":>12} {"total":>10} {"calls":>8}  function')
+    for function in functions:
+        click.echo(f'{function["cumulative_ms"]:>10.2f}ms {function["total_ms"]:>8.2f}ms '
+                   f'{function["calls"]:>8}  {function["function"]}')
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-    app.run(debug=True) 
\ No newline at end of file
+        _run_migrations()
+    use_reloader = True
+    # With the reloader, this file runs in a watcher process and again in the
+    # serving child (WERKZEUG_RUN_MAIN set); only the process serving requests
+    # starts workers, so a single pool polls the queue
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        _start_recurring_worker()
+        _start_job_workers()
+    app.run(debug=True, use_reloader=use_reloader) 
\ No newline at end of file
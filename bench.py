@@ -0,0 +1,401 @@
+"""
+Synthetic Data and Route Benchmarks
+
+`flask bench generate` fills the configured database with reproducible fake
+users; `flask bench run` times the read paths against it through the test
+client and compares the results with a JSON baseline. Point DATABASE_URL at
+a scratch database before generating. The test suite uses the generator to
+seed its users.
+
+The application does not import this module. Importing it registers the
+`flask bench` commands on the app, so they are available when the CLI loads
+the app through it: `flask --app bench bench run`.
+"""
+
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import url_for
+from flask_login import current_user, login_user
+from werkzeug.security import generate_password_hash
+
+from app import (
+    app,
+    analytics_cache,
+    db,
+    np,
+    response_cache,
+    Budget,
+    Category,
+    QueryCounter,
+    User,
+    DEFAULT_EXPENSE_CATEGORIES,
+    DEFAULT_INCOME_CATEGORIES,
+    IMPORT_CHUNK_SIZE,
+    IMPORT_INSERT_SQL,
+    MINOR_UNITS,
+    SQLITE_DATETIME_FORMAT,
+    _analytics_enabled,
+    _apply_rollup_deltas,
+    _build_dashboard_snapshot,
+    _build_reports_data,
+    _calculate_dashboard_metrics,
+    _get_category_data_for_period,
+    _get_export_rows,
+    _get_user_now,
+    _percentile,
+    _prepare_chart_data,
+    _run_migrations,
+)
+
+SYNTHETIC_EMAIL = 'synthetic{}@example.com'
+SYNTHETIC_PASSWORD = 'synthetic'
+SYNTHETIC_DESCRIPTIONS = {
+    'expense': ['Groceries', 'Rent', 'Fuel', 'Coffee', 'Dinner out', 'Phone bill',
+                'Pharmacy', 'Cinema', 'Train ticket', 'Gift', 'Books', 'Gym'],
+    'income': ['Salary', 'Freelance invoice', 'Dividends', 'Interest', 'Refund'],
+}
+# Share of generated transactions that are income
+SYNTHETIC_INCOME_SHARE = 0.15
+
+def generate_synthetic_data(users, transactions_per_user, budgets_per_user=3, days=730,
+                             seed=0, chunk_size=IMPORT_CHUNK_SIZE):
+    """Bulk insert synthetic users with categories, transactions and budgets.
+    
+    The same seed produces the same data relative to today's date. Users get
+    explicit IDs after the current maximum, rows are inserted with
+    executemany chunk_size at a time and the rollups are updated per chunk,
+    like a bulk import. Every user can log in with SYNTHETIC_PASSWORD.
+    
+    Args:
+        users (int): Number of users to create
+        transactions_per_user (int): Transactions per user
+        budgets_per_user (int): Budgets per user, on distinct expense categories
+        days (int): Transactions are spread over this many days up to today
+        seed (int): Random seed
+        chunk_size (int): Transactions inserted per statement batch
+        
+    Returns:
+        dict: Number of users, categories, transactions and budgets created
+    """
+    rng = random.Random(seed)
+    connection = db.session.connection()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    timestamp = datetime.utcnow()
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    first_category = (db.session.query(db.func.max(Category.id)).scalar() or 0) + 1
+    category_names = [(name, 'expense') for name in DEFAULT_EXPENSE_CATEGORIES] + \
+                     [(name, 'income') for name in DEFAULT_INCOME_CATEGORIES]
+    expense_count = len(DEFAULT_EXPENSE_CATEGORIES)
+    
+    user_ids = range(first_user, first_user + users)
+    connection.execute(User.__table__.insert(), [
+        {
+            'id': user_id, 'name': f'Synthetic User {user_id}',
+            'email': SYNTHETIC_EMAIL.format(user_id), 'password_hash': password_hash,
+            'created_at': timestamp, 'updated_at': timestamp
+        }
+        for user_id in user_ids
+    ])
+    connection.execute(Category.__table__.insert(), [
+        {
+            'id': first_category + index * len(category_names) + offset,
+            'user_id': user_id, 'name': name, 'type': type_,
+            'created_at': timestamp, 'updated_at': timestamp
+        }
+        for index, user_id in enumerate(user_ids)
+        for offset, (name, type_) in enumerate(category_names)
+    ])
+    
+    budgets = []
+    for index, user_id in enumerate(user_ids):
+        base = first_category + index * len(category_names)
+        for offset in rng.sample(range(expense_count), min(budgets_per_user, expense_count)):
+            budgets.append({
+                'user_id': user_id, 'category_id': base + offset,
+                'limit_cents': rng.randrange(100, 2000) * MINOR_UNITS,
+                'timeframe': rng.choice(['weekly', 'monthly', 'monthly', 'yearly']),
+                'start_date': today, 'created_at': timestamp, 'updated_at': timestamp
+            })
+    if budgets:
+        connection.execute(Budget.__table__.insert(), budgets)
+    
+    created = timestamp.strftime(SQLITE_DATETIME_FORMAT)
+    rows = []
+    deltas = {}
+    
+    def flush():
+        connection.exec_driver_sql(IMPORT_INSERT_SQL, rows)
+        _apply_rollup_deltas(deltas)
+        rows.clear()
+        deltas.clear()
+    
+    for index, user_id in enumerate(user_ids):
+        base = first_category + index * len(category_names)
+        for _ in range(transactions_per_user):
+            if rng.random() < SYNTHETIC_INCOME_SHARE:
+                type_ = 'income'
+                category_id = base + expense_count + rng.randrange(len(DEFAULT_INCOME_CATEGORIES))
+                amount_cents = rng.randrange(50, 5000) * MINOR_UNITS
+            else:
+                type_ = 'expense'
+                category_id = base + rng.randrange(expense_count)
+                amount_cents = int(rng.lognormvariate(3, 1) * MINOR_UNITS) + 1
+            date = today - timedelta(days=rng.randrange(days), seconds=rng.randrange(86400))
+            rows.append((
+                user_id, category_id, amount_cents, type_,
+                rng.choice(SYNTHETIC_DESCRIPTIONS[type_]),
+                date.strftime(SQLITE_DATETIME_FORMAT), False, created, created
+            ))
+            key = (user_id, category_id, type_, date.date())
+            total, count = deltas.get(key, (0, 0))
+            deltas[key] = (total + amount_cents, count + 1)
+            if len(rows) >= chunk_size:
+                flush()
+    if rows:
+        flush()
+    
+    return {
+        'users': users,
+        'categories': users * len(category_names),
+        'transactions': users * transactions_per_user,
+        'budgets': len(budgets),
+    }
+
+# Routes timed by `flask bench run`: (case name, endpoint, query arguments)
+BENCH_ROUTES = [
+    ('dashboard', 'dashboard', {'timeframe': 'month'}),
+    ('dashboard-year', 'dashboard', {'timeframe': 'year'}),
+    ('dashboard-snapshot', 'get_dashboard_snapshot', {'timeframe': 'month'}),
+    ('reports', 'reports', {'timeframe': 'month'}),
+    ('reports-year', 'reports', {'timeframe': 'year'}),
+    ('transactions', 'transactions', {}),
+    ('transactions-search', 'transactions', {'search': 'groceries'}),
+    ('export-reports', 'export_reports', {'timeframe': 'year'}),
+    ('get-chart-data', 'get_chart_data', {'timeframe': 'This Year'}),
+    ('get-category-data', 'get_category_data', {'timeframe': 'This Month'}),
+    ('report-ranges', 'get_range_totals', {'range': [
+        f'{year}-{month:02d}-01..{year + month // 12}-{month % 12 + 1:02d}-01'
+        for year in range(2020, 2030) for month in range(1, 13)
+    ]}),
+    ('report-rolling', 'get_rolling_totals', {'days': 90}),
+]
+
+# Helpers timed by `flask bench run`: (case name, callable(user_id, now)).
+# They run in a request context with the user logged in.
+BENCH_HELPERS = [
+    ('_calculate_dashboard_metrics',
+     lambda user_id, now: _calculate_dashboard_metrics(user_id, 'month', now)),
+    ('_build_dashboard_snapshot',
+     lambda user_id, now: _build_dashboard_snapshot(user_id, current_user.data_version, 'month', now)),
+    ('_prepare_chart_data', lambda user_id, now: _prepare_chart_data('This Year', now)),
+    ('_get_category_data_for_period',
+     lambda user_id, now: _get_category_data_for_period('This Month', now)),
+    ('_build_reports_data', lambda user_id, now: _build_reports_data(user_id, 'year', now)),
+    ('_get_export_rows', lambda user_id, now: list(_get_export_rows(user_id))),
+]
+
+# Slowdowns below this many milliseconds are never reported as regressions
+BENCH_NOISE_MS = 1.0
+
+def summarize_bench_case(latencies, query_counts):
+    """Reduce the runs of one benchmark case to percentiles.
+    
+    Args:
+        latencies (list): Seconds taken by each run
+        query_counts (list): SQL statements issued by each run
+        
+    Returns:
+        dict: Runs, p50/p95/p99/max latency in ms and the maximum query count
+    """
+    return {
+        'runs': len(latencies),
+        'p50_ms': round(_percentile(latencies, 0.5) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies, default=0) * 1000, 3),
+        'queries': max(query_counts, default=0),
+    }
+
+def run_benchmarks(user_ids, iterations, cases=None):
+    """Time every benchmark case, cycling through the given users.
+    
+    Routes are requested through the test client with the user's session
+    set directly. The response cache is cleared before each run, so every
+    run measures a full build; no If-None-Match header is sent. The analytics
+    cache is kept, as in a long-running process: with the NumPy engine the
+    first run for each user includes loading its arrays.
+    
+    Args:
+        user_ids (list): IDs of the users to issue the requests as
+        iterations (int): Runs per case
+        cases (set, optional): Only run the cases with these names
+        
+    Returns:
+        dict: Summary per case name (see summarize_bench_case)
+    """
+    client = app.test_client()
+    results = {}
+    
+    for name, endpoint, args in BENCH_ROUTES:
+        if cases and name not in cases:
+            continue
+        with app.test_request_context():
+            url = url_for(endpoint, **args)
+        latencies, query_counts = [], []
+        for run in range(iterations):
+            with client.session_transaction() as client_session:
+                client_session['_user_id'] = str(user_ids[run % len(user_ids)])
+                client_session['_fresh'] = True
+            response_cache.clear()
+            with QueryCounter() as counter:
+                started = time.perf_counter()
+                response = client.get(url)
+                response.get_data()
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f'{name}: GET {url} returned {response.status_code}')
+            query_counts.append(counter.count)
+        results[name] = summarize_bench_case(latencies, query_counts)
+    
+    for name, helper in BENCH_HELPERS:
+        if cases and name not in cases:
+            continue
+        latencies, query_counts = [], []
+        for run in range(iterations):
+            user_id = user_ids[run % len(user_ids)]
+            with app.test_request_context():
+                login_user(db.session.get(User, user_id))
+                now = _get_user_now()
+                with QueryCounter() as counter:
+                    started = time.perf_counter()
+                    helper(user_id, now)
+                    latencies.append(time.perf_counter() - started)
+                query_counts.append(counter.count)
+        results[name] = summarize_bench_case(latencies, query_counts)
+    
+    return results
+
+def compare_benchmarks(results, baseline, tolerance):
+    """Find benchmark cases that regressed against a baseline.
+    
+    A case regresses when it issues more queries than in the baseline, or
+    when its p50 or p95 latency grew by more than the tolerance (and by more
+    than BENCH_NOISE_MS).
+    
+    Args:
+        results (dict): Summaries from run_benchmarks()
+        baseline (dict): Summaries of the baseline run
+        tolerance (float): Allowed relative slowdown, e.g. 0.2 for 20%
+        
+    Returns:
+        dict: Regression descriptions keyed by case name
+    """
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        problems = []
+        if result['queries'] > previous['queries']:
+            problems.append(f'queries {previous["queries"]} -> {result["queries"]}')
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = max(previous[metric] * (1 + tolerance), previous[metric] + BENCH_NOISE_MS)
+            if result[metric] > limit:
+                problems.append(f'{metric} {previous[metric]:.1f} -> {result[metric]:.1f}')
+        if problems:
+            regressions[name] = ', '.join(problems)
+    return regressions
+
+# === CLI Commands ===
+@click.group('bench')
+def bench_cli():
+    """Generate synthetic data and benchmark the read paths."""
+
+@bench_cli.command('generate')
+@click.option('--users', default=1000, show_default=True, help='Users to create.')
+@click.option('--transactions', default=1000, show_default=True, help='Transactions per user.')
+@click.option('--budgets', default=3, show_default=True, help='Budgets per user.')
+@click.option('--days', default=730, show_default=True, help='Days of history up to today.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+def bench_generate_command(users, transactions, budgets, days, seed):
+    """Bulk insert reproducible synthetic users into the configured database."""
+    _run_migrations()
+    started = time.perf_counter()
+    counts = generate_synthetic_data(users, transactions, budgets, days, seed)
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    click.echo(f'Created {counts["users"]} users, {counts["categories"]} categories, '
+               f'{counts["transactions"]} transactions and {counts["budgets"]} budgets '
+               f'in {elapsed:.1f}s ({counts["transactions"] / max(elapsed, 1e-9):.0f} transactions/s).')
+    click.echo(f'Users log in as {SYNTHETIC_EMAIL.format("<id>")} with password "{SYNTHETIC_PASSWORD}".')
+
+@bench_cli.command('run')
+@click.option('--iterations', default=20, show_default=True, help='Runs per case.')
+@click.option('--users', 'user_count', default=10, show_default=True,
+              help='Users to cycle through, spread over the synthetic users.')
+@click.option('--case', 'cases', multiple=True, help='Only run this case (repeatable).')
+@click.option('--baseline', default=None,
+              help='Baseline JSON file (default: benchmark-baseline.json in the instance folder).')
+@click.option('--save', is_flag=True, help='Write the results as the new baseline.')
+@click.option('--tolerance', default=0.25, show_default=True,
+              help='Allowed relative slowdown before a case is flagged.')
+@click.option('--engine', 'engines', multiple=True, type=click.Choice(['sql', 'numpy']),
+              help='Analytics engine to time (repeatable; default: ANALYTICS_ENGINE). '
+                   'Cases run with numpy are suffixed with [numpy].')
+def bench_run_command(iterations, user_count, cases, baseline, save, tolerance, engines):
+    """Time routes and helpers and compare them with the baseline."""
+    if 'numpy' in engines and np is None:
+        raise click.ClickException('NumPy is not installed.')
+    user_ids = [user_id for user_id, in db.session.query(User.id)
+                .filter(User.email.like(SYNTHETIC_EMAIL.format('%'))).order_by(User.id)]
+    if not user_ids:
+        raise click.ClickException('No synthetic users; run "flask bench generate" first.')
+    step = max(1, len(user_ids) // user_count)
+    user_ids = user_ids[::step][:user_count]
+    
+    results = {}
+    analytics_cache.clear()
+    configured_engine = app.config['ANALYTICS_ENGINE']
+    try:
+        for engine in engines or [configured_engine if _analytics_enabled() else 'sql']:
+            app.config['ANALYTICS_ENGINE'] = engine
+            suffix = '' if engine == 'sql' else f'[{engine}]'
+            for name, result in run_benchmarks(user_ids, iterations, set(cases)).items():
+                results[name + suffix] = result
+    finally:
+        app.config['ANALYTICS_ENGINE'] = configured_engine
+    path = baseline or os.path.join(app.instance_path, 'benchmark-baseline.json')
+    previous = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)['cases']
+    regressions = compare_benchmarks(results, previous, tolerance)
+    
+    click.echo(f'{"case":<40} {"p50":>9} {"p95":>9} {"p99":>9} {"queries":>8}')
+    for name, result in results.items():
+        click.echo(f'{name:<40} {result["p50_ms"]:>7.1f}ms {result["p95_ms"]:>7.1f}ms '
+                   f'{result["p99_ms"]:>7.1f}ms {result["queries"]:>8}'
+                   + (f'  REGRESSION: {regressions[name]}' if name in regressions else ''))
+    
+    if save:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+                'iterations': iterations,
+                'users': len(user_ids),
+                'cases': {**previous, **results},
+            }, f, indent=2, sort_keys=True)
+        click.echo(f'Baseline written to {path}.')
+    elif not previous:
+        click.echo(f'No baseline at {path}; rerun with --save to record one.')
+    if regressions and not save:
+        raise click.ClickException(f'{len(regressions)} cases regressed against {path}.')
+
+app.cli.add_command(bench_cli)
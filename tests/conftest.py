@@ -0,0 +1,109 @@
+"""Shared fixtures: the application on a throwaway database."""
+import os
+import shutil
+import tempfile
+
+# Configure the app before it is imported: a database file in a temporary
+# directory (so the storage profile and connection pool behave as in
+# production), no background workers, and no metrics snapshots written to
+# the instance folder
+TEST_DIR = tempfile.mkdtemp(prefix='finance-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIR, 'test.db')
+os.environ['SECRET_KEY'] = 'test'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['METRICS_FLUSH_INTERVAL'] = '1e9'
+
+import pytest
+from flask import Flask
+
+from app import (
+    analytics_cache,
+    app as flask_app,
+    category_cache,
+    db,
+    response_cache,
+    User,
+    user_cache,
+    _configure_sqlite_engine,
+    _run_migrations,
+)
+from bench import generate_synthetic_data
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The application, with the current schema in the test database."""
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        _run_migrations()
+    yield flask_app
+    with flask_app.app_context():
+        db.engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_caches(app):
+    """Start every test with empty per-process caches."""
+    for cache in (analytics_cache, category_cache, response_cache, user_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def app_context(app):
+    """Push an app context for tests calling helpers directly.
+    
+    Tests issuing requests must not use it: requests would share its
+    g and session, so the logged-in user would not be reloaded between
+    requests as it is in production.
+    """
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a synthetic user with categories, transactions and budgets.
+    
+    Every call adds a new user, so tests never see each other's data.
+    
+    Returns:
+        callable: make_user(transactions=200, budgets=3, days=730, seed=0) -> user ID
+    """
+    def make(transactions=200, budgets=3, days=730, seed=0):
+        with app.app_context():
+            first = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+            generate_synthetic_data(1, transactions, budgets, days, seed)
+            db.session.commit()
+        return first
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as the given user."""
+    def login_as(user_id):
+        client = app.test_client()
+        with client.session_transaction() as client_session:
+            client_session['_user_id'] = str(user_id)
+            client_session['_fresh'] = True
+        return client
+    return login_as
+
+
+@pytest.fixture
+def scratch_db(app, tmp_path):
+    """Bind the models to an empty database file of their own.
+    
+    For migration tests: the app context of a second application whose
+    database starts empty, so a test can build an old schema in it and
+    upgrade it without touching the shared test database.
+    """
+    scratch = Flask('scratch')
+    scratch.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'scratch.db')
+    db.init_app(scratch)
+    with scratch.app_context():
+        _configure_sqlite_engine(db.engine, app.config['SQLITE_PROFILE'])
+        yield db
+        db.session.remove()
+        db.engine.dispose()
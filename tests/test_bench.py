@@ -0,0 +1,21 @@
+"""The benchmark module stays out of the application."""
+import os
+import subprocess
+import sys
+
+from app import app as flask_app
+
+
+def test_app_does_not_import_bench(tmp_path):
+    code = 'import sys, app; sys.exit("bench" in sys.modules)'
+    env = {'DATABASE_URL': f'sqlite:///{tmp_path / "app.db"}', 'JOB_WORKERS': '0', 'PATH': ''}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True)
+
+    assert result.returncode == 0, result.stderr.decode()
+
+
+def test_bench_registers_its_commands():
+    import bench
+
+    assert flask_app.cli.get_command(None, 'bench') is bench.bench_cli
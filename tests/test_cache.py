@@ -0,0 +1,108 @@
+"""LRU eviction, expiry and counters of the in-process and shared caches."""
+import time
+
+import pytest
+
+from app import ResponseCache, SharedCacheStore, TTLCache, response_cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic(); advance it with clock[0] += seconds."""
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1          # 'b' is now the least recently used
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(max_entries=10, ttl=5)
+    cache.set('a', 1)
+    clock[0] += 5
+    assert cache.get('a') == 1
+    clock[0] += 0.001
+    assert cache.get('a') is None
+    # An expired entry is dropped, so setting it again starts a new lifetime
+    cache.set('a', 2)
+    clock[0] += 4
+    assert cache.get('a') == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_ttl_cache_disabled_and_pop(clock):
+    disabled = TTLCache(max_entries=10, ttl=0)
+    disabled.set('a', 1)
+    assert disabled.get('a') is None
+
+    cache = TTLCache(max_entries=10, ttl=60)
+    cache.set('a', 1)
+    cache.pop('a')
+    cache.pop('missing')
+    assert cache.get('a') is None
+
+
+def test_response_cache_evicts_and_counts():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', {'v': 1})
+    cache.set('b', {'v': 2})
+    cache.get('a')
+    cache.set('c', {'v': 3})
+    assert cache.get('b') is None
+    assert cache.get('missing') is None
+
+    assert cache.stats() == {
+        'hits': 1, 'misses': 2, 'hit_rate': 1 / 3, 'evictions': 1,
+        'size': 2, 'max_entries': 2, 'shared': False,
+    }
+
+
+def test_response_cache_falls_back_to_shared_store(tmp_path):
+    shared = SharedCacheStore(str(tmp_path / 'shared.db'), max_entries=10)
+    writer = ResponseCache(max_entries=10, shared=shared)
+    reader = ResponseCache(max_entries=10, shared=shared)
+    writer.set('key', {'v': 1})
+
+    assert reader.get('key') == {'v': 1}       # from the shared store
+    assert reader.get('key') == {'v': 1}       # now from the process
+    assert reader.stats()['size'] == 1
+    assert (reader.hits, reader.misses) == (2, 0)
+
+
+def test_shared_store_keeps_max_entries(tmp_path):
+    store = SharedCacheStore(str(tmp_path / 'shared.db'), max_entries=3)
+    store.PRUNE_INTERVAL = 5
+    for n in range(10):
+        store.set(f'k{n}', n)
+
+    kept = [n for n in range(10) if store.get(f'k{n}') is not None]
+    assert kept == [7, 8, 9]
+
+
+def test_shared_store_errors_are_misses(tmp_path):
+    store = SharedCacheStore(str(tmp_path / 'missing-dir' / 'shared.db'), max_entries=3)
+    store.set('a', 1)
+    assert store.get('a') is None
+
+
+def test_cache_stats_route(make_user, login):
+    client = login(make_user())
+    before = response_cache.stats()
+    url = '/dashboard/chart-data?timeframe=This Year'
+    client.get(url)
+    client.get(url)
+
+    stats = client.get('/dashboard/cache-stats').get_json()
+    assert stats['misses'] - before['misses'] == 1
+    assert stats['hits'] - before['hits'] == 1
+    assert stats['size'] >= 1 and stats['max_entries'] == response_cache.max_entries
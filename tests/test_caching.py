@@ -0,0 +1,40 @@
+"""Cached users, responses and ETags must follow writes made elsewhere."""
+from app import User, db, user_cache
+
+
+def write_elsewhere(app, user_id, *statements):
+    """Run statements and bump the data version as another process would."""
+    with app.app_context(), db.engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement, (user_id,))
+        connection.execute(
+            db.update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
+        )
+
+
+def test_etag_follows_other_process_writes(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    etag = client.get('/dashboard').headers['ETag']
+    assert user_cache.get(user_id) is not None
+    
+    assert client.get('/dashboard', headers={'If-None-Match': etag}).status_code == 304
+    write_elsewhere(app, user_id)
+    response = client.get('/dashboard', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_cached_response_follows_other_process_writes(app, make_user, login):
+    user_id = make_user()
+    client = login(user_id)
+    url = '/dashboard/chart-data?timeframe=This Year'
+    assert any(client.get(url).get_json()['expenses_trend'])
+    
+    write_elsewhere(app, user_id,
+                    'DELETE FROM daily_rollup WHERE user_id = ?',
+                    'DELETE FROM monthly_rollup WHERE user_id = ?')
+    data = client.get(url).get_json()
+    
+    assert not any(data['income_trend']) and not any(data['expenses_trend'])
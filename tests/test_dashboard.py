@@ -0,0 +1,106 @@
+"""Dashboard metrics and chart data, through the routes that serve them."""
+from datetime import datetime
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from app import Category, Transaction, db, _calculate_dashboard_metrics, _from_cents
+
+
+@pytest.fixture
+def empty_user(app, make_user, login):
+    """A user without transactions, with a logged-in client and category IDs."""
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        categories = {
+            type_: category_id
+            for category_id, type_ in db.session.query(Category.id, Category.type)
+            .filter(Category.user_id == user_id).order_by(Category.id.desc())
+        }
+    return user_id, login(user_id), categories
+
+
+def add(client, categories, type_, amount, date):
+    response = client.post('/transactions/add', data={
+        'type': type_, 'category': categories[type_], 'amount': amount,
+        'description': 'Test', 'date': date.strftime('%Y-%m-%d'),
+    })
+    assert response.status_code == 302
+
+
+def test_snapshot_metrics(empty_user):
+    user_id, client, categories = empty_user
+    today = datetime.utcnow()
+    last_month = today - relativedelta(months=1)
+    add(client, categories, 'income', '1000.00', today)
+    add(client, categories, 'expense', '250.10', today)
+    add(client, categories, 'expense', '0.20', today)
+    add(client, categories, 'income', '800.00', last_month)
+    add(client, categories, 'expense', '500.00', last_month)
+    
+    metrics = client.get('/api/dashboard/snapshot?timeframe=month').get_json()['metrics']
+    
+    assert metrics['income'] == 1000.0
+    assert metrics['expenses'] == 250.3
+    assert metrics['savings'] == 749.7
+    assert metrics['income_change'] == pytest.approx(25.0)
+    assert metrics['expenses_change'] == pytest.approx(-49.94)
+    assert metrics['savings_change'] == pytest.approx(149.9)
+
+
+def test_chart_data_this_month(empty_user):
+    user_id, client, categories = empty_user
+    today = datetime.utcnow()
+    add(client, categories, 'expense', '12.34', today)
+    add(client, categories, 'expense', '0.66', today)
+    add(client, categories, 'income', '99.00', today - relativedelta(months=1))
+    
+    data = client.get('/dashboard/chart-data?timeframe=This Month').get_json()
+    
+    days = ((today.replace(day=1) + relativedelta(months=1)) - today.replace(day=1)).days
+    assert len(data['trend_labels']) == days
+    assert data['expenses_trend'][today.day - 1] == 13.0
+    assert sum(data['expenses_trend']) == 13.0
+    assert not any(data['income_trend'])
+
+
+@pytest.mark.parametrize('granularity, buckets', [
+    (None, 12), ('week', None), ('quarter', 4), ('year', 1),
+])
+def test_chart_data_granularity(make_user, login, granularity, buckets):
+    client = login(make_user())
+    url = '/dashboard/chart-data?timeframe=This Year'
+    if granularity:
+        url += f'&granularity={granularity}'
+    
+    data = client.get(url).get_json()
+    
+    if buckets is not None:
+        assert len(data['trend_labels']) == buckets
+    assert len(data['income_trend']) == len(data['expenses_trend']) == len(data['trend_labels'])
+
+
+def test_chart_data_rejects_unknown_granularity(make_user, login):
+    response = login(make_user()).get('/dashboard/chart-data?granularity=hour')
+    
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('timeframe', ['month', 'quarter', 'year'])
+def test_calculate_dashboard_metrics_matches_transactions(app_context, make_user, timeframe):
+    user_id = make_user(transactions=500, days=800)
+    today = datetime.utcnow()
+    
+    metrics = _calculate_dashboard_metrics(user_id, timeframe, today)
+    
+    totals = dict(db.session.query(
+        Transaction.type, db.func.sum(Transaction.amount_cents)
+    ).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= metrics['start_date'],
+        Transaction.date < metrics['end_date']
+    ).group_by(Transaction.type).all())
+    assert metrics['current_income'] == totals.get('income', 0)
+    assert metrics['current_expenses'] == totals.get('expense', 0)
+    assert _from_cents(metrics['current_savings']) == _from_cents(
+        totals.get('income', 0) - totals.get('expense', 0))
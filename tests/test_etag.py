@@ -0,0 +1,76 @@
+"""Conditional GETs: 304 for an unchanged page, a new ETag after any change."""
+from datetime import timedelta
+
+import pytest
+
+import app as app_module
+from app import Category, db
+
+
+@pytest.fixture
+def client(app, make_user, login):
+    return login(make_user())
+
+
+def get(client, etag=None, url='/dashboard'):
+    return client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+
+@pytest.mark.parametrize('url', ['/dashboard', '/reports?timeframe=year', '/dashboard/chart-data?timeframe=This Year'])
+def test_matching_etag_gets_304(client, url):
+    response = get(client, url=url)
+    etag = response.headers['ETag'].strip('"')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    repeat = get(client, etag, url)
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    assert repeat.headers['ETag'].strip('"') == etag
+    assert get(client, 'other', url).status_code == 200
+
+
+def test_arguments_change_etag(client):
+    month = get(client, url='/dashboard?timeframe=month').headers['ETag']
+    year = get(client, url='/dashboard?timeframe=year').headers['ETag']
+
+    assert month != year
+
+
+def test_write_changes_etag(app, client):
+    etag = get(client).headers['ETag'].strip('"')
+    with client.session_transaction() as client_session:
+        user_id = int(client_session['_user_id'])
+    with app.app_context():
+        category_id = db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+    client.post('/transactions/add', data={
+        'type': 'expense', 'category': category_id, 'amount': '1', 'description': 'New', 'date': '2024-01-01'})
+    get(client)  # shows and consumes the flash message
+
+    response = get(client, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'].strip('"') != etag
+
+
+def test_new_day_changes_etag(client, monkeypatch):
+    etag = get(client).headers['ETag'].strip('"')
+    real_now = app_module._get_user_now
+    monkeypatch.setattr(app_module, '_get_user_now', lambda user=None: real_now(user) + timedelta(days=1))
+
+    response = get(client, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'].strip('"') != etag
+
+
+def test_pending_flash_bypasses_etag(client):
+    etag = get(client).headers['ETag'].strip('"')
+    with client.session_transaction() as client_session:
+        client_session['_flashes'] = [('success', 'Saved the thing')]
+
+    response = get(client, etag)
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert b'Saved the thing' in response.data
+
+    # Once shown, the same page is unchanged again
+    assert get(client, etag).status_code == 304
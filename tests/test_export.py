@@ -0,0 +1,82 @@
+"""CSV export: quoting round-trips, and date ranges are validated."""
+import csv
+import io
+from datetime import datetime
+
+import pytest
+
+from app import Category, Transaction, db, _parse_csv_transactions
+
+DESCRIPTIONS = [
+    'Plain',
+    'Comma, inside',
+    'Quote " inside',
+    '"Fully quoted"',
+    'Line\nbreak',
+    'CR\r\nLF',
+    ' leading and trailing ',
+    "Semicolon; tab\tand 'single'",
+    '=SUM(A1:A2)',
+    'Ünïcödé ✓',
+]
+
+
+@pytest.fixture
+def exporter(app, make_user, login):
+    """A user whose transactions carry DESCRIPTIONS, one per day of January 2024."""
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        category_id = db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+        db.session.add_all([
+            Transaction(user_id=user_id, category_id=category_id, amount_cents=100 + day, type='expense',
+                        description=description, date=datetime(2024, 1, day))
+            for day, description in enumerate(DESCRIPTIONS, start=1)
+        ])
+        db.session.commit()
+    return login(user_id)
+
+
+def export(client, **args):
+    response = client.get('/reports/export', query_string=args)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    return response.get_data(as_text=True)
+
+
+def test_descriptions_round_trip(exporter):
+    text = export(exporter, timeframe='all')
+    rows = list(csv.reader(io.StringIO(text, newline='')))
+
+    assert rows[0] == ['Date', 'Type', 'Category', 'Description', 'Amount']
+    assert sorted(row[3] for row in rows[1:]) == sorted(DESCRIPTIONS)
+
+    # Importing the file back gives the same rows (import trims descriptions)
+    records = list(_parse_csv_transactions(io.StringIO(text, newline='')))
+    assert sorted((record['description'], record['amount_cents']) for record in records) == sorted(
+        (description.strip(), 100 + day) for day, description in enumerate(DESCRIPTIONS, start=1))
+
+
+def test_range_is_inclusive(exporter):
+    rows = list(csv.reader(io.StringIO(export(exporter, start='2024-01-02', end='2024-01-03'), newline='')))
+    assert [row[0] for row in rows[1:]] == ['2024-01-02', '2024-01-03']
+
+    rows = list(csv.reader(io.StringIO(export(exporter, start='2024-01-05', end='2024-01-05'), newline='')))
+    assert [row[0] for row in rows[1:]] == ['2024-01-05']
+
+    rows = list(csv.reader(io.StringIO(export(exporter, start='2024-01-09'), newline='')))
+    assert [row[0] for row in rows[1:]] == ['2024-01-09', '2024-01-10']
+
+
+@pytest.mark.parametrize('args', [
+    {'start': '2024-01-05', 'end': '2024-01-04'},
+    {'start': 'yesterday'},
+    {'end': '2024-13-01'},
+    {'start': '2024-02-30'},
+    {'start': '05/01/2024'},
+])
+def test_invalid_range_is_rejected(exporter, args):
+    response = exporter.get('/reports/export', query_string=args)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid date range'}
+
+    assert exporter.post('/jobs', data={'kind': 'export', **args}).status_code == 400
@@ -0,0 +1,83 @@
+"""CSV and OFX import parsing."""
+import io
+
+import pytest
+
+from app import _parse_csv_transactions, _parse_ofx_transactions
+
+
+OFX_RECORD = (
+    '<STMTTRN>\n<TRNTYPE>{type}\n<DTPOSTED>20240305120000\n'
+    '<TRNAMT>{amount}\n<FITID>{fitid}\n<NAME>Shop\n</STMTTRN>\n'
+)
+
+
+def parse_csv(text):
+    return list(_parse_csv_transactions(io.StringIO(text)))
+
+
+def parse_ofx(text):
+    return list(_parse_ofx_transactions(io.StringIO(text)))
+
+
+def test_csv_amount_sign():
+    records = parse_csv(
+        'Date,Type,Category,Description,Amount\n'
+        '2024-03-01,expense,Food,Lunch,12.50\n'
+        '2024-03-02,expense,Food,Dinner,-20.00\n'
+        '2024-03-03,income,Salary,March,1000\n'
+    )
+    
+    assert [(record['type'], record['amount_cents']) for record in records] == [
+        ('expense', 1250), ('expense', 2000), ('income', 100000)
+    ]
+
+
+def test_csv_sign_without_type():
+    records = parse_csv('Date,Category,Amount\n2024-03-01,Food,-5\n2024-03-02,Salary,5\n')
+    
+    assert [record['type'] for record in records] == ['expense', 'income']
+
+
+def test_csv_rejects_negative_income():
+    with pytest.raises(ValueError, match='line 3: negative amount'):
+        parse_csv(
+            'Date,Type,Category,Amount\n'
+            '2024-03-01,income,Salary,50\n'
+            '2024-03-02,income,Salary,-50\n'
+        )
+
+
+def test_ofx_records():
+    text = '<OFX>\n<BANKTRANLIST>\n' + ''.join(
+        OFX_RECORD.format(type='DEBIT' if index % 2 else 'CREDIT',
+                          amount=f'-{index}.50' if index % 2 else f'{index}.25', fitid=index)
+        for index in range(1, 5)
+    ) + '</BANKTRANLIST>\n</OFX>\n'
+    
+    records = parse_ofx(text)
+    
+    assert [(record['type'], record['amount_cents']) for record in records] == [
+        ('expense', 150), ('income', 225), ('expense', 350), ('income', 425)
+    ]
+
+
+def test_ofx_records_across_chunks(monkeypatch):
+    monkeypatch.setattr('app.IMPORT_READ_SIZE', 7)
+    text = ''.join(OFX_RECORD.format(type='DEBIT', amount='-1.00', fitid=index) for index in range(20))
+    
+    assert len(parse_ofx(text)) == 20
+
+
+def test_ofx_rejects_contradicting_type():
+    with pytest.raises(ValueError, match='line 2: TRNTYPE CREDIT contradicts amount -5.00'):
+        parse_ofx('<OFX>\n' + OFX_RECORD.format(type='CREDIT', amount='-5.00', fitid=1))
+
+
+@pytest.mark.parametrize('text, line', [
+    ('<OFX>\n<TRNAMT>-5.00\n</STMTTRN>\n', 3),
+    (OFX_RECORD.format(type='DEBIT', amount='-1', fitid=1) + '<NAME>x\n</STMTTRN>\n<STMTTRN>\n', 9),
+])
+def test_ofx_rejects_unopened_record(text, line):
+    with pytest.raises(ValueError, match=f'line {line}: </STMTTRN> without an opening <STMTTRN>'):
+        parse_ofx(text)
@@ -0,0 +1,97 @@
+"""Jobs are queued only by POST /jobs, cleanup removes only expired results,
+and jobs left queued without workers are reported."""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from app import Job, db, _cleanup_jobs, _get_job_dir
+
+
+@pytest.fixture
+def job_dir(app, monkeypatch, tmp_path):
+    """Keep job results in a temporary instance folder."""
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    with app.app_context():
+        return _get_job_dir()
+
+
+def user_jobs(app, user_id):
+    with app.app_context():
+        return Job.query.filter_by(user_id=user_id).all()
+
+
+def test_post_jobs_queues_export(app, make_user, login):
+    user_id = make_user()
+    response = login(user_id).post('/jobs', data={'kind': 'export', 'timeframe': 'all'})
+
+    assert response.status_code == 202
+    assert response.headers['Location'].endswith(f'/jobs/{response.get_json()["id"]}')
+    assert [job.status for job in user_jobs(app, user_id)] == ['queued']
+
+
+def test_get_export_never_queues(app, make_user, login):
+    user_id = make_user()
+    response = login(user_id).get('/reports/export?timeframe=all&async=1')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.get_data(as_text=True).startswith('Date,')
+    assert user_jobs(app, user_id) == []
+
+
+def test_cleanup_removes_only_expired_results(app, app_context, make_user, job_dir):
+    user_id = make_user(transactions=0)
+    now = datetime.utcnow()
+    expired = Job(user_id=user_id, kind='export', status='done', expires_at=now - timedelta(minutes=1))
+    done = Job(user_id=user_id, kind='export', status='done', expires_at=now + timedelta(hours=1))
+    running = Job(user_id=user_id, kind='report', status='running', expires_at=now + timedelta(hours=1))
+    db.session.add_all([expired, done, running])
+    db.session.commit()
+
+    # done's file is written but not yet recorded, as while _run_job finishes it
+    names = {job: f'{job.id}.{"csv" if job.kind == "export" else "json"}' for job in (expired, done, running)}
+    for name in [*names.values(), 'stale.csv', 'fresh.csv']:
+        open(os.path.join(job_dir, name), 'w').close()
+    old = (now - timedelta(hours=app.config['JOB_RESULT_TTL'] + 1) - datetime(1970, 1, 1)).total_seconds()
+    os.utime(os.path.join(job_dir, 'stale.csv'), (old, old))
+
+    assert _cleanup_jobs(now) == 1
+    assert sorted(os.listdir(job_dir)) == sorted([names[done], names[running], 'fresh.csv'])
+    assert db.session.get(Job, expired.id) is None
+
+
+@pytest.fixture
+def queued_long_ago(app, make_user, monkeypatch):
+    """A user with a job queued two minutes ago, and a fresh warning flag."""
+    monkeypatch.setattr(app_module, '_unclaimed_jobs_warned', threading.Event())
+    user_id = make_user(transactions=0)
+    with app.app_context():
+        db.session.add(Job(user_id=user_id, kind='report', params='{}',
+                           created_at=datetime.utcnow() - timedelta(minutes=2)))
+        db.session.commit()
+    return user_id
+
+
+def unclaimed_warnings(caplog):
+    return [record for record in caplog.records if 'runs no job workers' in record.getMessage()]
+
+
+def test_unclaimed_jobs_are_reported_once(queued_long_ago, login, caplog):
+    client = login(queued_long_ago)
+    with caplog.at_level(logging.WARNING):
+        assert client.post('/jobs', data={'kind': 'report', 'timeframe': 'month'}).status_code == 202
+        assert client.post('/jobs', data={'kind': 'report', 'timeframe': 'year'}).status_code == 202
+
+    assert len(unclaimed_warnings(caplog)) == 1
+
+
+def test_no_warning_with_workers(queued_long_ago, login, caplog, monkeypatch):
+    monkeypatch.setattr(app_module, '_job_worker_threads', [object()])
+    with caplog.at_level(logging.WARNING):
+        login(queued_long_ago).post('/jobs', data={'kind': 'report', 'timeframe': 'month'})
+
+    assert unclaimed_warnings(caplog) == []
@@ -0,0 +1,62 @@
+"""Metric snapshots of several processes add up, and never go down."""
+import os
+
+from app import METRICS_EXITED_FILE, MetricsRegistry
+
+REQUESTS = ('finance_http_requests_total', (('endpoint', 'index'), ('method', 'GET'), ('status', '200')))
+
+
+def requests_total(registry):
+    counters, histograms = registry.collect()
+    return counters.get(REQUESTS, 0)
+
+
+def test_snapshots_of_processes_are_summed(tmp_path):
+    first = MetricsRegistry(str(tmp_path), 1e9)
+    second = MetricsRegistry(str(tmp_path), 1e9)
+    first.inc(*REQUESTS, 3)
+    second.inc(*REQUESTS, 4)
+    second.observe('finance_db_queries_per_request', (('endpoint', 'index'),), 2)
+    first.flush()
+
+    counters, histograms = second.collect()
+
+    assert counters[REQUESTS] == 7
+    assert histograms[('finance_db_queries_per_request', (('endpoint', 'index'),))][1] == 1
+
+
+def test_restarted_process_does_not_lower_totals(tmp_path):
+    # Both registries live in this process, so the second one reuses the
+    # first one's pid, as a recycled worker may
+    old = MetricsRegistry(str(tmp_path), 1e9)
+    old.inc(*REQUESTS, 5)
+    old.flush()
+    new = MetricsRegistry(str(tmp_path), 1e9)
+    new.inc(*REQUESTS, 1)
+
+    assert requests_total(new) == 6
+
+
+def test_exited_process_is_folded(tmp_path):
+    old = MetricsRegistry(str(tmp_path), 1e9)
+    old.inc(*REQUESTS, 5)
+    old.flush()
+    old.inc(*REQUESTS, 2)
+    old.retire()
+    new = MetricsRegistry(str(tmp_path), 1e9)
+    new.inc(*REQUESTS, 1)
+
+    assert requests_total(new) == 8
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.json')) == sorted(
+        [METRICS_EXITED_FILE, new._file_name])
+
+    new.retire()
+    assert requests_total(MetricsRegistry(str(tmp_path), 1e9)) == 8
+
+
+def test_process_never_flushed_leaves_no_file(tmp_path):
+    registry = MetricsRegistry(str(tmp_path), 1e9)
+    registry.inc(*REQUESTS)
+    registry.retire()
+
+    assert not os.path.exists(tmp_path / METRICS_EXITED_FILE)
@@ -0,0 +1,98 @@
+"""Integer minor units: parsing, formatting, and the migration from floats."""
+import pytest
+
+from app import (
+    Category, DailyRollup, MonthlyRollup, User,
+    _format_cents, _from_cents, _run_migrations, _to_cents, _verify_rollups,
+)
+
+
+@pytest.mark.parametrize('value, cents', [
+    ('12.34', 1234),
+    (' 7 ', 700),
+    ('-42.5', -4250),
+    ('0.005', 1),          # half away from zero
+    ('-0.005', -1),
+    ('0.0049', 0),
+    ('19.999', 2000),
+    (0.1 + 0.2, 30),       # str() of the float, not its binary value
+    (0.29, 29),
+    (5, 500),
+    ('1,234.50', 123450),
+    ('-1,234,567.891', -123456789),
+    ('1e2', 10000),
+])
+def test_to_cents(value, cents):
+    assert _to_cents(value) == cents
+
+
+@pytest.mark.parametrize('value', ['', 'abc', None, 'nan', 'inf', '12.3.4', '1,2', '1,23.00', '12,34', '$5'])
+def test_to_cents_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        _to_cents(value)
+
+
+@pytest.mark.parametrize('cents, text', [
+    (0, '0.00'), (5, '0.05'), (-5, '-0.05'), (1234, '12.34'), (-123450, '-1234.50'), (100, '1.00'),
+])
+def test_format_cents(cents, text):
+    assert _format_cents(cents) == text
+    assert _to_cents(text) == cents
+
+
+def test_from_cents():
+    assert _from_cents(1234) == 12.34
+    assert _from_cents(-5) == -0.05
+    assert _from_cents(None) == 0
+
+
+FLOAT_AMOUNTS = [0.1 + 0.2, 19.999, -42.5, 0.29, -0.29, 1234.565, 1e-3]
+
+
+def downgrade_to_float_amounts(db):
+    """Turn the current schema into version 6's: amounts as float columns."""
+    db.create_all()
+    connection = db.session.connection()
+    for table, old, new in (('transaction', 'amount', 'amount_cents'),
+                            ('budget', 'limit_amount', 'limit_cents'),
+                            ('recurring_rule', 'amount', 'amount_cents')):
+        connection.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {old} FLOAT NOT NULL DEFAULT 0')
+        connection.exec_driver_sql(f'ALTER TABLE "{table}" DROP COLUMN {new}')
+    connection.exec_driver_sql('PRAGMA user_version = 6')
+
+
+def test_float_amounts_migrate_to_cents(scratch_db):
+    db = scratch_db
+    downgrade_to_float_amounts(db)
+    user = User(name='Legacy', email='legacy@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    category = Category(user_id=user.id, name='Food', type='expense')
+    db.session.add(category)
+    db.session.flush()
+    connection = db.session.connection()
+    for day, amount in enumerate(FLOAT_AMOUNTS, start=1):
+        connection.exec_driver_sql(
+            'INSERT INTO "transaction" (user_id, category_id, amount, type, description, date) '
+            "VALUES (?, ?, ?, 'expense', 'legacy', ?)",
+            (user.id, category.id, amount, f'2024-0{1 + day % 2}-{day:02d} 00:00:00.000000')
+        )
+    connection.exec_driver_sql(
+        'INSERT INTO budget (user_id, category_id, limit_amount, timeframe, start_date) '
+        "VALUES (?, ?, 19.999, 'monthly', '2024-01-01 00:00:00.000000')",
+        (user.id, category.id)
+    )
+    db.session.commit()
+
+    assert _run_migrations() >= 7
+
+    cents = [row[0] for row in db.session.execute(db.text(
+        'SELECT amount_cents FROM "transaction" ORDER BY id'))]
+    assert cents == [30, 2000, -4250, 29, -29, 123457, 0]
+    assert db.session.execute(db.text('SELECT limit_cents FROM budget')).scalar() == 2000
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('transaction')}
+    assert 'amount' not in columns
+
+    assert _verify_rollups() == []
+    assert db.session.query(db.func.sum(DailyRollup.total_cents)).scalar() == sum(cents)
+    assert db.session.query(db.func.sum(MonthlyRollup.count)).scalar() == len(cents)
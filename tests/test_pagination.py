@@ -0,0 +1,75 @@
+"""Keyset pagination pages through ties on date without gaps or repeats."""
+from datetime import datetime
+
+import pytest
+
+from app import Category, Transaction, db, _paginate_keyset
+
+PER_PAGE = 4
+
+
+@pytest.fixture
+def user_id(app, make_user):
+    """A user with 11 transactions, 7 of them on the same day."""
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        category_id = db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+        days = [datetime(2024, 3, 1)] * 7 + [datetime(2024, 3, 2), datetime(2024, 2, 28),
+                                             datetime(2024, 1, 1), datetime(2024, 3, 5)]
+        db.session.add_all([
+            Transaction(user_id=user_id, category_id=category_id, amount_cents=100, type='expense',
+                        description=f'Row {n}', date=day)
+            for n, day in enumerate(days)
+        ])
+        db.session.commit()
+    return user_id
+
+
+def page(user_id, cursor=None, direction='next'):
+    query = Transaction.query.filter_by(user_id=user_id)
+    return _paginate_keyset(query, cursor, direction, PER_PAGE)
+
+
+def test_pages_forward_and_back(app_context, user_id):
+    expected = [t.id for t in Transaction.query.filter_by(user_id=user_id)
+                .order_by(Transaction.date.desc(), Transaction.id.desc())]
+
+    pages = [page(user_id)]
+    while pages[-1].has_next:
+        pages.append(page(user_id, pages[-1].next_cursor))
+    assert [[t.id for t in p] for p in pages] == [expected[i:i + PER_PAGE] for i in range(0, 11, PER_PAGE)]
+    assert not pages[0].has_prev and pages[0].has_next
+    assert pages[-1].has_prev and not pages[-1].has_next
+
+    back = [pages[-1]]
+    while back[-1].has_prev:
+        back.append(page(user_id, back[-1].prev_cursor, 'prev'))
+    seen = [t.id for p in reversed(back) for t in p]
+    assert seen == expected
+    # Pages going back start at the newest row, so they realign with the first page
+    assert [t.id for t in back[-1]] == expected[:PER_PAGE]
+    assert not back[-1].has_prev and back[-1].has_next
+
+
+def test_first_page_has_no_prev(app_context, user_id):
+    first = page(user_id)
+    newer = page(user_id, first.prev_cursor, 'prev')
+
+    assert newer.items == [] and not newer.has_prev and not newer.has_next
+
+
+@pytest.mark.parametrize('cursor', [
+    'garbage', '_', '2024-03-01T00:00:00', '2024-03-01T00:00:00_x', 'not-a-date_5',
+    '2024-03-01T00:00:00_-1', '2024-03-01T00:00:00_99999999999999999999999',
+])
+@pytest.mark.parametrize('direction', ['next', 'prev'])
+def test_invalid_cursor_falls_back_to_first_page(app_context, user_id, cursor, direction):
+    assert [t.id for t in page(user_id, cursor, direction)] == [t.id for t in page(user_id)]
+
+
+@pytest.mark.parametrize('cursor', ['garbage', '2024-03-01T00:00:00_99999999999999999999999'])
+def test_transactions_route_ignores_invalid_cursor(user_id, login, cursor):
+    response = login(user_id).get('/transactions', query_string={'cursor': cursor, 'direction': 'prev'})
+
+    assert response.status_code == 200
+    assert b'Row 10' in response.data
@@ -0,0 +1,94 @@
+"""Request profiling: user-bound tokens, the per-user switch, and dump names."""
+import os
+
+import pytest
+
+from app import User, db, _create_profile_token, _get_profile_top_functions
+
+
+@pytest.fixture
+def profiles(app, monkeypatch, tmp_path):
+    """Keep profile dumps in a temporary instance folder; returns a dump lister."""
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    monkeypatch.setitem(app.config, 'PROFILE_SAMPLE_RATE', 0)
+    
+    def dumps():
+        directory = tmp_path / 'profiles'
+        return sorted(name[:-len('.prof')] for name in os.listdir(directory)
+                      if name.endswith('.prof')) if directory.exists() else []
+    return dumps
+
+
+@pytest.fixture
+def admin(app, make_user, login, monkeypatch):
+    """A logged-in client of a user listed in ADMIN_EMAILS."""
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        email = db.session.get(User, user_id).email
+    monkeypatch.setitem(app.config, 'ADMIN_EMAILS', {email.lower()})
+    return login(user_id)
+
+
+def token_for(app, user_id):
+    with app.app_context():
+        return _create_profile_token(user_id)
+
+
+def test_token_profiles_its_user_only(app, make_user, login, profiles):
+    user_id, other_id = make_user(transactions=0), make_user(transactions=0)
+    token = token_for(app, user_id)
+    
+    assert login(other_id).get('/dashboard', query_string={'_profile': token}).status_code == 200
+    assert app.test_client().get('/login', query_string={'_profile': token}).status_code == 200
+    assert profiles() == []
+    
+    assert login(user_id).get('/dashboard', query_string={'_profile': token}).status_code == 200
+    assert len(profiles()) == 1 and f'-dashboard-u{user_id}-' in profiles()[0]
+
+
+@pytest.mark.parametrize('token', ['garbage', 'eyJ1c2VyX2lkIjoxfQ.AAAA.BBBB', ''])
+def test_bad_token_is_ignored(app, make_user, login, profiles, token):
+    client = login(make_user(transactions=0))
+    
+    assert client.get('/dashboard', query_string={'_profile': token}).status_code == 200
+    assert profiles() == []
+
+
+def test_expired_token_is_ignored(app, make_user, login, profiles, monkeypatch):
+    user_id = make_user(transactions=0)
+    token = token_for(app, user_id)
+    monkeypatch.setitem(app.config, 'PROFILE_TOKEN_MAX_AGE', -1)
+    
+    assert login(user_id).get('/dashboard', query_string={'_profile': token}).status_code == 200
+    assert profiles() == []
+
+
+def test_user_switch(app, make_user, login, admin, profiles):
+    user_id = make_user(transactions=0)
+    client = login(user_id)
+    
+    assert login(user_id).post(f'/admin/profiles/users/{user_id}', data={'enabled': '1'}).status_code == 403
+    assert admin.post(f'/admin/profiles/users/{user_id}', data={'enabled': '1'}).get_json() == {
+        'user_id': user_id, 'profile_requests': True}
+    client.get('/dashboard')
+    assert len(profiles()) == 1
+    
+    listed = admin.get('/admin/profiles').get_json()
+    assert [(p['user_id'], p['trigger']) for p in listed['profiles']] == [(str(user_id), 'user')]
+    functions = admin.get(f'/admin/profiles/{profiles()[0]}').get_json()['functions']
+    assert functions and {'function', 'calls', 'total_ms', 'cumulative_ms'} <= set(functions[0])
+    
+    admin.post(f'/admin/profiles/users/{user_id}', data={'enabled': '0'})
+    client.get('/dashboard')
+    assert len(profiles()) == 1
+
+
+@pytest.mark.parametrize('name', ['bad name', 'x;y', '..%2F..%2Fsecret', 'a*'])
+def test_profile_name_pattern(app, admin, profiles, name):
+    assert admin.get(f'/admin/profiles/{name}').status_code == 404
+
+
+@pytest.mark.parametrize('name', ['../etc/passwd', '/tmp/x', 'x\n'])
+def test_profile_name_pattern_in_helper(app_context, profiles, name):
+    with pytest.raises(FileNotFoundError):
+        _get_profile_top_functions(name)
@@ -0,0 +1,82 @@
+"""Every budgeted endpoint must stay within QUERY_BUDGETS, in strict mode."""
+from datetime import datetime
+
+import pytest
+
+from app import QUERY_BUDGETS, Category, QueryBudgetExceeded, Transaction, db, np
+
+BUDGET_REQUESTS = [
+    ('dashboard', '/dashboard?timeframe=year'),
+    ('get_dashboard_snapshot', '/api/dashboard/snapshot?timeframe=quarter'),
+    ('reports', '/reports?timeframe=year'),
+    ('get_chart_data', '/dashboard/chart-data?timeframe=This Year&granularity=week'),
+    ('get_category_data', '/dashboard/category-data?timeframe=This Month'),
+    ('get_range_totals', '/reports/ranges?range=2024-01-01..2025-01-01&range=2025-03-01..2025-04-01'),
+    ('get_range_totals', '/reports/ranges?range=2020-01-01..2030-01-01&categories=1'),
+    ('get_rolling_totals', '/reports/rolling?days=30&window=7'),
+    ('transactions', '/transactions?search=rent&type=expense'),
+    ('transactions', '/transactions?cursor=2000-01-01T00:00:00_1&direction=prev&type=income'),
+    ('budgets', '/budgets'),
+]
+
+ENGINES = ['sql'] + (['numpy'] if np is not None else [])
+
+
+@pytest.fixture
+def strict(app, monkeypatch):
+    """Raise QueryBudgetExceeded whatever the TESTING flag."""
+    monkeypatch.setitem(app.config, 'QUERY_BUDGET_STRICT', True)
+    monkeypatch.setitem(app.config, 'QUERY_STATS', True)
+
+
+@pytest.fixture(params=ENGINES)
+def engine(app, monkeypatch, request):
+    monkeypatch.setitem(app.config, 'ANALYTICS_ENGINE', request.param)
+    return request.param
+
+
+def expense_category(app, user_id):
+    with app.app_context():
+        return db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+
+
+def test_every_budget_is_exercised():
+    assert {endpoint for endpoint, url in BUDGET_REQUESTS} | {'add_transaction'} == set(QUERY_BUDGETS)
+
+
+@pytest.mark.parametrize('endpoint, url', BUDGET_REQUESTS)
+def test_read_endpoint_within_budget(strict, engine, make_user, login, endpoint, url):
+    client = login(make_user())
+    
+    # Cold caches first, then a warm repeat
+    for _ in range(2):
+        response = client.get(url)
+        assert response.status_code == 200
+
+
+@pytest.mark.parametrize('recurrence', [
+    {},
+    {'date': '2015-01-05', 'recurring': 'on', 'frequency': 'daily', 'interval': '1'},
+])
+def test_add_transaction_within_budget(app, strict, make_user, login, recurrence):
+    user_id = make_user(transactions=10)
+    client = login(user_id)
+    
+    response = client.post('/transactions/add', data={
+        'type': 'expense', 'category': expense_category(app, user_id), 'amount': '5',
+        'description': 'Coffee', 'tags': 'food, daily',
+        'date': datetime.utcnow().strftime('%Y-%m-%d'), **recurrence,
+    })
+    
+    assert response.status_code == 302
+    with app.app_context():
+        added = Transaction.query.filter_by(user_id=user_id, description='Coffee').count()
+    assert added > (1000 if recurrence else 0)
+
+
+def test_exceeding_a_budget_raises(strict, make_user, login, monkeypatch):
+    monkeypatch.setitem(QUERY_BUDGETS, 'get_chart_data', 1)
+    client = login(make_user())
+    
+    with pytest.raises(QueryBudgetExceeded, match='get_chart_data issued 2 queries'):
+        client.get('/dashboard/chart-data')
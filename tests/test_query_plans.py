@@ -0,0 +1,20 @@
+"""Every query of the read-only routes must be answered through an index."""
+from app import QUERY_PLAN_ROUTES, _check_query_plans
+
+
+def test_read_routes_use_indexes(app_context, make_user):
+    user_id = make_user(transactions=300)
+    make_user(transactions=300, seed=1)
+    
+    scans = _check_query_plans(user_id)
+    
+    assert not scans, '\n'.join(
+        f'[{endpoint}] {" ".join(statement.split())}: {"; ".join(details)}'
+        for endpoint, statement, details in scans
+    )
+
+
+def test_query_plan_routes_cover_reports():
+    endpoints = {endpoint for endpoint, args in QUERY_PLAN_ROUTES}
+    
+    assert {'dashboard', 'reports', 'transactions', 'get_chart_data'} <= endpoints
@@ -0,0 +1,93 @@
+"""Custom range and rolling reports, with and without the NumPy engine."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import Transaction, db, np, _from_cents
+
+RANGES = ['2024-01-01..2025-01-01', '2025-02-10..2025-02-11', '2000-01-01..2100-01-01',
+          '2030-01-01..2031-01-01']
+
+ENGINES = ['sql'] + (['numpy'] if np is not None else [])
+
+
+@pytest.fixture(params=ENGINES)
+def engine(app, monkeypatch, request):
+    monkeypatch.setitem(app.config, 'ANALYTICS_ENGINE', request.param)
+    return request.param
+
+
+def raw_totals(app, user_id, start, end):
+    with app.app_context():
+        totals = dict(db.session.query(
+            Transaction.type, db.func.sum(Transaction.amount_cents)
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.date >= start,
+            Transaction.date < end
+        ).group_by(Transaction.type).all())
+    return _from_cents(totals.get('income', 0)), _from_cents(totals.get('expense', 0))
+
+
+def test_ranges_match_transactions(app, engine, make_user, login):
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    ranges = RANGES + [f'2024-06-15..{today}']
+    user_id = make_user(transactions=1000, days=1200)
+    
+    response = login(user_id).get('/reports/ranges', query_string={'range': ranges, 'categories': '1'})
+    
+    assert response.status_code == 200
+    for value, result in zip(ranges, response.get_json()['ranges']):
+        start, end = (datetime.fromisoformat(part) for part in value.split('..'))
+        assert (result['income'], result['expenses']) == raw_totals(app, user_id, start, end)
+        assert sum(category['expenses'] for category in result['categories']) == \
+            pytest.approx(result['expenses'])
+        assert all(category['name'] for category in result['categories'])
+
+
+def test_rolling_matches_transactions(app, engine, make_user, login):
+    user_id = make_user(transactions=1000, days=400)
+    
+    data = login(user_id).get('/reports/rolling?days=20&window=1&window=30&end=2025-06-30').get_json()
+    
+    assert data['dates'][-1] == '2025-06-30' and len(data['dates']) == 20
+    for window in (1, 30):
+        series = data['windows'][str(window)]
+        for index in (0, 7, 19):
+            end = datetime.fromisoformat(data['dates'][index]) + timedelta(days=1)
+            assert (series['income'][index], series['expenses'][index]) == \
+                raw_totals(app, user_id, end - timedelta(days=window), end)
+
+
+@pytest.mark.skipif(np is None, reason='compares against the NumPy engine')
+def test_engines_agree(app, make_user, login, monkeypatch):
+    client = login(make_user(transactions=2000, days=900))
+    urls = ['/reports/rolling?days=90', '/reports/ranges?categories=1&' + '&'.join(
+        f'range=2023-{month:02d}-01..2025-{month:02d}-15' for month in range(1, 13)
+    )]
+    
+    responses = {}
+    for name in ('sql', 'numpy'):
+        monkeypatch.setitem(app.config, 'ANALYTICS_ENGINE', name)
+        responses[name] = [client.get(url).get_json() for url in urls]
+    
+    assert responses['sql'] == responses['numpy']
+
+
+def test_ranges_without_numpy(app, make_user, login, monkeypatch):
+    monkeypatch.setitem(app.config, 'ANALYTICS_ENGINE', 'numpy')
+    monkeypatch.setattr('app.np', None)
+    
+    response = login(make_user()).get('/reports/ranges?range=2020-01-01..2030-01-01')
+    
+    assert response.status_code == 200
+    assert response.get_json()['ranges'][0]['expenses'] > 0
+
+
+@pytest.mark.parametrize('query', [
+    'range=2025-01-01', 'range=2025-02-01..2025-01-01', '',
+])
+def test_ranges_reject_invalid(make_user, login, query):
+    response = login(make_user(transactions=0)).get(f'/reports/ranges?{query}')
+    
+    assert response.status_code == 400
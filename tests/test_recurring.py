@@ -0,0 +1,129 @@
+"""Recurring rules fire on their owner's local calendar day."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import (
+    Category, RecurringRule, Transaction, User, db, _get_timezone, _materialize_recurring, _verify_rollups,
+)
+
+
+def local_today(timezone):
+    now = datetime.now(_get_timezone(timezone)).replace(tzinfo=None)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_daily_rule(user_id, start_date):
+    """Add a daily rule whose first occurrence (start_date) already exists."""
+    category_id = db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+    rule = RecurringRule(
+        user_id=user_id, category_id=category_id, amount_cents=100, type='expense',
+        description='Daily', frequency='daily', interval=1, start_date=start_date,
+        occurrences=1, next_date=start_date + timedelta(days=1)
+    )
+    db.session.add(rule)
+    db.session.commit()
+    return rule.id
+
+
+def occurrence_dates(rule_id):
+    return [date for date, in db.session.query(Transaction.date)
+            .filter_by(recurring_rule_id=rule_id).order_by(Transaction.date)]
+
+
+@pytest.mark.parametrize('timezone', ['Pacific/Kiritimati', 'Pacific/Pago_Pago', 'UTC'])
+def test_rules_fire_on_local_day(app_context, make_user, timezone):
+    user_id = make_user(transactions=0, budgets=0)
+    db.session.get(User, user_id).timezone = timezone
+    today = local_today(timezone)
+    rule_id = add_daily_rule(user_id, today - timedelta(days=3))
+    
+    created = _materialize_recurring()
+    
+    assert created >= 3
+    assert occurrence_dates(rule_id)[-1] == today
+    assert db.session.get(RecurringRule, rule_id).next_date == today + timedelta(days=1)
+
+
+def test_explicit_until_applies_to_every_rule(app_context, make_user):
+    user_id = make_user(transactions=0, budgets=0)
+    rule_id = add_daily_rule(user_id, datetime(2024, 1, 1))
+    
+    _materialize_recurring(datetime(2024, 1, 5), rule_ids=[rule_id])
+    
+    assert occurrence_dates(rule_id) == [datetime(2024, 1, day) for day in range(2, 6)]
+
+
+def test_stop_rule_ends_on_local_day(app, make_user, login):
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        db.session.get(User, user_id).timezone = 'Asia/Tokyo'
+        rule_id = add_daily_rule(user_id, datetime(2024, 1, 1))
+    
+    response = login(user_id).post(f'/recurring/{rule_id}/stop')
+    
+    assert response.status_code == 200
+    with app.app_context():
+        rule = db.session.get(RecurringRule, rule_id)
+        assert rule.end_date == local_today('Asia/Tokyo')
+        assert rule.next_date is None
+
+
+def test_materializing_twice_is_a_noop(app_context, make_user):
+    user_id = make_user(transactions=0, budgets=0)
+    rule_id = add_daily_rule(user_id, datetime(2024, 1, 1))
+    until = datetime(2024, 1, 10)
+    assert _materialize_recurring(until, rule_ids=[rule_id]) == 9
+    dates = occurrence_dates(rule_id)
+    
+    assert _materialize_recurring(until, rule_ids=[rule_id]) == 0
+    # A run that read the rule before the first one advanced it
+    rule = db.session.get(RecurringRule, rule_id)
+    rule.occurrences, rule.next_date = 1, datetime(2024, 1, 2)
+    db.session.commit()
+    assert _materialize_recurring(until, rule_ids=[rule_id]) == 0
+    
+    assert occurrence_dates(rule_id) == dates
+    assert _verify_rollups(user_id) == []
+
+
+def test_occurrences_stop_at_end_date(app_context, make_user):
+    user_id = make_user(transactions=0, budgets=0)
+    rule_id = add_daily_rule(user_id, datetime(2024, 1, 1))
+    db.session.get(RecurringRule, rule_id).end_date = datetime(2024, 1, 5)
+    db.session.commit()
+    
+    _materialize_recurring(datetime(2024, 1, 31), rule_ids=[rule_id])
+    
+    assert occurrence_dates(rule_id) == [datetime(2024, 1, day) for day in range(2, 6)]
+    assert db.session.get(RecurringRule, rule_id).next_date is None
+    assert _materialize_recurring(datetime(2024, 2, 29), rule_ids=[rule_id]) == 0
+
+
+def test_edit_onto_existing_occurrence_is_refused(app, make_user, login):
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        rule_id = add_daily_rule(user_id, datetime(2024, 1, 1))
+        _materialize_recurring(datetime(2024, 1, 5), rule_ids=[rule_id])
+        db.session.commit()
+        occurrence = Transaction.query.filter_by(recurring_rule_id=rule_id, date=datetime(2024, 1, 3)).one()
+        form = {'type': 'expense', 'category': occurrence.category_id, 'amount': '1',
+                'description': 'Daily', 'date': '2024-01-04'}
+        occurrence_id = occurrence.id
+    client = login(user_id)
+    
+    response = client.post(f'/transactions/{occurrence_id}/edit', data=form)
+    
+    assert response.status_code == 302
+    with client.session_transaction() as client_session:
+        assert client_session['_flashes'] == [
+            ('error', 'This recurring transaction already has an occurrence on that date')]
+    with app.app_context():
+        assert db.session.get(Transaction, occurrence_id).date == datetime(2024, 1, 3)
+        assert _verify_rollups(user_id) == []
+    
+    form['date'] = '2024-01-20'
+    assert client.post(f'/transactions/{occurrence_id}/edit', data=form).status_code == 302
+    with app.app_context():
+        assert db.session.get(Transaction, occurrence_id).date == datetime(2024, 1, 20)
+        assert _verify_rollups(user_id) == []
@@ -0,0 +1,52 @@
+"""Reports page: fixed query count and totals matching the raw transactions."""
+from datetime import datetime
+
+import pytest
+
+from app import (
+    DEFAULT_EXPENSE_CATEGORIES,
+    REPORTS_MAX_QUERIES,
+    QueryCounter,
+    Transaction,
+    db,
+    _build_reports_data,
+    _from_cents,
+    _get_report_period,
+)
+
+
+@pytest.mark.parametrize('timeframe', ['month', 'quarter', 'year'])
+@pytest.mark.parametrize('budgets', [0, 1, len(DEFAULT_EXPENSE_CATEGORIES)])
+def test_build_reports_data_query_count(app_context, make_user, timeframe, budgets):
+    user_id = make_user(budgets=budgets)
+    
+    with QueryCounter() as counter:
+        data = _build_reports_data(user_id, timeframe, datetime.utcnow())
+    
+    assert len(data['budget_labels']) == budgets
+    assert counter.count <= REPORTS_MAX_QUERIES, counter.statements
+
+
+def test_build_reports_data_totals(app_context, make_user):
+    user_id = make_user(transactions=500, days=400)
+    now = datetime.utcnow()
+    start_date, end_date, _ = _get_report_period('year', now)
+    
+    data = _build_reports_data(user_id, 'year', now)
+    
+    totals = dict(db.session.query(
+        Transaction.type, db.func.sum(Transaction.amount_cents)
+    ).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= start_date,
+        Transaction.date < end_date
+    ).group_by(Transaction.type).all())
+    assert data['total_income'] == _from_cents(totals.get('income', 0))
+    assert data['total_expenses'] == _from_cents(totals.get('expense', 0))
+    assert sum(data['category_data']) == pytest.approx(data['total_expenses'])
+
+
+def test_reports_page(make_user, login):
+    response = login(make_user()).get('/reports?timeframe=quarter')
+    
+    assert response.status_code == 200
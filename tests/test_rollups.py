@@ -0,0 +1,62 @@
+"""Rollups follow transactions through add, every kind of edit, and delete."""
+from datetime import datetime
+
+import pytest
+
+from app import Category, Transaction, db, _verify_rollups
+
+
+@pytest.fixture
+def user(app, make_user, login):
+    """A user with history, a logged-in client and two categories per type."""
+    user_id = make_user(transactions=100, budgets=0)
+    with app.app_context():
+        categories = {}
+        for category_id, type_ in db.session.query(Category.id, Category.type)\
+                .filter(Category.user_id == user_id).order_by(Category.id):
+            categories.setdefault(type_, []).append(category_id)
+    return user_id, login(user_id), categories
+
+
+def check(app, user_id, transaction_id, **expected):
+    with app.app_context():
+        assert _verify_rollups(user_id) == []
+        transaction = db.session.get(Transaction, transaction_id)
+        if not expected:
+            assert transaction is None
+            return
+        for name, value in expected.items():
+            assert getattr(transaction, name) == value
+
+
+def test_rollups_follow_edits_and_delete(app, user):
+    user_id, client, categories = user
+    expense, other_expense = categories['expense'][:2]
+    income = categories['income'][0]
+    form = {'type': 'expense', 'category': expense, 'amount': '12.34',
+            'description': 'Rollup', 'date': '2024-01-15'}
+    client.post('/transactions/add', data=form)
+    with app.app_context():
+        transaction_id = db.session.query(db.func.max(Transaction.id))\
+            .filter(Transaction.user_id == user_id).scalar()
+    check(app, user_id, transaction_id, amount_cents=1234, category_id=expense)
+
+    steps = [
+        ({'date': '2024-01-20'}, {}),                                   # same month
+        ({'date': '2024-02-01'}, {}),                                   # across months
+        ({'date': '2023-12-31'}, {}),                                   # across years
+        ({'category': other_expense}, {'category_id': other_expense}),
+        ({'amount': '99.99'}, {'amount_cents': 9999}),
+        ({'type': 'income', 'category': income}, {'type': 'income', 'category_id': income}),
+        ({'type': 'expense', 'category': expense, 'date': '2024-03-10', 'amount': '1'},
+         {'type': 'expense', 'category_id': expense, 'amount_cents': 100}),
+    ]
+    for changes, expected in steps:
+        form.update(changes)
+        response = client.post(f'/transactions/{transaction_id}/edit', data=form)
+        assert response.status_code == 302
+        check(app, user_id, transaction_id, date=datetime.strptime(form['date'], '%Y-%m-%d'), **expected)
+
+    assert client.post(f'/transactions/{transaction_id}/delete').status_code == 200
+    check(app, user_id, transaction_id)
+
@@ -0,0 +1,94 @@
+"""Full-text search follows edits and deletes and never crosses users."""
+import re
+
+import pytest
+
+from app import Category, db
+
+
+@pytest.fixture
+def users(app, make_user, login):
+    """Two users without history; returns (client, category ID) per user."""
+    result = []
+    for _ in range(2):
+        user_id = make_user(transactions=0, budgets=0)
+        with app.app_context():
+            category_id = db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+        result.append((login(user_id), category_id))
+    return result
+
+
+def add(client, category_id, description, tags=''):
+    client.post('/transactions/add', data={
+        'type': 'expense', 'category': category_id, 'amount': '5', 'description': description,
+        'tags': tags, 'date': '2024-05-01',
+    })
+    return search(client, description)[0]
+
+
+def edit(client, category_id, transaction_id, description, tags=''):
+    response = client.post(f'/transactions/{transaction_id}/edit', data={
+        'type': 'expense', 'category': category_id, 'amount': '5', 'description': description,
+        'tags': tags, 'date': '2024-05-01',
+    })
+    assert response.status_code == 302
+
+
+def search(client, q):
+    response = client.get('/transactions/search', query_string={'q': q})
+    assert response.status_code == 200
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def test_search_follows_edits_and_deletes(users):
+    (client, category_id), _ = users
+    transaction_id = add(client, category_id, 'Corner bakery')
+    assert search(client, 'bakery') == [transaction_id]
+
+    edit(client, category_id, transaction_id, 'Hardware store', 'tools')
+    assert search(client, 'bakery') == []
+    assert search(client, 'hardware') == [transaction_id]
+    assert search(client, 'tools') == [transaction_id]
+
+    edit(client, category_id, transaction_id, 'Hardware store')
+    assert search(client, 'tools') == []
+
+    assert client.post(f'/transactions/{transaction_id}/delete').status_code == 200
+    assert search(client, 'hardware') == []
+
+
+def test_search_is_limited_to_owner(users):
+    (alice, alice_category), (bob, bob_category) = users
+    alice_id = add(alice, alice_category, 'Shared word alpha')
+    bob_id = add(bob, bob_category, 'Shared word beta')
+
+    assert search(alice, 'shared') == [alice_id]
+    assert search(bob, 'shared') == [bob_id]
+    assert search(bob, 'alpha') == []
+    # Owner tokens are 'u<id>': no search term may reach them
+    assert search(alice, 'u') == []
+    assert search(alice, 'owner u') == []
+
+
+def test_search_matches_prefixes(users):
+    (client, category_id), _ = users
+    transaction_id = add(client, category_id, 'Supermarket groceries', 'household')
+
+    assert search(client, 'gro') == [transaction_id]
+    assert search(client, 'super groc') == [transaction_id]
+    assert search(client, 'house') == [transaction_id]
+    assert search(client, 'market') == []
+
+
+@pytest.mark.parametrize('q', [
+    '"', "groceries'", '"groceries', 'groceries AND', 'OR groceries', 'NOT', 'NEAR(groceries)',
+    'groceries*', '^groceries', 'owner:u1', 'description:groceries', '{tags}: x', '(', '-groceries',
+])
+def test_search_tolerates_operators_and_quotes(users, q):
+    (client, category_id), _ = users
+    transaction_id = add(client, category_id, 'Weekly groceries')
+    # Operators are plain words: a row matches when every word starts one of its words
+    words = re.findall(r'\w+', q.lower())
+    matches = bool(words) and all(any(w.startswith(word) for w in ('weekly', 'groceries')) for word in words)
+
+    assert search(client, q) == ([transaction_id] if matches else [])
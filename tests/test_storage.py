@@ -0,0 +1,19 @@
+"""SQLite storage profiles under concurrent reader and writer processes."""
+import pytest
+
+from app import SQLITE_STORAGE_PROFILES, db, _benchmark_storage
+
+
+def test_default_profile_uses_wal(app_context):
+    assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+
+
+@pytest.mark.parametrize('profile', sorted(SQLITE_STORAGE_PROFILES))
+def test_profile_under_contention(app_context, tmp_path, profile):
+    result = _benchmark_storage(str(tmp_path / 'storage.db'), profile,
+                                readers=2, writers=2, seconds=1, rows=2000)
+    
+    assert result['read_errors'] == 0
+    assert result['write_errors'] == 0
+    assert result['reads_per_second'] > 0
+    assert result['writes_per_second'] > 0
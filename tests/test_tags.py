@@ -0,0 +1,117 @@
+"""Tags follow their transactions, filter listings, and total per period."""
+from datetime import datetime
+
+import pytest
+
+from app import (
+    Category, Tag, Transaction, User, db, transaction_tag, _run_migrations,
+)
+
+
+@pytest.fixture
+def tagged(app, make_user, login):
+    """A user without history: (user ID, client, expense category ID)."""
+    user_id = make_user(transactions=0, budgets=0)
+    with app.app_context():
+        category_id = db.session.query(Category.id).filter_by(user_id=user_id, type='expense').first()[0]
+    return user_id, login(user_id), category_id
+
+
+def form(category_id, description, tags, date='2024-05-01', amount='5'):
+    return {'type': 'expense', 'category': category_id, 'amount': amount,
+            'description': description, 'tags': tags, 'date': date}
+
+
+def tag_counts(client):
+    return {tag['name']: tag['count'] for tag in client.get('/tags').get_json()['tags']}
+
+
+def linked_tags(app, transaction_id):
+    with app.app_context():
+        return sorted(name for name, in db.session.query(Tag.name)
+                      .join(transaction_tag, transaction_tag.c.tag_id == Tag.id)
+                      .filter(transaction_tag.c.transaction_id == transaction_id))
+
+
+def last_transaction_id(app, user_id):
+    with app.app_context():
+        return db.session.query(db.func.max(Transaction.id)).filter(Transaction.user_id == user_id).scalar()
+
+
+def test_tags_follow_add_edit_and_delete(app, tagged):
+    user_id, client, category_id = tagged
+    client.post('/transactions/add', data=form(category_id, 'Lunch', ' Food, Weekly ;food,, '))
+    transaction_id = last_transaction_id(app, user_id)
+
+    assert linked_tags(app, transaction_id) == ['food', 'weekly']
+    assert tag_counts(client) == {'food': 1, 'weekly': 1}
+
+    client.post(f'/transactions/{transaction_id}/edit', data=form(category_id, 'Lunch', 'weekly, Travel'))
+    assert linked_tags(app, transaction_id) == ['travel', 'weekly']
+    assert tag_counts(client) == {'travel': 1, 'weekly': 1}
+
+    client.post(f'/transactions/{transaction_id}/edit', data=form(category_id, 'Lunch', ''))
+    assert linked_tags(app, transaction_id) == []
+
+    client.post(f'/transactions/{transaction_id}/edit', data=form(category_id, 'Lunch', 'food'))
+    client.post(f'/transactions/{transaction_id}/delete')
+    assert linked_tags(app, transaction_id) == []
+    assert tag_counts(client) == {}
+
+
+def test_tag_filters_transactions(app, tagged):
+    user_id, client, category_id = tagged
+    client.post('/transactions/add', data=form(category_id, 'Tagged row', 'groceries'))
+    tagged_id = last_transaction_id(app, user_id)
+    client.post('/transactions/add', data=form(category_id, 'Other row', 'fuel'))
+
+    page = client.get('/transactions', query_string={'tag': 'Groceries'}).get_data(as_text=True)
+    assert 'Tagged row' in page and 'Other row' not in page
+    assert 'Other row' not in client.get('/transactions?tag=unknown').get_data(as_text=True)
+
+    data = client.get('/tags/groceries/transactions').get_json()
+    assert [transaction['id'] for transaction in data['transactions']] == [tagged_id]
+    assert data['prev_cursor'] is None and data['next_cursor'] is None
+
+
+def test_tag_spending_per_period(tagged):
+    _, client, category_id = tagged
+    for date, amount, tags in [('2024-01-10', '10.10', 'food'), ('2024-01-20', '0.20', 'food, work'),
+                               ('2024-03-05', '3', 'food'), ('2023-12-31', '99', 'food')]:
+        client.post('/transactions/add', data=form(category_id, 'Spend', tags, date, amount))
+
+    data = client.get('/tags/spending', query_string={
+        'start': '2024-01-01', 'end': '2024-12-31', 'granularity': 'month'}).get_json()
+
+    assert data['periods'] == ['2024-01', '2024-03']
+    assert data['tags'] == {
+        'food': {'total': 13.3, 'periods': {'2024-01': 10.3, '2024-03': 3.0}},
+        'work': {'total': 0.2, 'periods': {'2024-01': 0.2}},
+    }
+    assert client.get('/tags/spending?granularity=hour').status_code == 400
+
+
+def test_migration_normalizes_existing_tags(scratch_db):
+    db = scratch_db
+    db.create_all()
+    transaction_tag.drop(db.session.connection())
+    Tag.__table__.drop(db.session.connection())
+    db.session.execute(db.text('PRAGMA user_version = 3'))
+    user = User(name='Legacy', email='legacy@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    category = Category(user_id=user.id, name='Food', type='expense')
+    db.session.add(category)
+    db.session.flush()
+    rows = [Transaction(user_id=user.id, category_id=category.id, amount_cents=100, type='expense',
+                        description='Legacy', tags=tags, date=datetime(2024, 1, 1))
+            for tags in ('food,weekly', 'Food', None, '')]
+    db.session.add_all(rows)
+    db.session.commit()
+
+    _run_migrations()
+
+    links = db.session.query(transaction_tag.c.transaction_id, Tag.name)\
+        .join(Tag, Tag.id == transaction_tag.c.tag_id).order_by(transaction_tag.c.transaction_id, Tag.name).all()
+    assert links == [(rows[0].id, 'food'), (rows[0].id, 'weekly'), (rows[1].id, 'food')]
+    assert db.session.query(Tag.user_id).distinct().all() == [(user.id,)]